@@ -4,7 +4,7 @@ import json
 from datetime import datetime
 import time
 import uuid
-from utils.database import Database
+from utils.database import Database, is_admin
 from utils.chatbot import CharacterChatbot
 from utils.pdf_generator import generate_analysis_report
 from utils.pdf_generator import generate_completion_certificate 
@@ -184,6 +184,7 @@ if 'initialized' not in st.session_state:
     
     st.session_state.db = Database()
     st.session_state.chatbot = CharacterChatbot()
+    st.session_state.db.register_characters(st.session_state.chatbot.characters_data)
     
     saved_session = load_login_from_cookie()
     
@@ -419,7 +420,7 @@ def show_welcome():
     with col1:
         if st.button("🎯 Start New Assessment", use_container_width=True, type="primary"):
             # Create new session
-            st.session_state.session_id = str(uuid.uuid4())
+            st.session_state.session_id = st.session_state.db.new_session_id(st.session_state.user_id)
             st.session_state.db.create_session(st.session_state.session_id, st.session_state.user_id)
             st.session_state.current_character_idx = 0
             st.session_state.current_question_idx = 0
@@ -633,7 +634,8 @@ def submit_responses():
             st.session_state.responses
         )
         
-        st.session_state.db.save_character_response(
+        # Committed locally and written to the database in the background
+        st.session_state.db.queue_character_response(
             st.session_state.session_id,
             current_char['id'],
             current_char['character'],
@@ -721,12 +723,20 @@ def show_analysis():
         st.write("## 📥 Download Your Documents")
         
         # Get all session responses for PDF generation
+        # Responses and summary in one round trip
         db = Database()
-        all_responses = db.get_session_responses(st.session_state.session_id)
+        data = db.get_sessions_data([st.session_state.session_id]).get(st.session_state.session_id, {})
+        all_responses = data.get('responses', [])
+        summary = data.get('summary')
         
         if all_responses:
-            avg_rating = sum([r['analysis']['overall_rating'] for r in all_responses]) / len(all_responses)
-            highest_character = max(all_responses, key=lambda x: x['analysis']['overall_rating'])
+            # The summary lags while the last responses are still in the outbox
+            if summary and summary['completed'] == len(all_responses):
+                avg_rating = summary['avg_rating']
+                strongest_character = summary['best_character_name']
+            else:
+                avg_rating = sum([r['analysis']['overall_rating'] for r in all_responses]) / len(all_responses)
+                strongest_character = max(all_responses, key=lambda x: x['analysis']['overall_rating'])['character_name']
             
             col1, col2 = st.columns(2)
             
@@ -754,7 +764,7 @@ def show_analysis():
                     session_id=st.session_state.session_id,
                     responses=all_responses,
                     avg_rating=avg_rating,
-                    strongest_character=highest_character['character_name']
+                    strongest_character=strongest_character
                 )
                 
                 st.download_button(
@@ -794,6 +804,10 @@ def main():
             
             if st.button("📊 Dashboard", use_container_width=True):
                 st.switch_page("pages/dashboard.py")
+
+            if is_admin(st.session_state.username):
+                if st.button("🛡️ Admin Analytics", use_container_width=True):
+                    st.switch_page("pages/admin_analytics.py")
         
         st.write("---")
         
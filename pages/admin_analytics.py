@@ -0,0 +1,159 @@
+# pages/admin_analytics.py
+import time
+from datetime import datetime, timedelta
+
+import streamlit as st
+import plotly.express as px
+
+from utils.database import Database, get_setting, is_admin
+from utils import analytics_snapshot
+
+
+st.set_page_config(
+    page_title="Admin Analytics",
+    page_icon="🛡️",
+    layout="wide"
+)
+
+# Hide default Streamlit navigation
+st.markdown("""
+<style>
+    [data-testid="stSidebarNav"] {
+        display: none;
+    }
+</style>
+""", unsafe_allow_html=True)
+
+if 'logged_in' not in st.session_state or not st.session_state.logged_in:
+    st.error("🔒 **Access Denied**: You must be logged in to view this page.")
+    st.info("👉 Please go to the home page and login first.")
+
+    if st.button("🏠 Go to Login Page", use_container_width=True):
+        st.switch_page("app.py")
+
+    st.stop()
+
+if not is_admin(st.session_state.get('username')):
+    st.error("🔒 **Access Denied**: This page is only available to administrators.")
+    if st.button("🏠 Back to Main", use_container_width=True):
+        st.switch_page("app.py")
+    st.stop()
+
+
+def refresh_snapshot(full: bool = False):
+    """Bring the columnar snapshot up to date with the database"""
+    db = Database()
+    try:
+        with st.spinner("Rebuilding snapshot..." if full else "Refreshing snapshot..."):
+            if full:
+                analytics_snapshot.rebuild(db)
+            else:
+                analytics_snapshot.refresh(db)
+    except Exception as e:
+        st.error(f"❌ Could not refresh the analytics snapshot: {e}")
+
+
+def display_sidebar():
+    with st.sidebar:
+        st.image("assets/Mahabharat Krishna Wallpaper Teahub Io.jpg", width=100)
+
+        st.write("### 🧭 Navigation")
+        if st.button("🏠 Main", use_container_width=True):
+            st.switch_page("app.py")
+
+        if st.button("📊 Dashboard", use_container_width=True):
+            st.switch_page("pages/dashboard.py")
+
+        if st.button("🛡️ Admin Analytics", use_container_width=True, type="primary"):
+            st.rerun()
+
+        st.write("---")
+        st.success(f"👤 **{st.session_state.username}**")
+
+        st.write("### 🗂️ Snapshot")
+        if st.button("🔄 Refresh snapshot", use_container_width=True):
+            refresh_snapshot()
+        if st.button("♻️ Full rebuild", use_container_width=True,
+                     help="Re-read every response, e.g. after archiving or deleting sessions"):
+            refresh_snapshot(full=True)
+
+
+def main():
+    display_sidebar()
+
+    st.title("🛡️ Cohort Analytics")
+
+    # Incremental refresh when the snapshot is stale; cheap when nothing changed
+    state = analytics_snapshot.load_state(analytics_snapshot.snapshot_dir())
+    max_age = float(get_setting("ANALYTICS_REFRESH_SECONDS", 300))
+    if state["refreshed_at"] is None or time.time() - state["refreshed_at"] > max_age:
+        refresh_snapshot()
+        state = analytics_snapshot.load_state(analytics_snapshot.snapshot_dir())
+
+    responses, qualities = analytics_snapshot.load()
+    if responses.empty:
+        st.info("No assessments recorded yet.")
+        return
+
+    refreshed = datetime.fromtimestamp(state["refreshed_at"]) if state["refreshed_at"] else None
+    st.caption(
+        f"Snapshot of {state['rows']:,} assessments"
+        + (f", refreshed {refreshed:%Y-%m-%d %H:%M:%S}" if refreshed else "")
+    )
+
+    # Filters
+    first_day = responses["created_at"].min().date()
+    last_day = responses["created_at"].max().date()
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        date_range = st.date_input(
+            "📅 Date range",
+            value=(max(first_day, last_day - timedelta(days=90)), last_day),
+            min_value=first_day,
+            max_value=last_day
+        )
+    with col2:
+        all_characters = sorted(responses["character_name"].cat.categories)
+        characters = st.multiselect("🎭 Characters", all_characters, placeholder="All characters")
+
+    start, end = (date_range[0], date_range[-1]) if date_range else (None, None)
+    responses, qualities = analytics_snapshot.filter_frames(responses, qualities, start, end, characters)
+    if responses.empty:
+        st.warning("No assessments match these filters.")
+        return
+
+    # Headline metrics
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Assessments", f"{len(responses):,}")
+    col2.metric("Users", f"{responses['user_id'].nunique():,}")
+    col3.metric("Sessions", f"{responses['session_id'].nunique():,}")
+    col4.metric("Avg Rating", f"{responses['overall_rating'].mean():.2f}/10")
+
+    st.write("---")
+
+    st.subheader("📊 Rating Distribution by Character")
+    distribution = analytics_snapshot.rating_distribution(responses)
+    fig = px.bar(distribution, x="rating", y="count", color="character_name", barmode="group",
+                 labels={"rating": "Overall rating", "count": "Assessments", "character_name": "Character"})
+    st.plotly_chart(fig, use_container_width=True)
+    st.dataframe(analytics_snapshot.character_summary(responses), use_container_width=True, hide_index=True)
+
+    st.subheader("🎯 Average Quality Ratings")
+    matrix = analytics_snapshot.quality_matrix(qualities)
+    if matrix.empty:
+        st.info("No quality ratings in this range.")
+    else:
+        fig = px.imshow(matrix, text_auto=True, aspect="auto", color_continuous_scale="Blues",
+                        zmin=0, zmax=10, labels={"x": "Quality", "y": "Character", "color": "Avg"})
+        st.plotly_chart(fig, use_container_width=True)
+
+    st.subheader("📈 Weekly Trend")
+    trend = analytics_snapshot.weekly_trend(responses)
+    fig = px.line(trend, x="week", y="avg_rating", color="character_name", markers=True,
+                  hover_data=["assessments"],
+                  labels={"week": "Week", "avg_rating": "Avg overall rating", "character_name": "Character"})
+    st.plotly_chart(fig, use_container_width=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,15 @@
 # pages/dashboard.py
+import html
+import json
+from collections.abc import Mapping
 import streamlit as st
 import plotly.graph_objects as go
 import plotly.express as px
-from utils.database import Database
+import pandas as pd
+from utils.database import Database, get_setting, is_admin, is_coach
+from utils.async_database import AsyncDatabase
+from utils.rating_histograms import quality_column
+from utils import session_metrics
 from datetime import datetime
 from utils.pdf_generator import generate_analysis_report
 from utils.pdf_generator import generate_completion_certificate   
@@ -11,7 +18,8 @@ from utils.visualization import (
     create_bar_chart, 
     create_comparison_chart,
     create_multi_character_radar,
-    create_progress_gauge
+    create_progress_gauge,
+    create_score_trend_chart
 )
 import base64
 from pathlib import Path
@@ -43,9 +51,11 @@ if 'logged_in' not in st.session_state or not st.session_state.logged_in:
 
 
 def datetime_handler(obj):
-    """JSON serializer for datetime objects"""
+    """JSON serializer for datetime objects and response rows"""
     if isinstance(obj, datetime):
         return obj.isoformat()
+    if isinstance(obj, Mapping):
+        return dict(obj)
     raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
 
 
@@ -152,17 +162,41 @@ else:
     """, unsafe_allow_html=True)
 
 
-def load_session_data(session_id):
-    """Load data for a specific session"""
-    db = Database()
-    responses = db.get_session_responses(session_id)
-    return responses
+def load_dashboard_data(session_id):
+    """Load session info, responses, summary and chart aggregates for a session concurrently"""
+    db = AsyncDatabase().sync()
+    data = db.load_dashboard_data(session_id)
+    return data['responses'], data['session_info'], data['summary'], data['metrics']
+
+
+def ordinal(pct):
+    """78.4 -> '78th'"""
+    n = int(round(pct))
+    suffix = "th" if 10 <= n % 100 <= 20 else {1: "st", 2: "nd", 3: "rd"}.get(n % 10, "th")
+    return f"{n}{suffix}"
+
+
+SESSIONS_PAGE_SIZE = 10
+
+
+def load_session_pages(db, username, pages):
+    """Load the first `pages` pages of a user's sessions; returns (sessions, has_more)"""
+    sessions = []
+    cursor = None
+    for _ in range(pages):
+        page = db.list_user_sessions(username, limit=SESSIONS_PAGE_SIZE, cursor=cursor)
+        sessions.extend(page['sessions'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    return sessions, cursor is not None
 
 
 def display_session_list(username):
     """Display list of all sessions for a user by username"""
     db = Database()
-    sessions = db.get_user_sessions_by_username(username)
+    pages = st.session_state.get('session_list_pages', 1)
+    sessions, has_more = load_session_pages(db, username, pages)
     
     if not sessions:
         st.info("📝 No past sessions found. Complete an assessment to see your history.")
@@ -185,12 +219,16 @@ def display_session_list(username):
                 # Add completion badge
                 badge = "✅ Complete" if is_complete else "🔄 In Progress" if has_data else "📝 New"
                 badge_color = "#28a745" if is_complete else "#ffc107" if has_data else "#6c757d"
+                summary_line = ""
+                if session.get('avg_rating') is not None:
+                    summary_line = f"<p>⭐ {session['best_character_name']} · Avg {session['avg_rating']:.1f}/10</p>"
                 
                 st.markdown(f"""
                 <div class="session-card">
                     <h4>📝 Session #{idx + 1} <span style="background: {badge_color}; color: white; padding: 2px 8px; border-radius: 12px; font-size: 10px; margin-left: 8px;">{badge}</span></h4>
                     <p style="font-size: 12px; color: #666;">ID: {session['id'][:12]}...</p>
                     <p>📅 {session['created_at']}</p>
+                    {summary_line}
                 </div>
                 """, unsafe_allow_html=True)
             
@@ -247,17 +285,190 @@ def display_session_list(username):
                         else:
                             st.error("Failed to delete")
     
+    # Load the next page of older sessions
+    if has_more:
+        if st.button("⬇️ Load more sessions", use_container_width=True):
+            st.session_state.session_list_pages = pages + 1
+            st.rerun()
+    
     return selected_session
 
 
-def display_dashboard(responses, session_info=None):
+def display_score_trend(user_id):
+    """Chart how the user's ratings move across sessions"""
+    trend = Database().get_user_score_trend(user_id)
+    if len(trend) < 2:
+        return
+    
+    st.write("### 📈 Your Progress Over Time")
+    qualities = sorted({metric for point in trend for metric in point['qualities']})
+    selected = st.multiselect(
+        "Add qualities to the chart",
+        qualities,
+        format_func=lambda m: m[len('quality_'):].replace('_', ' ').title(),
+        placeholder="Overall ratings only"
+    )
+    fig = create_score_trend_chart(trend, selected)
+    st.plotly_chart(fig, use_container_width=True)
+    st.write("---")
+
+
+SEARCH_PAGE_SIZE = 20
+
+
+def display_answer_search():
+    """Ranked full-text search over every participant's answers"""
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        query = st.text_input("🔎 Search answers", placeholder="e.g. mentor burnout, or lead* for prefixes")
+    with col2:
+        characters = {name: character_id for character_id, name in Database().get_characters().items()}
+        character = st.selectbox("🎭 Character", ["All characters"] + list(characters))
+    if not query:
+        return
+    
+    # Start from the first page whenever the query or filter changes
+    search_key = (query, character)
+    if st.session_state.get('answer_search_key') != search_key:
+        st.session_state.answer_search_key = search_key
+        st.session_state.answer_search_page = 1
+    page = st.session_state.answer_search_page
+    
+    found = Database().search_answers(query, character_id=characters.get(character),
+                                      page=page, page_size=SEARCH_PAGE_SIZE)
+    if not found['total']:
+        st.info("No answers match this search.")
+        return
+    
+    st.caption(f"{found['total']:,} answers from {found['participants']:,} participants · "
+               f"page {found['page']} of {found['pages']}")
+    for result in found['results']:
+        st.markdown(f"""
+        <div class="session-card">
+            <h4>👤 {html.escape(result['username'])} · 🎭 {html.escape(result['character_name'])} · Q{result['question_no']}</h4>
+            <p style="font-size: 12px; color: #666;">{html.escape(result['question'])}</p>
+            <p>{html.escape(result['snippet'])}</p>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if st.button("⬅️ Previous", disabled=page <= 1, use_container_width=True):
+            st.session_state.answer_search_page = page - 1
+            st.rerun()
+    with col3:
+        if st.button("Next ➡️", disabled=page >= found['pages'], use_container_width=True):
+            st.session_state.answer_search_page = page + 1
+            st.rerun()
+
+
+def display_coach_view():
+    """Team comparison and answer search for coaches"""
+    st.markdown("""
+    <div class="dashboard-header">
+        <h1>🧑‍🏫 Coach View</h1>
+        <p>Compare your team's character assessments side by side</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    team_tab, search_tab = st.tabs(["👥 Team", "🔎 Answer Search"])
+    with team_tab:
+        display_team_comparison()
+    with search_tab:
+        display_answer_search()
+
+
+def display_team_comparison():
+    """Compare the latest sessions of a team of users, loaded with batch reads"""
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        team_text = st.text_area(
+            "👥 Team usernames",
+            value=st.session_state.get('coach_team', ''),
+            placeholder="One username per line, or comma-separated",
+            height=100
+        )
+    with col2:
+        per_member = st.number_input("Sessions per member", min_value=1, max_value=10, value=1)
+    st.session_state.coach_team = team_text
+    
+    usernames = [u.strip() for u in team_text.replace(",", "\n").splitlines() if u.strip()]
+    if not usernames:
+        st.info("Enter the usernames of the people you coach.")
+        return
+    
+    db = Database()
+    user_ids = db.get_user_ids(usernames)
+    unknown = [u for u in usernames if u not in user_ids]
+    if unknown:
+        st.warning(f"Unknown usernames: {', '.join(unknown)}")
+    
+    latest = db.get_latest_sessions(list(user_ids.values()), limit=per_member)
+    session_ids = [session['id'] for sessions in latest.values() for session in sessions]
+    data = db.get_sessions_data(session_ids)
+    if not data:
+        st.info("No completed assessments for this team yet.")
+        return
+    metrics = db.get_sessions_metrics(list(data))
+    for session_id, entry in data.items():
+        entry['metrics'] = session_metrics.for_responses(metrics.get(session_id), entry['responses'])
+    
+    # One row per session, one column per character
+    rows = []
+    for session_id, entry in data.items():
+        info, summary = entry['session_info'], entry['summary']
+        row = {
+            'Member': info['username'],
+            'Date': info['created_at'],
+            'Completed': info['completed'],
+            'Avg Rating': round(summary['avg_rating'], 2) if summary else None,
+            'Best Character': summary['best_character_name'] if summary else None,
+        }
+        row.update(entry['metrics']['characters'])
+        rows.append(row)
+    table = pd.DataFrame(rows).sort_values(['Member', 'Date'], ascending=[True, False])
+    
+    st.write("### 📋 Team Overview")
+    st.dataframe(table, use_container_width=True, hide_index=True)
+    
+    # Latest session of each member, character by character
+    latest_rows = table.drop_duplicates('Member')
+    characters = [c for c in table.columns if c not in ('Member', 'Date', 'Completed', 'Avg Rating', 'Best Character')]
+    if characters:
+        st.write("### 🎭 Latest Ratings by Character")
+        long = latest_rows.melt(id_vars=['Member'], value_vars=characters,
+                                var_name='Character', value_name='Rating').dropna()
+        fig = px.bar(long, x='Character', y='Rating', color='Member', barmode='group',
+                     range_y=[0, 10.5])
+        st.plotly_chart(fig, use_container_width=True)
+    
+    if per_member > 1:
+        st.write("### 📈 Average Rating Across Attempts")
+        fig = px.line(table.dropna(subset=['Avg Rating']).sort_values('Date'), x='Date', y='Avg Rating',
+                      color='Member', markers=True, range_y=[0, 10.5])
+        st.plotly_chart(fig, use_container_width=True)
+    
+    # Full dashboard for one session, from the data already loaded
+    st.write("---")
+    labels = {
+        session_id: f"{entry['session_info']['username']} · {entry['session_info']['created_at']}"
+        for session_id, entry in data.items()
+    }
+    selected = st.selectbox("🔍 Open a session", [None] + list(labels),
+                            format_func=lambda sid: "Choose a session..." if sid is None else labels[sid])
+    if selected:
+        entry = data[selected]
+        display_dashboard(entry['responses'], entry['session_info'], entry['summary'], entry['metrics'])
+
+
+def display_dashboard(responses, session_info=None, summary=None, metrics=None):
     """Display complete dashboard for a session"""
     
     # Header with Krishna-Arjuna theme
-    # Get username from session state or session_info
-    username = st.session_state.get('username')
-    if not username and session_info:
-        username = session_info.get('username', 'User')
+    # The session owner's name, which differs from the viewer's in the coach view
+    username = session_info.get('username') if session_info else None
+    if not username:
+        username = st.session_state.get('username')
     if not username:
         username = 'User'
             
@@ -290,9 +501,19 @@ def display_dashboard(responses, session_info=None):
     # Overall metrics
     st.write("## 📈 Overall Summary")
     
-    avg_rating = sum([r['analysis']['overall_rating'] for r in responses]) / len(responses)
-    highest_character = max(responses, key=lambda x: x['analysis']['overall_rating'])
-    total_strengths = sum([len(r['analysis'].get('strengths', [])) for r in responses])
+    # Prefer the materialized summary row while it covers every response (ones still in
+    # the outbox are listed but not summarised yet); otherwise derive it from the analyses
+    if summary and summary['completed'] == len(responses):
+        avg_rating = summary['avg_rating']
+        strongest_name = summary['best_character_name']
+        strongest_rating = summary['best_rating']
+        total_strengths = summary['strength_count']
+    else:
+        avg_rating = sum([r['analysis']['overall_rating'] for r in responses]) / len(responses)
+        highest_character = max(responses, key=lambda x: x['analysis']['overall_rating'])
+        strongest_name = highest_character['character_name']
+        strongest_rating = highest_character['analysis']['overall_rating']
+        total_strengths = sum([len(r['analysis'].get('strengths', [])) for r in responses])
     
     col1, col2, col3, col4 = st.columns(4)
     
@@ -315,7 +536,7 @@ def display_dashboard(responses, session_info=None):
     with col3:
         st.markdown(f"""
         <div class="metric-card">
-            <h2 style="color: #ffc107;">⭐ {highest_character['character_name']}</h2>
+            <h2 style="color: #ffc107;">⭐ {strongest_name}</h2>
             <p>Strongest Archetype</p>
         </div>
         """, unsafe_allow_html=True)
@@ -343,7 +564,7 @@ def display_dashboard(responses, session_info=None):
         Your average alignment score is **{avg_rating:.1f}/10**, showing your connection to these 
         timeless archetypes.
         
-        **Strongest Alignment:** {highest_character['character_name']} ({highest_character['analysis']['overall_rating']:.1f}/10)
+        **Strongest Alignment:** {strongest_name} ({strongest_rating:.1f}/10)
         
         Continue exploring to discover more about your professional personality!
         """)
@@ -352,14 +573,17 @@ def display_dashboard(responses, session_info=None):
     st.write("---")
     st.write("## 📊 Comparative Analysis")
     
+    # Chart aggregates computed in SQL; derived from the analyses while responses are still in the outbox
+    metrics = session_metrics.for_responses(metrics, responses)
+    
     col1, col2 = st.columns(2)
     
     with col1:
-        fig = create_bar_chart(responses)
+        fig = create_bar_chart(metrics['characters'])
         st.plotly_chart(fig, use_container_width=True)
     
     with col2:
-        fig = create_comparison_chart(responses)
+        fig = create_comparison_chart(metrics['qualities'])
         st.plotly_chart(fig, use_container_width=True)
     
     # Multi-character radar comparison
@@ -371,6 +595,9 @@ def display_dashboard(responses, session_info=None):
     # Individual character analysis
     st.write("---")
     st.write("## 🎭 Individual Character Deep Dive")
+    
+    # Population percentiles from the precomputed rating histograms
+    percentiles = Database().get_rating_percentiles(responses)
 
     for idx, response in enumerate(responses):
         with st.expander(f"**{response['character_name']}** - Rating: {response['analysis']['overall_rating']:.1f}/10", expanded=False):
@@ -387,6 +614,9 @@ def display_dashboard(responses, session_info=None):
                 st.write(f"### Assessment Summary")
                 st.write(f"**Character:** {response['character_name']}")
                 st.write(f"**Overall Rating:** {response['analysis']['overall_rating']:.1f}/10")
+                overall_pct = percentiles.get(response['character_id'], {}).get('overall_rating')
+                if overall_pct is not None:
+                    st.write(f"**Population Rank:** you are in the {ordinal(overall_pct)} percentile for {response['character_name']}")
                 st.write(f"**Passage Read:** {'✅ Yes' if response['read_passage'] else '❌ No'}")
                 st.write(f"**Completed:** {response['created_at']}")
             
@@ -418,13 +648,24 @@ def display_dashboard(responses, session_info=None):
                 fig = create_radar_chart(response['analysis']['quality_ratings'], response['character_name'])
                 st.plotly_chart(fig, use_container_width=True, 
                             key=f"char_radar_{response['character_id']}_{idx}_{response.get('created_at', '')}")
+                
+                character_pcts = percentiles.get(response['character_id'], {})
+                quality_ranks = [
+                    f"{quality}: {ordinal(character_pcts[quality_column(quality)])}"
+                    for quality in response['analysis']['quality_ratings']
+                    if quality_column(quality) in character_pcts
+                ]
+                if quality_ranks:
+                    st.caption("Percentile vs. everyone assessed for this character — " + " · ".join(quality_ranks))
             
             # Detailed analysis
             with st.expander("📝 Detailed Analysis & Insights"):
                 st.write(response['analysis'].get('analysis', ''))
             
-            # User responses
-            with st.expander("📋 Your Responses"):
+            # User responses; a collapsed expander still runs its body, so the
+            # stored answers are only decoded once the toggle is switched on
+            if st.toggle("📋 Show Your Responses",
+                         key=f"char_answers_{response['character_id']}_{idx}_{response.get('created_at', '')}"):
                 st.json(response['responses'])
 
     # Download section
@@ -438,18 +679,23 @@ def display_dashboard(responses, session_info=None):
     
     with col1:
         import json
-        report = {
-            'user': username,
-            'session_id': st.session_state.get('session_id'),
-            'completed_assessments': len(responses),
-            'average_rating': avg_rating,
-            'strongest_archetype': highest_character['character_name'],
-            'assessments': responses
-        }
+        report_session_id = st.session_state.get('session_id')
+
+        def json_report():
+            # Built when the button is clicked, so rendering the page doesn't decode every answer
+            report = {
+                'user': username,
+                'session_id': report_session_id,
+                'completed_assessments': len(responses),
+                'average_rating': avg_rating,
+                'strongest_archetype': strongest_name,
+                'assessments': responses
+            }
+            return json.dumps(report, indent=2, default=datetime_handler)
         
         st.download_button(
             label="📄 Download JSON Report",
-            data=json.dumps(report, indent=2, default=datetime_handler),
+            data=json_report,
             file_name=f"mahabharata_assessment_{st.session_state.get('session_id', 'report')}.json",
             mime="application/json",
             use_container_width=True
@@ -466,7 +712,7 @@ def display_dashboard(responses, session_info=None):
             session_id=session_id,
             responses=responses,
             avg_rating=avg_rating,
-            strongest_character=highest_character['character_name']
+            strongest_character=strongest_name
         )
         
         st.download_button(
@@ -514,6 +760,31 @@ def display_dashboard(responses, session_info=None):
     if st.button("🏠 Start New Assessment", use_container_width=True):
         st.switch_page("app.py")
 
+def display_query_diagnostics():
+    """Sidebar table of per-query latency from Database.get_query_stats()"""
+    stats = Database().get_query_stats()
+    with st.expander("🩺 Database Diagnostics"):
+        rows = [
+            {
+                "query": name,
+                "calls": q["calls"],
+                "errors": q["errors"],
+                "rows": q["rows"],
+                "p50 ms": q["phases"].get("total", {}).get("p50_ms", 0),
+                "p95 ms": q["phases"].get("total", {}).get("p95_ms", 0),
+                "max ms": q["phases"].get("total", {}).get("max_ms", 0),
+            }
+            for name, q in stats["queries"].items()
+        ]
+        st.dataframe(rows, hide_index=True, use_container_width=True)
+        st.caption(f"Slow queries (>{stats['slow_query_ms']:.0f} ms): {stats['slow_queries']}")
+        st.download_button(
+            "⬇️ Download snapshot",
+            data=json.dumps(stats, indent=2, default=str),
+            file_name="query_stats.json",
+            mime="application/json"
+        )
+
 def main():
     # Sidebar navigation - SAME AS APP.PY
     with st.sidebar:
@@ -527,6 +798,10 @@ def main():
             
             if st.button("📊 Dashboard", use_container_width=True, type="primary"):
                 st.rerun()
+
+            if is_admin(st.session_state.username):
+                if st.button("🛡️ Admin Analytics", use_container_width=True):
+                    st.switch_page("pages/admin_analytics.py")
         
         st.write("---")
         
@@ -534,9 +809,12 @@ def main():
             st.success(f"👤 **{st.session_state.username}**")
             
             # Show view mode selector
+            view_modes = ["Current Session", "Past Sessions"]
+            if is_coach(st.session_state.username):
+                view_modes.append("Coach View")
             view_mode = st.radio(
                 "📂 View Mode:",
-                ["Current Session", "Past Sessions"],
+                view_modes,
                 help="Switch between current session and history"
             )
             
@@ -555,6 +833,9 @@ def main():
         st.write("---")
         st.write("### ℹ️ About")
         st.write("Explore your character assessments and discover insights from the Mahabharata.")
+        
+        if str(get_setting("DB_SHOW_DIAGNOSTICS", "0")) == "1":
+            display_query_diagnostics()
     
     # Get view mode from session state (default to "Current Session")
     view_mode = st.session_state.get('dashboard_view_mode', 'Current Session')
@@ -567,8 +848,8 @@ def main():
                 st.switch_page("app.py")
             return
         
-        responses = load_session_data(st.session_state.session_id)
-        display_dashboard(responses)
+        responses, session_info, summary, metrics = load_dashboard_data(st.session_state.session_id)
+        display_dashboard(responses, session_info, summary, metrics)
     
     elif view_mode == "Past Sessions":
         if 'username' not in st.session_state:
@@ -584,12 +865,18 @@ def main():
         </div>
         """, unsafe_allow_html=True)
         
+        if st.session_state.get('user_id'):
+            display_score_trend(st.session_state.user_id)
+        
         selected_session = display_session_list(st.session_state.username)
         
         if selected_session:
             st.write("---")
-            responses = load_session_data(selected_session)
-            display_dashboard(responses)
+            responses, session_info, summary, metrics = load_dashboard_data(selected_session)
+            display_dashboard(responses, session_info, summary, metrics)
+    
+    elif view_mode == "Coach View" and is_coach(st.session_state.username):
+        display_coach_view()
 
 
 
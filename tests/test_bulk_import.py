@@ -0,0 +1,48 @@
+# tests/test_bulk_import.py
+"""Bulk imports into a database that already has users."""
+import pytest
+
+from utils.bulk_import import bulk_import
+
+
+def _record(username, created_at="2024-03-01T10:00:00"):
+    return {
+        "username": username,
+        "created_at": created_at,
+        "responses": [{
+            "character_id": 0,
+            "character_name": "Arjun",
+            "read_passage": True,
+            "responses": ["An answer"],
+            "analysis": {"overall_rating": 7.5, "quality_ratings": {"Focus": 8}},
+        }],
+    }
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    from utils.database import Database
+
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'import.db'}")
+    monkeypatch.setenv("RESPONSE_OUTBOX", "0")
+    return Database()
+
+
+def test_import_attaches_sessions_to_existing_users(db):
+    alice = db.create_or_get_user("alice")
+
+    totals = bulk_import(db, [_record("alice"), _record("bob")])
+
+    assert totals["sessions"] == 2 and totals["responses"] == 2
+    sessions = db.get_user_sessions(alice)
+    assert len(sessions) == 1 and sessions[0]["completed"] == 1
+    assert db.get_user_by_username("alice")["id"] == alice
+    assert db.get_user_by_username("bob") is not None
+
+
+def test_import_ignores_record_user_id_of_registered_username(db):
+    alice = db.create_or_get_user("alice")
+
+    bulk_import(db, [dict(_record("alice"), user_id="00000000-0000-0000-0000-00000000000a")])
+
+    assert len(db.get_user_sessions(alice)) == 1
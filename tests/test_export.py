@@ -0,0 +1,62 @@
+# tests/test_export.py
+"""Incremental exports driven by the stored watermark."""
+import json
+
+import pytest
+
+from utils.bulk_import import bulk_import
+from utils.export import export, load_watermark, save_watermark
+
+
+def _record(username, created_at):
+    return {
+        "username": username,
+        "created_at": created_at,
+        "responses": [{
+            "character_id": 0,
+            "character_name": "Arjun",
+            "read_passage": True,
+            "responses": ["An answer"],
+            "analysis": {"overall_rating": 7.5, "quality_ratings": {"Focus": 8}},
+        }],
+    }
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    from utils.database import Database
+
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'export.db'}")
+    monkeypatch.setenv("RESPONSE_OUTBOX", "0")
+    return Database()
+
+
+def _exported_users(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)["user_id"] for line in f]
+
+
+def test_backdated_import_is_exported_by_next_run(db, tmp_path):
+    state = str(tmp_path / "export.state")
+    bulk_import(db, [_record("alice", "2024-03-01T10:00:00")])
+    first = export(db, str(tmp_path / "first.jsonl"), since=load_watermark(state))
+    save_watermark(state, first["watermark"])
+
+    # Imported after the first export, but dated before everything it exported
+    bulk_import(db, [_record("bob", "2023-01-01T09:00:00")])
+    second = export(db, str(tmp_path / "second.jsonl"), since=load_watermark(state))
+
+    bob = db.get_user_by_username("bob")["id"]
+    assert first["rows"] == 1 and second["rows"] == 1
+    assert _exported_users(tmp_path / "second.jsonl") == [bob]
+    assert second["watermark"][0] > first["watermark"][0]
+
+
+def test_old_created_at_state_exports_everything(db, tmp_path):
+    state = tmp_path / "export.state"
+    state.write_text(json.dumps({"created_at": "2030-01-01 00:00:00", "id": 99}))
+    bulk_import(db, [_record("alice", "2024-03-01T10:00:00")])
+
+    result = export(db, str(tmp_path / "all.jsonl"), since=load_watermark(str(state)))
+
+    assert result["rows"] == 1
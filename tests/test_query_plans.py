@@ -0,0 +1,66 @@
+# tests/test_query_plans.py
+"""Every hot query keeps its index on a seeded SQLite database.
+
+Runs utils.query_plans.check against a fresh database filled with synthetic
+assessments, so a schema or query change that falls back to a scan, a
+temporary sort or a different index fails here.
+"""
+import pytest
+
+from utils.query_plans import check, hot_queries
+
+
+# Indexes each plan must use, in plan order; sqlite_autoindex_* back UNIQUE and PRIMARY KEY constraints
+EXPECTED_INDEXES = {
+    "get_user_by_username": ["sqlite_autoindex_p1_mb_users_2"],
+    "get_user_by_username (directory)": ["sqlite_autoindex_p1_mb_user_directory_1"],
+    "get_user_by_username (user shard)": ["sqlite_autoindex_p1_mb_users_1"],
+    "get_session_info": ["sqlite_autoindex_p1_mb_sessions_1", "sqlite_autoindex_p1_mb_users_1"],
+    "get_session_responses": ["idx_p1_mb_character_responses_session_created"],
+    "get_session_summary": ["sqlite_autoindex_p1_mb_session_summary_1"],
+    "get_user_sessions": ["idx_p1_mb_sessions_user_created", "sqlite_autoindex_p1_mb_session_summary_1"],
+    "list_user_sessions": ["idx_p1_mb_sessions_user_created", "sqlite_autoindex_p1_mb_session_summary_1"],
+    "get_user_score_trend": ["sqlite_autoindex_p1_mb_user_score_trend_1", "sqlite_autoindex_p1_mb_sessions_1"],
+    "get_sessions_data (sessions)": ["sqlite_autoindex_p1_mb_sessions_1", "sqlite_autoindex_p1_mb_users_1",
+                                     "sqlite_autoindex_p1_mb_session_summary_1"],
+    "get_sessions_data (responses)": ["idx_p1_mb_character_responses_session_created"],
+    "get_session_metrics (characters)": ["idx_p1_mb_user_score_trend_session_metric"],
+    "get_session_metrics (qualities)": ["idx_p1_mb_user_score_trend_session_metric"],
+    "get_latest_sessions": ["idx_p1_mb_sessions_user_created"],
+    "save_character_responses (stored keys)": ["idx_p1_mb_character_responses_session_character"],
+    # "0:M1" is the FTS5 MATCH lookup on the answer column
+    "search_answers (count)": ["0:M1"],
+    "search_answers (hits)": ["0:M1", "sqlite_autoindex_p1_mb_users_1"],
+}
+
+QUERY_NAMES = [name for name, _, _ in hot_queries("sqlite")]
+
+
+@pytest.fixture(scope="module")
+def plans(tmp_path_factory):
+    """check() results by query name, on a migrated and seeded SQLite database"""
+    from utils.bulk_import import bulk_import
+    from utils.database import Database
+    from utils.synthetic_data import generate_records
+
+    path = tmp_path_factory.mktemp("query_plans") / "plans.db"
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("DATABASE_URL", f"sqlite:///{path}")
+        mp.setenv("RESPONSE_OUTBOX", "0")
+        db = Database()
+        totals = bulk_import(db, generate_records(60, seed=7, max_sessions=8))
+        assert totals["responses"] > 0
+        return {result["query"]: result for result in check(db)}
+
+
+def test_every_hot_query_has_an_expected_index():
+    assert sorted(EXPECTED_INDEXES) == sorted(QUERY_NAMES)
+
+
+@pytest.mark.parametrize("query", QUERY_NAMES)
+def test_hot_query_uses_expected_index(plans, query):
+    result = plans[query]
+    assert result["problems"] == [], result["plan"]
+
+    used = [line.split(" INDEX ", 1)[1].split(" ", 1)[0] for line in result["plan"] if " INDEX " in line]
+    assert used == EXPECTED_INDEXES[query], result["plan"]
@@ -0,0 +1,36 @@
+# tests/test_session_pages.py
+"""Keyset pagination over a user's sessions."""
+from datetime import datetime
+
+import pytest
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    from utils.database import Database
+
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'pages.db'}")
+    monkeypatch.setenv("RESPONSE_OUTBOX", "0")
+    return Database()
+
+
+def test_pages_keep_sessions_within_one_second(db):
+    user_id = db.create_or_get_user("alice")
+    created = [datetime(2024, 3, 1, 10, 0, 0, micros) for micros in (100, 200, 300, 400)]
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        for n, created_at in enumerate(created):
+            cursor.execute(
+                "INSERT INTO p1_mb_sessions (id, user_id, created_at, completed) VALUES (%s, %s, %s, 0)",
+                (f"session-{n}", user_id, created_at)
+            )
+
+    seen, cursor = [], None
+    while True:
+        page = db.list_user_sessions("alice", limit=1, cursor=cursor)
+        seen += [session["id"] for session in page["sessions"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == ["session-3", "session-2", "session-1", "session-0"]
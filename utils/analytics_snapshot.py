@@ -0,0 +1,314 @@
+# utils/analytics_snapshot.py
+"""Columnar snapshot of all responses for the admin cohort analytics page.
+
+The snapshot lives in ANALYTICS_SNAPSHOT_DIR as Parquet part files:
+
+    responses/part-NNNNN.parquet   one row per response (overall rating etc.)
+    qualities/part-NNNNN.parquet   one row per (response, quality rating)
+    state.json                     per-shard response id watermark and live part numbers
+
+`refresh` streams only rows past the watermark (Database.iter_responses)
+and writes them as new parts, PART_ROWS rows at a time; once there are more
+than MAX_PARTS parts they are merged into one. Readers only open the parts
+listed in state.json, so a part is published by saving the state after it
+is written, and merged-away parts are deleted only after the state stops
+listing them; a crash in between leaves unlisted files that the next merge
+removes. The watermark is the last response id of each shard, so bulk
+imports with older created_at values are picked up by the next refresh;
+deleted or archived sessions are only reconciled by `rebuild`. Loaded
+frames are kept in memory per process until the snapshot changes, and all
+aggregations are vectorized pandas group-bys over them.
+
+    python -m utils.analytics_snapshot refresh
+    python -m utils.analytics_snapshot rebuild
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  (Parquet engine for pandas)
+except ImportError:
+    pyarrow = None
+
+from utils.database import get_setting
+from utils.rating_histograms import quality_column
+
+
+PART_ROWS = 50000
+MAX_PARTS = 20
+
+_frames: Dict[str, Tuple[Tuple, pd.DataFrame, pd.DataFrame]] = {}
+_refresh_lock = threading.Lock()
+
+
+def snapshot_dir() -> str:
+    return get_setting("ANALYTICS_SNAPSHOT_DIR", "analytics_snapshot")
+
+
+def _state_path(directory: str) -> str:
+    return os.path.join(directory, "state.json")
+
+
+def load_state(directory: str) -> Dict:
+    path = _state_path(directory)
+    if not os.path.exists(path):
+        return {"watermark": None, "parts": 0, "part_numbers": [], "next_part": 1, "rows": 0,
+                "refreshed_at": None}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_state(directory: str, state: Dict):
+    tmp_path = _state_path(directory) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, _state_path(directory))
+
+
+def _rating(value) -> float:
+    return float(value) if isinstance(value, (int, float)) else np.nan
+
+
+def _to_frames(rows: List[Dict]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    responses = pd.DataFrame({
+        "id": np.array([r["id"] for r in rows], dtype="int64"),
+        "session_id": [r["session_id"] for r in rows],
+        "user_id": [r["user_id"] for r in rows],
+        "character_id": np.array([r["character_id"] for r in rows], dtype="int32"),
+        "character_name": [r["character_name"] for r in rows],
+        "created_at": pd.to_datetime([r["created_at"] for r in rows]),
+        "overall_rating": np.array(
+            [_rating(r["analysis"].get("overall_rating")) for r in rows], dtype="float32"
+        ),
+        "strength_count": np.array(
+            [len(r["analysis"].get("strengths") or []) for r in rows], dtype="int16"
+        ),
+    })
+    quality_rows = [
+        (r["id"], r["character_name"], r["created_at"], quality_column(name)[len("quality_"):], float(value))
+        for r in rows
+        for name, value in (r["analysis"].get("quality_ratings") or {}).items()
+        if isinstance(value, (int, float))
+    ]
+    qualities = pd.DataFrame(
+        quality_rows, columns=["response_id", "character_name", "created_at", "quality", "rating"]
+    )
+    qualities["created_at"] = pd.to_datetime(qualities["created_at"])
+    qualities["rating"] = qualities["rating"].astype("float32")
+    return responses, qualities
+
+
+def _part_path(directory: str, name: str, number: int) -> str:
+    return os.path.join(directory, name, f"part-{number:05d}.parquet")
+
+
+def _part_numbers(directory: str, state: Dict) -> List[int]:
+    """Live parts; snapshots written before part_numbers was recorded list every file"""
+    if "part_numbers" in state:
+        return list(state["part_numbers"])
+    paths = glob.glob(os.path.join(directory, "responses", "part-*.parquet"))
+    return sorted(int(os.path.basename(p)[len("part-"):-len(".parquet")]) for p in paths)
+
+
+def _write_part(directory: str, number: int, responses: pd.DataFrame, qualities: pd.DataFrame):
+    for name, frame in (("responses", responses), ("qualities", qualities)):
+        os.makedirs(os.path.join(directory, name), exist_ok=True)
+        # Written under a temporary name, so a crash never leaves a truncated part behind
+        tmp_path = _part_path(directory, name, number) + ".tmp"
+        frame.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, _part_path(directory, name, number))
+
+
+def _read_all(directory: str, numbers: List[int]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    frames = []
+    for name in ("responses", "qualities"):
+        paths = [_part_path(directory, name, number) for number in numbers]
+        frames.append(pd.concat([pd.read_parquet(p) for p in paths], ignore_index=True) if paths else None)
+    return frames[0], frames[1]
+
+
+def _merge_parts(directory: str, state: Dict):
+    old_numbers = _part_numbers(directory, state)
+    responses, qualities = _read_all(directory, old_numbers)
+    number = state["next_part"]
+    # The merged part stays invisible until the state lists it instead of the old ones
+    _write_part(directory, number, responses, qualities)
+    state.update(parts=1, part_numbers=[number], next_part=number + 1)
+    _save_state(directory, state)
+    # Old parts, plus files a crash left unlisted
+    for name in ("responses", "qualities"):
+        for path in glob.glob(os.path.join(directory, name, "part-*.parquet*")):
+            if path != _part_path(directory, name, number):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+def refresh(db, directory: str = None) -> Dict:
+    """Append responses newer than the snapshot watermark; returns the new state"""
+    if pyarrow is None:
+        raise RuntimeError("The analytics snapshot needs the pyarrow package")
+    directory = directory or snapshot_dir()
+    with _refresh_lock:
+        os.makedirs(directory, exist_ok=True)
+        state = load_state(directory)
+        if any(isinstance(value, str) for value in state["watermark"] or ()):
+            # Old (created_at, id) watermark: it may have skipped backdated rows
+            shutil.rmtree(directory)
+            os.makedirs(directory)
+            state = load_state(directory)
+        state["part_numbers"] = _part_numbers(directory, state)
+        since = tuple(state["watermark"]) if state["watermark"] else None
+
+        batch = []
+
+        def flush():
+            responses, qualities = _to_frames(batch)
+            _write_part(directory, state["next_part"], responses, qualities)
+            state["watermark"] = list(batch[-1]["watermark"])
+            state["part_numbers"].append(state["next_part"])
+            state["parts"] += 1
+            state["next_part"] += 1
+            state["rows"] += len(batch)
+            # Parts are durable before the watermark moves past them
+            _save_state(directory, state)
+            batch.clear()
+
+        for row in db.iter_responses(since):
+            batch.append(row)
+            if len(batch) >= PART_ROWS:
+                flush()
+        if batch:
+            flush()
+
+        if state["parts"] > MAX_PARTS:
+            _merge_parts(directory, state)
+        state["refreshed_at"] = time.time()
+        _save_state(directory, state)
+        return state
+
+
+def rebuild(db, directory: str = None) -> Dict:
+    """Drop the snapshot and build it again from every stored response"""
+    directory = directory or snapshot_dir()
+    with _refresh_lock:
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+        _frames.pop(directory, None)
+    return refresh(db, directory)
+
+
+def load(directory: str = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """(responses, qualities) frames, re-read only when the snapshot has changed"""
+    directory = directory or snapshot_dir()
+    state = load_state(directory)
+    version = (state["next_part"], tuple(state["watermark"] or ()))
+    cached = _frames.get(directory)
+    if cached is not None and cached[0] == version:
+        return cached[1], cached[2]
+
+    try:
+        responses, qualities = _read_all(directory, _part_numbers(directory, state))
+    except FileNotFoundError:
+        # A merge replaced the parts after the state was read; the new state lists the merged one
+        state = load_state(directory)
+        version = (state["next_part"], tuple(state["watermark"] or ()))
+        responses, qualities = _read_all(directory, _part_numbers(directory, state))
+    if responses is None:
+        responses, qualities = _to_frames([])
+    for frame in (responses, qualities):
+        frame["character_name"] = frame["character_name"].astype("category")
+        # Weeks start on Monday
+        frame["week"] = frame["created_at"].dt.to_period("W-SUN").dt.start_time
+    qualities["quality"] = qualities["quality"].astype("category")
+    _frames[directory] = (version, responses, qualities)
+    return responses, qualities
+
+
+def filter_frames(responses: pd.DataFrame, qualities: pd.DataFrame, start=None, end=None,
+                  characters: Optional[List[str]] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Restrict both frames to a date range (inclusive) and a set of characters"""
+    r_mask = np.ones(len(responses), dtype=bool)
+    q_mask = np.ones(len(qualities), dtype=bool)
+    if start is not None:
+        r_mask &= (responses["created_at"] >= pd.Timestamp(start)).to_numpy()
+        q_mask &= (qualities["created_at"] >= pd.Timestamp(start)).to_numpy()
+    if end is not None:
+        end = pd.Timestamp(end) + pd.Timedelta(days=1)
+        r_mask &= (responses["created_at"] < end).to_numpy()
+        q_mask &= (qualities["created_at"] < end).to_numpy()
+    if characters:
+        r_mask &= responses["character_name"].isin(characters).to_numpy()
+        q_mask &= qualities["character_name"].isin(characters).to_numpy()
+    return responses[r_mask], qualities[q_mask]
+
+
+def character_summary(responses: pd.DataFrame) -> pd.DataFrame:
+    """Per character: assessments, mean, median and quartiles of overall_rating"""
+    grouped = responses.groupby("character_name", observed=True)["overall_rating"]
+    return pd.DataFrame({
+        "assessments": grouped.size(),
+        "mean": grouped.mean(),
+        "p25": grouped.quantile(0.25),
+        "median": grouped.median(),
+        "p75": grouped.quantile(0.75),
+    }).reset_index().round(2)
+
+
+def rating_distribution(responses: pd.DataFrame) -> pd.DataFrame:
+    """Counts per character per whole-point overall_rating bucket (1-10)"""
+    buckets = np.clip(np.floor(responses["overall_rating"].to_numpy()), 1, 10)
+    frame = pd.DataFrame({"character_name": responses["character_name"].to_numpy(), "rating": buckets})
+    return (frame.dropna()
+                 .groupby(["character_name", "rating"], observed=True)
+                 .size()
+                 .reset_index(name="count"))
+
+
+def quality_matrix(qualities: pd.DataFrame, top_n: int = 12) -> pd.DataFrame:
+    """Mean rating per character x quality, for the `top_n` most-rated qualities"""
+    if qualities.empty:
+        return pd.DataFrame()
+    top = qualities["quality"].value_counts().nlargest(top_n).index
+    subset = qualities[qualities["quality"].isin(top)]
+    matrix = subset.pivot_table(index="character_name", columns="quality", values="rating",
+                                aggfunc="mean", observed=True)
+    matrix.columns = [str(c).replace("_", " ").title() for c in matrix.columns]
+    return matrix.round(2)
+
+
+def weekly_trend(responses: pd.DataFrame) -> pd.DataFrame:
+    """Mean overall_rating and assessment count per week per character"""
+    return (responses.groupby(["week", "character_name"], observed=True)["overall_rating"]
+                     .agg(["mean", "size"])
+                     .rename(columns={"mean": "avg_rating", "size": "assessments"})
+                     .reset_index())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the admin analytics snapshot")
+    parser.add_argument("command", choices=["refresh", "rebuild"])
+    parser.add_argument("--dir", default=None, help="Snapshot directory (default: ANALYTICS_SNAPSHOT_DIR)")
+    args = parser.parse_args()
+
+    from utils.database import Database
+    db = Database()
+
+    started = time.perf_counter()
+    state = (refresh if args.command == "refresh" else rebuild)(db, args.dir)
+    print(f"Snapshot holds {state['rows']} responses in {state['parts']} parts "
+          f"({time.perf_counter() - started:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+# utils/answer_search.py
+"""Full-text search over participants' free-text answers.
+
+p1_mb_answer_search holds one row per text answer: its session, owner,
+character, question number (1-based position in the response's answer
+list), question and answer. Rows are written in the same transaction as the
+response, live on the owner's shard and are deleted with their session;
+bulk imports and shard moves rebuild them per session with `rebuild_search`.
+The answer column has a FULLTEXT index on MySQL and an FTS5 table kept in
+sync by triggers on SQLite.
+
+`search` matches any of the query's words (a trailing * matches a prefix),
+ranked by MySQL relevance or SQLite bm25. Each shard returns its top
+page * page_size hits, which are merged, so a page costs a few index
+lookups however many answers are stored. Scores are per shard, so with
+several shards the ranking across them is approximate.
+
+    python -m utils.answer_search search "mentor burnout" --page 1
+    python -m utils.answer_search rebuild
+"""
+import argparse
+import heapq
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.blob_codec import decode_field
+
+
+SEARCH_INSERT_SQL = """
+    INSERT INTO p1_mb_answer_search
+    (session_id, user_id, character_id, character_name, question_no, question, answer)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+"""
+
+SNIPPET_CHARS = 160
+MAX_TERMS = 16
+# Rows per multi-row INSERT in rebuild_search (7 parameters each)
+INSERT_BATCH_ROWS = 500
+
+_TERM = re.compile(r"\w+\*?", re.UNICODE)
+
+
+def search_params(user_id: str, session_id: str, character_id: int, character_name: str,
+                  responses: Any) -> List[Tuple]:
+    """Parameters for SEARCH_INSERT_SQL, one tuple per non-empty text answer"""
+    rows = []
+    for question_no, item in enumerate(responses or [], start=1):
+        if not isinstance(item, dict):
+            continue
+        answer = item.get("answer")
+        if isinstance(answer, str) and answer.strip():
+            rows.append((session_id, user_id, character_id, character_name, question_no,
+                         str(item.get("question") or ""), answer))
+    return rows
+
+
+def rebuild_search(cursor, session_ids: List[str] = None, batch_size: int = 200) -> int:
+    """Recompute the search rows of `session_ids` (every session when None); returns rows written"""
+    if session_ids is None:
+        cursor.execute("SELECT DISTINCT session_id FROM p1_mb_character_responses")
+        session_ids = [row[0] if not isinstance(row, dict) else row["session_id"]
+                       for row in cursor.fetchall()]
+
+    written = 0
+    for start in range(0, len(session_ids), batch_size):
+        batch = list(session_ids[start:start + batch_size])
+        placeholders = ", ".join(["%s"] * len(batch))
+        cursor.execute(f"""
+            SELECT s.user_id, r.session_id, r.character_id, r.character_name, r.responses, r.responses_blob
+            FROM p1_mb_character_responses r
+            JOIN p1_mb_sessions s ON s.id = r.session_id
+            WHERE r.session_id IN ({placeholders})
+            ORDER BY r.session_id, r.created_at, r.id
+        """, batch)
+        rows = []
+        for row in cursor.fetchall():
+            if isinstance(row, dict):
+                row = tuple(row.values())
+            user_id, session_id, character_id, character_name, responses, responses_blob = row
+            rows += search_params(user_id, session_id, character_id, character_name,
+                                  decode_field(responses, responses_blob))
+        cursor.execute(f"DELETE FROM p1_mb_answer_search WHERE session_id IN ({placeholders})", batch)
+        # Multi-row statements: on SQLite the FTS5 sync trigger costs about
+        # eight times more when fired by one statement per row
+        for offset in range(0, len(rows), INSERT_BATCH_ROWS):
+            values = rows[offset:offset + INSERT_BATCH_ROWS]
+            cursor.execute(
+                SEARCH_INSERT_SQL.replace("(%s, %s, %s, %s, %s, %s, %s)",
+                                          ", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(values))),
+                [value for row in values for value in row]
+            )
+        written += len(rows)
+    return written
+
+
+def query_terms(text: str) -> List[str]:
+    """Lower-cased words of a query, keeping a trailing * for prefix matches"""
+    return list(dict.fromkeys(term.lower() for term in _TERM.findall(text or "")))[:MAX_TERMS]
+
+
+def _match_sql(dialect: str, terms: List[str]) -> Tuple[str, str, str, tuple]:
+    """(FROM clause, WHERE condition, score expression, match params) for any of `terms`"""
+    if dialect == "sqlite":
+        expression = " OR ".join(f'"{t.rstrip("*")}"' + ("*" if t.endswith("*") else "") for t in terms)
+        return (
+            "p1_mb_answer_search_fts f JOIN p1_mb_answer_search a ON a.id = f.rowid",
+            "p1_mb_answer_search_fts MATCH %s",
+            "-bm25(p1_mb_answer_search_fts)",
+            (expression,),
+        )
+    # Boolean mode without operators: any word matches, ranked by relevance
+    expression = " ".join(terms)
+    return (
+        "p1_mb_answer_search a",
+        "MATCH(a.answer) AGAINST (%s IN BOOLEAN MODE)",
+        "MATCH(a.answer) AGAINST (%s IN BOOLEAN MODE)",
+        (expression,),
+    )
+
+
+def queries(dialect: str, terms: List[str], character_id: Optional[int] = None,
+            limit: int = 20) -> List[Tuple[str, tuple]]:
+    """(SQL, params) of one shard's match count and its top `limit` hits"""
+    tables, condition, score, params = _match_sql(dialect, terms)
+    where, where_params = condition, params
+    if character_id is not None:
+        where += " AND a.character_id = %s"
+        where_params += (character_id,)
+    score_params = params if "%s" in score else ()
+    return [
+        (f"""
+            SELECT COUNT(*) AS total, COUNT(DISTINCT a.user_id) AS participants
+            FROM {tables}
+            WHERE {where}
+        """, where_params),
+        (f"""
+            SELECT a.id, a.session_id, a.user_id, u.username, a.character_id, a.character_name,
+                   a.question_no, a.question, a.answer, {score} AS score
+            FROM {tables}
+            JOIN p1_mb_users u ON u.id = a.user_id
+            WHERE {where}
+            ORDER BY score DESC, a.id
+            LIMIT %s
+        """, score_params + where_params + (limit,)),
+    ]
+
+
+def _search_shard(view, terms: List[str], character_id: Optional[int], limit: int) -> Dict:
+    (count_sql, count_params), (hits_sql, hits_params) = queries(view.dialect, terms, character_id, limit)
+    with view.get_read_connection(query="search_answers") as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(count_sql, count_params)
+        counts = cursor.fetchone()
+        hits = []
+        if counts["total"]:
+            cursor.execute(hits_sql, hits_params)
+            hits = cursor.fetchall()
+    return {"total": counts["total"], "participants": counts["participants"], "hits": hits}
+
+
+def snippet(answer: str, terms: List[str], width: int = SNIPPET_CHARS) -> str:
+    """About `width` characters of `answer` around the first matching word"""
+    lowered = answer.lower()
+    positions = [m.start() for t in terms
+                 for m in [re.search(r"\b" + re.escape(t.rstrip("*")), lowered)] if m]
+    start = max(0, min(positions) - width // 3) if positions else 0
+    text = answer[start:start + width]
+    return ("…" if start else "") + text + ("…" if start + width < len(answer) else "")
+
+
+def search(db, query: str, character_id: int = None, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
+    """One page of answers matching any word of `query`, best first.
+
+    Returns {"results", "total", "participants", "page", "page_size",
+    "pages"}; each result carries the username, session, character,
+    question_no, question, a snippet of the answer and its score.
+    """
+    terms = query_terms(query)
+    page, page_size = max(1, int(page)), max(1, int(page_size))
+    empty = {"results": [], "total": 0, "participants": 0, "page": page, "page_size": page_size, "pages": 0}
+    if not terms:
+        return empty
+
+    shards = getattr(db, "shards", None)
+    views = db.shard_views() if shards is not None else [db]
+    limit = page * page_size
+    per_shard = [_search_shard(view, terms, character_id, limit) for view in views]
+
+    merged = heapq.merge(*[
+        [(-float(hit["score"]), shard, hit["id"], hit) for hit in result["hits"]]
+        for shard, result in enumerate(per_shard)
+    ])
+    page_hits = [item[3] for item in merged][(page - 1) * page_size:limit]
+    total = sum(result["total"] for result in per_shard)
+    return {
+        "results": [
+            {
+                "session_id": hit["session_id"],
+                "user_id": hit["user_id"],
+                "username": hit["username"],
+                "character_id": hit["character_id"],
+                "character_name": hit["character_name"],
+                "question_no": hit["question_no"],
+                "question": hit["question"],
+                "snippet": snippet(hit["answer"], terms),
+                "score": float(hit["score"]),
+            }
+            for hit in page_hits
+        ],
+        "total": total,
+        # Users live on one shard each, so per-shard distinct counts add up
+        "participants": sum(result["participants"] for result in per_shard),
+        "page": page,
+        "page_size": page_size,
+        "pages": -(-total // page_size),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-text search over participants' answers")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    search_parser = subparsers.add_parser("search", help="Run a ranked query")
+    search_parser.add_argument("query")
+    search_parser.add_argument("--character-id", type=int, default=None)
+    search_parser.add_argument("--page", type=int, default=1)
+    search_parser.add_argument("--page-size", type=int, default=20)
+    subparsers.add_parser("rebuild", help="Re-index every stored answer")
+    args = parser.parse_args()
+
+    from utils.database import Database
+    db = Database()
+
+    if args.command == "search":
+        started = time.perf_counter()
+        found = search(db, args.query, args.character_id, args.page, args.page_size)
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"{found['total']} answers from {found['participants']} participants "
+              f"(page {found['page']}/{found['pages']}, {elapsed:.1f} ms)")
+        for result in found["results"]:
+            print(f"{result['score']:8.3f}  {result['username']}  {result['character_name']} "
+                  f"Q{result['question_no']}: {result['snippet']}")
+    elif args.command == "rebuild":
+        written = 0
+        for view in db.shard_views():
+            with view.get_connection() as conn:
+                written += rebuild_search(conn.cursor())
+        print(f"Indexed {written} answers")
+
+
+if __name__ == "__main__":
+    main()
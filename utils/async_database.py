@@ -0,0 +1,782 @@
+# utils/async_database.py
+"""Asyncio counterpart of utils.database.Database.
+
+AsyncDatabase exposes the same methods as Database as coroutines, backed by
+aiomysql for mysql:// URLs and aiosqlite for sqlite:// URLs. All coroutines
+run on one background event loop per process, so Streamlit's script thread
+can call them through the blocking facade returned by `AsyncDatabase.sync()`:
+
+    db = AsyncDatabase().sync()
+    info, responses = db.gather(
+        db.async_db.get_session_info(session_id),
+        db.async_db.get_session_responses(session_id),
+    )
+
+Users, sessions and responses are routed to shards exactly like Database
+(utils/sharding.py), sharing its process-wide shard router. Reads go
+through Database's process-wide read-through cache under the same keys, and
+writes invalidate it with Database's hooks, so either class sees the
+other's writes at once.
+
+The schema itself is owned by utils.migrations: AsyncDatabase checks it once
+per process per shard, as Database does, and runs no other DDL.
+"""
+import asyncio
+import sqlite3
+import ssl
+import threading
+import urllib.parse
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List
+
+import aiomysql
+import aiosqlite
+from dotenv import load_dotenv
+
+from utils.blob_codec import FORMAT_JSON, encode_fields
+from utils.database import (
+    BATCH_RESPONSES_SELECT, BATCH_SESSION_INFO_SELECT, BATCH_SIZE, DIRECTORY_LOOKUP_SQL,
+    SELECT_SESSION_RESPONSES_SQL, SESSION_INFO_SQL, SESSION_PAGE_SELECT, SESSION_SUMMARY_SQL,
+    USER_BY_ID_SQL, USER_BY_USERNAME_SQL, USER_SCORE_TREND_SQL, Database, get_read_cache,
+    get_replica_router, get_setting, get_shard_router, get_user_caches, pool_options,
+    session_data_from_row
+)
+from utils import answer_search
+from utils import migrations
+from utils import outbox
+from utils import rating_histograms
+from utils import session_metrics
+from utils import sharding
+from utils.response_rows import ResponseRow
+from utils.score_trend import build_trend, trend_params, trend_upsert_sql
+from utils.session_summary import summary_params, summary_upsert_sql
+from utils.storage_backends import SQLiteBackend, create_backend, sqlite_path_from_url
+
+
+_loop = None
+_loop_lock = threading.Lock()
+_pools: Dict[Any, Any] = {}
+_pool_lock = None
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Return the process-wide background event loop, starting it on first use"""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="async-db-loop", daemon=True)
+                thread.start()
+                _loop = loop
+    return _loop
+
+
+def run_sync(coro, timeout: float = None):
+    """Run a coroutine on the background loop and block for its result"""
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop()).result(timeout)
+
+
+class _MySQLAsyncConnection:
+    """aiomysql connection with Database's cursor(dictionary=...) signature"""
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def cursor(self, dictionary: bool = False):
+        return self.raw.cursor(aiomysql.DictCursor) if dictionary else self.raw.cursor()
+
+    async def commit(self):
+        await self.raw.commit()
+
+    async def rollback(self):
+        await self.raw.rollback()
+
+
+class _MySQLAsyncPool:
+    def __init__(self, pool):
+        self.pool = pool
+
+    @asynccontextmanager
+    async def acquire(self):
+        async with self.pool.acquire() as raw:
+            yield _MySQLAsyncConnection(raw)
+
+
+class _SQLiteAsyncCursor:
+    """aiosqlite cursor accepting `%s` placeholders and returning dict rows on request"""
+
+    def __init__(self, raw_conn, dictionary: bool = False):
+        self._raw_conn = raw_conn
+        self._dictionary = dictionary
+        self._cursor = None
+
+    async def __aenter__(self):
+        self._cursor = await self._raw_conn.cursor()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._cursor.close()
+
+    def _convert(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip([d[0] for d in self._cursor.description], row))
+
+    async def execute(self, sql: str, params=()):
+        await self._cursor.execute(sql.replace("%s", "?"), params or ())
+
+    async def executemany(self, sql: str, seq_of_params):
+        await self._cursor.executemany(sql.replace("%s", "?"), seq_of_params)
+
+    async def fetchone(self):
+        return self._convert(await self._cursor.fetchone())
+
+    async def fetchall(self):
+        return [self._convert(row) for row in await self._cursor.fetchall()]
+
+
+class _SQLiteAsyncConnection:
+    def __init__(self, raw):
+        self.raw = raw
+
+    def cursor(self, dictionary: bool = False):
+        return _SQLiteAsyncCursor(self.raw, dictionary=dictionary)
+
+    async def commit(self):
+        await self.raw.commit()
+
+    async def rollback(self):
+        await self.raw.rollback()
+
+
+class _SQLiteAsyncPool:
+    """Fixed-size pool of aiosqlite connections; WAL lets them read concurrently"""
+
+    def __init__(self, path: str, size: int, in_memory: bool):
+        self.path = path
+        self.in_memory = in_memory
+        self.size = size
+        self._idle = asyncio.Queue()
+        self._open = 0
+
+    async def _connect(self):
+        raw = await aiosqlite.connect(
+            self.path, detect_types=sqlite3.PARSE_DECLTYPES, uri=self.in_memory
+        )
+        for pragma in SQLiteBackend.PRAGMAS:
+            if self.in_memory and "journal_mode" in pragma:
+                continue
+            await raw.execute(pragma)
+        return raw
+
+    @asynccontextmanager
+    async def acquire(self):
+        if self._idle.empty() and self._open < self.size:
+            self._open += 1
+            try:
+                raw = await self._connect()
+            except Exception:
+                self._open -= 1
+                raise
+        else:
+            raw = await self._idle.get()
+        try:
+            yield _SQLiteAsyncConnection(raw)
+        finally:
+            self._idle.put_nowait(raw)
+
+
+class AsyncDatabase:
+    def __init__(self, migrate: bool = True):
+        """Read DATABASE_URL (or MYSQL_URL); the pool is created lazily on the background loop"""
+        load_dotenv()
+        self.url = get_setting("DATABASE_URL") or get_setting("MYSQL_URL")
+        url = urllib.parse.urlparse(self.url)
+        self.dialect = "sqlite" if url.scheme == "sqlite" else "mysql"
+
+        self.key = ("async", self.url)
+        self.pool_size = int(get_setting("MYSQL_POOL_SIZE", 5))
+        self.blob_format = get_setting("DB_BLOB_FORMAT", FORMAT_JSON)
+
+        # Shared with Database, so its writes pin reads here to the primary too
+        primary = create_backend(self.url, **pool_options())
+        self.replicas = get_replica_router(primary)
+        self.shards = get_shard_router(primary)
+        self.cache = get_read_cache(primary.key)
+        self.user_cache, self.missing_user_cache = get_user_caches(primary.key)
+
+        # Same once-per-process check as Database, through the shared sync pools
+        if migrate:
+            for backend in self.shards.backends:
+                migrations.ensure_schema(
+                    migrations.BackendView(backend),
+                    auto_apply=str(get_setting("DB_AUTO_MIGRATE", "1")) != "0"
+                )
+
+    # Same invalidation as Database's writes, on the shared caches
+    _invalidate_session = Database._invalidate_session
+    _invalidate_user = Database._invalidate_user
+    _cache_user = Database._cache_user
+
+    async def _create_pool(self, database_url: str):
+        if urllib.parse.urlparse(database_url).scheme == "sqlite":
+            path, in_memory = sqlite_path_from_url(database_url)
+            return _SQLiteAsyncPool(path, self.pool_size, in_memory)
+
+        url = urllib.parse.urlparse(database_url)
+
+        # Match Database: TLS on, server certificate not verified
+        ssl_context = ssl.create_default_context()
+        ssl_context.check_hostname = False
+        ssl_context.verify_mode = ssl.CERT_NONE
+
+        pool = await aiomysql.create_pool(
+            host=url.hostname,
+            port=url.port or 3306,
+            user=url.username,
+            password=url.password,
+            db=url.path.lstrip('/'),
+            ssl=ssl_context,
+            minsize=1,
+            maxsize=self.pool_size,
+            autocommit=False
+        )
+        return _MySQLAsyncPool(pool)
+
+    async def _get_pool(self, database_url: str = None):
+        global _pool_lock
+        database_url = database_url or self.url
+        key = ("async", database_url)
+        pool = _pools.get(key)
+        if pool is not None:
+            return pool
+
+        # Created on the background loop, so it is bound to the right loop
+        if _pool_lock is None:
+            _pool_lock = asyncio.Lock()
+        async with _pool_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = await self._create_pool(database_url)
+                _pools[key] = pool
+            return pool
+
+    @asynccontextmanager
+    async def get_connection(self, database_url: str = None):
+        """Async context manager for pooled connections (to the primary by default)"""
+        pool = await self._get_pool(database_url)
+        async with pool.acquire() as conn:
+            try:
+                yield conn
+                await conn.commit()
+            except Exception as e:
+                await conn.rollback()
+                raise e
+
+    async def _shard_url(self, method: str, key: str, write: bool = False) -> str:
+        """URL of the shard ShardRouter.`method` picks for `key` (session or user id)"""
+        if not self.shards.sharded:
+            return self.url
+        # Map reloads and legacy session lookups block, so route off the event loop
+        shard = await asyncio.get_running_loop().run_in_executor(
+            None, getattr(self.shards, method), key, write
+        )
+        return self.shards.backends[shard].url
+
+    async def _session_url(self, session_id: str, write: bool = False) -> str:
+        return await self._shard_url("shard_of_session", session_id, write)
+
+    async def _user_url(self, user_id: str, write: bool = False) -> str:
+        return await self._shard_url("shard_of_user", user_id, write)
+
+    @asynccontextmanager
+    async def get_read_connection(self, *keys, database_url: str = None):
+        """Connection to a healthy replica when one is configured (see Database.get_read_connection)"""
+        if database_url and database_url != self.url:
+            # Shards other than 0 have no replicas
+            async with self.get_connection(database_url) as conn:
+                yield conn
+            return
+        # Health checks block, so choose off the event loop
+        backend = await asyncio.get_running_loop().run_in_executor(None, self.replicas.choose, keys)
+        if backend is self.replicas.primary:
+            async with self.get_connection() as conn:
+                yield conn
+            return
+        try:
+            async with self.get_connection(backend.url) as conn:
+                yield conn
+        except Exception as e:
+            self.replicas.mark_failed(backend, e)
+            raise
+
+    def sync(self) -> "SyncDatabase":
+        """Blocking facade for use from Streamlit scripts"""
+        return SyncDatabase(self)
+
+    async def _insert_user(self, user_id: str, username: str, password: str):
+        """Claim the username in the directory and write the user row to its shard"""
+        url = await self._user_url(user_id, write=True)
+        row = (user_id, username, password, sharding.user_bucket(user_id))
+        async with self.get_connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(sharding.DIRECTORY_INSERT_SQL, (username, user_id))
+                if url == self.url:
+                    await cursor.execute(sharding.USER_INSERT_SQL, row)
+        if url == self.url:
+            return
+        try:
+            async with self.get_connection(url) as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(sharding.USER_INSERT_SQL, row)
+        except Exception:
+            # Give the username back
+            async with self.get_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
+                        "DELETE FROM p1_mb_user_directory WHERE username = %s AND user_id = %s",
+                        (username, user_id)
+                    )
+            raise
+
+    async def _find_user(self, username: str) -> Dict:
+        """User row by username; with several shards, via the username directory on shard 0"""
+        async with self.get_connection() as conn:
+            async with conn.cursor(dictionary=True) as cursor:
+                if not self.shards.sharded:
+                    await cursor.execute(USER_BY_USERNAME_SQL, (username,))
+                    return await cursor.fetchone()
+                await cursor.execute(DIRECTORY_LOOKUP_SQL, (username,))
+                row = await cursor.fetchone()
+        if not row:
+            return None
+        async with self.get_connection(await self._user_url(row["user_id"])) as conn:
+            async with conn.cursor(dictionary=True) as cursor:
+                await cursor.execute(USER_BY_ID_SQL, (row["user_id"],))
+                return await cursor.fetchone()
+
+    async def _lookup_user(self, username: str) -> Dict:
+        """User row by username through the user cache (None if absent)"""
+        user = self.user_cache.get(("username", username))
+        if user is not None:
+            return user
+        if self.missing_user_cache.get(("username", username)):
+            return None
+        with self.missing_user_cache.loading(("username", username)) as store_missing:
+            user = await self._find_user(username)
+            if not user:
+                store_missing(True)
+        if user:
+            self._cache_user(user)
+        return user
+
+    async def create_user_with_password(self, user_id: str, username: str, password: str):
+        """Create a new user with password"""
+        try:
+            await self._insert_user(user_id, username, password)
+            self._invalidate_user(username, user_id)
+            return {"id": user_id, "username": username}
+        except Exception as e:
+            print(f"Error creating user: {e}")
+            return None
+
+    async def verify_user_login(self, username: str, password: str) -> Dict:
+        """Verify user login credentials (the password is always checked against the database)"""
+        try:
+            # No negative cache here: a user just created by another process must be able to log in
+            if self.shards.sharded:
+                # The username resolves through the directory; the password lives on the user's shard
+                user = self.user_cache.get(("username", username)) or await self._find_user(username)
+                if not user:
+                    return None
+                url, column, value = await self._user_url(user["id"]), "id", user["id"]
+            else:
+                url, column, value = self.url, "username", username
+            async with self.get_connection(url) as conn:
+                async with conn.cursor(dictionary=True) as cursor:
+                    await cursor.execute(
+                        f"SELECT id, username, created_at FROM p1_mb_users WHERE {column} = %s AND password = %s",
+                        (value, password)
+                    )
+                    row = await cursor.fetchone()
+            if row:
+                self._cache_user(row)
+            return row
+        except Exception as e:
+            print(f"Error verifying login: {e}")
+            return None
+
+    async def check_username_exists(self, username: str) -> bool:
+        """Check if username already exists (cached, including "no" answers)"""
+        try:
+            return await self._lookup_user(username) is not None
+        except Exception as e:
+            print(f"Error checking username: {e}")
+            return False
+
+    async def create_user(self, user_id: str, username: str):
+        """Create a new user"""
+        try:
+            await self._insert_user(user_id, username, '')
+            self._invalidate_user(username, user_id)
+            return {"id": user_id, "username": username}
+        except Exception as e:
+            print(f"Error creating user: {e}")
+            return None
+
+    async def create_session(self, session_id: str, user_id: str):
+        """Create a new session"""
+        try:
+            bucket = sharding.bucket_from_session_id(session_id)
+            if bucket is not None and bucket != sharding.user_bucket(user_id):
+                raise ValueError(f"session id {session_id} was issued for another user")
+            async with self.get_connection(await self._user_url(user_id, write=True)) as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
+                        "INSERT INTO p1_mb_sessions (id, user_id, completed) VALUES (%s, %s, 0)",
+                        (session_id, user_id)
+                    )
+            self._invalidate_session(session_id, user_id)
+            return {"id": session_id, "user_id": user_id}
+        except ValueError as e:
+            print(f"Error creating session: {e}")
+            return None
+        except Exception as e:
+            print(f"Error creating session: {e}")
+            # The sync Database's outbox creates it before flushing its responses
+            queued = outbox.find_outbox(get_setting("RESPONSE_OUTBOX_PATH", "response_outbox.db"))
+            if queued is None:
+                return None
+            try:
+                queued.put_session(session_id, user_id)
+                return {"id": session_id, "user_id": user_id, "queued": True}
+            except Exception as e:
+                print(f"Error queueing session: {e}")
+                return None
+
+    async def delete_session(self, session_id: str) -> bool:
+        """Delete a session and all its associated data"""
+        try:
+            async with self.get_connection(await self._session_url(session_id, write=True)) as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute("SELECT user_id FROM p1_mb_sessions WHERE id = %s", (session_id,))
+                    row = await cursor.fetchone()
+                    await cursor.execute("DELETE FROM p1_mb_sessions WHERE id = %s", (session_id,))
+            self._invalidate_session(session_id, row[0] if row else None)
+            return True
+        except Exception as e:
+            print(f"Error deleting session: {e}")
+            return False
+
+    async def save_character_response(self, session_id: str, character_id: int,
+                                      character_name: str, read_passage: bool,
+                                      responses: List[Any], analysis: Dict):
+        """Save character assessment response"""
+        try:
+            url = await self._session_url(session_id, write=True)
+            deltas = rating_histograms.histogram_rows(character_id, analysis)
+            async with self.get_connection(url) as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute("""
+                        INSERT INTO p1_mb_character_responses
+                        (session_id, character_id, character_name, read_passage, responses, analysis,
+                         responses_blob, analysis_blob)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                    """, (
+                        session_id,
+                        character_id,
+                        character_name,
+                        int(read_passage),
+                        *encode_fields(responses, analysis, self.blob_format)
+                    ))
+                    await cursor.execute(
+                        "UPDATE p1_mb_sessions SET completed = completed + 1 WHERE id = %s",
+                        (session_id,)
+                    )
+                    await cursor.execute(
+                        summary_upsert_sql(self.dialect),
+                        summary_params(session_id, character_id, character_name, analysis)
+                    )
+                    await cursor.execute("SELECT user_id FROM p1_mb_sessions WHERE id = %s", (session_id,))
+                    row = await cursor.fetchone()
+                    if row:
+                        await cursor.executemany(
+                            trend_upsert_sql(self.dialect),
+                            trend_params(row[0], session_id, character_id, character_name, analysis)
+                        )
+                        await cursor.executemany(
+                            answer_search.SEARCH_INSERT_SQL,
+                            answer_search.search_params(row[0], session_id, character_id,
+                                                        character_name, responses)
+                        )
+                    if url == self.url:
+                        await cursor.executemany(rating_histograms.DELTA_INSERT_SQL, deltas)
+            if url != self.url:
+                # Histograms are global and live on shard 0
+                async with self.get_connection() as conn:
+                    async with conn.cursor() as cursor:
+                        await cursor.executemany(rating_histograms.DELTA_INSERT_SQL, deltas)
+            self._invalidate_session(session_id, row[0] if row else None)
+            return {"session_id": session_id, "character_id": character_id}
+        except Exception as e:
+            print(f"Error saving character response: {e}")
+            return None
+
+    async def _load_session_responses(self, session_id: str) -> List[Dict]:
+        url = await self._session_url(session_id)
+        async with self.get_read_connection(session_id, database_url=url) as conn:
+            async with conn.cursor(dictionary=True) as cursor:
+                await cursor.execute(SELECT_SESSION_RESPONSES_SQL, (session_id,))
+                return [ResponseRow.from_row(row) for row in await cursor.fetchall()]
+
+    async def get_session_responses(self, session_id: str) -> List[Dict]:
+        """Get all responses for a session, plus any still in this process's outbox (cached; treat as read-only)"""
+        try:
+            queued = outbox.find_outbox(get_setting("RESPONSE_OUTBOX_PATH", "response_outbox.db"))
+            pending = queued.pending(session_id) if queued is not None else []
+            rows = await self.cache.get_or_load_async(
+                ("responses", session_id),
+                lambda: self._load_session_responses(session_id)
+            )
+            return outbox.merge_pending(rows, pending)
+        except Exception as e:
+            print(f"Error getting session responses: {e}")
+            return []
+
+    async def _load_sessions_chunk(self, url: str, session_ids: List[str]) -> Dict[str, Dict]:
+        found = {}
+        marks = ", ".join(["%s"] * len(session_ids))
+        async with self.get_read_connection(*session_ids, database_url=url) as conn:
+            async with conn.cursor(dictionary=True) as cursor:
+                await cursor.execute(f"{BATCH_SESSION_INFO_SELECT} WHERE s.id IN ({marks})", session_ids)
+                for row in await cursor.fetchall():
+                    found[row["id"]] = session_data_from_row(row)
+                await cursor.execute(
+                    f"{BATCH_RESPONSES_SELECT} WHERE session_id IN ({marks}) "
+                    "ORDER BY session_id, created_at, id",
+                    session_ids
+                )
+                for row in await cursor.fetchall():
+                    if row["session_id"] in found:
+                        found[row["session_id"]]["responses"].append(ResponseRow.from_row(row))
+        return found
+
+    async def get_sessions_data(self, session_ids: List[str]) -> Dict[str, Dict]:
+        """Session info, summary and responses for many sessions; shards are read concurrently"""
+        try:
+            session_ids = list(dict.fromkeys(session_ids))
+            groups: Dict[str, List[str]] = {}
+            for session_id in session_ids:
+                groups.setdefault(await self._session_url(session_id), []).append(session_id)
+            chunks = await asyncio.gather(*[
+                self._load_sessions_chunk(url, ids[start:start + BATCH_SIZE])
+                for url, ids in groups.items()
+                for start in range(0, len(ids), BATCH_SIZE)
+            ])
+            found = {key: value for chunk in chunks for key, value in chunk.items()}
+            queued = outbox.find_outbox(get_setting("RESPONSE_OUTBOX_PATH", "response_outbox.db"))
+            if queued is not None:
+                for session_id, rows in queued.pending_by_session(list(found)).items():
+                    found[session_id]["responses"] = outbox.merge_pending(found[session_id]["responses"], rows)
+            return {session_id: found[session_id] for session_id in session_ids if session_id in found}
+        except Exception as e:
+            print(f"Error getting sessions data: {e}")
+            return {}
+
+    async def _load_user_sessions(self, user_id: str) -> List[Dict]:
+        url = await self._user_url(user_id)
+        async with self.get_read_connection(user_id, database_url=url) as conn:
+            async with conn.cursor(dictionary=True) as cursor:
+                await cursor.execute(f"""
+                    {SESSION_PAGE_SELECT}
+                    WHERE s.user_id = %s
+                    ORDER BY s.created_at DESC, s.id DESC
+                """, (user_id,))
+                rows = await cursor.fetchall()
+        return [
+            {
+                "id": row["id"],
+                "created_at": row["created_at"],
+                "completed": row["completed"],
+                "avg_rating": row["avg_rating"],
+                "best_character_name": row["best_character_name"],
+                "last_activity": row["last_activity"]
+            }
+            for row in rows
+        ]
+
+    async def get_user_sessions(self, user_id: str) -> List[Dict]:
+        """Get all sessions for a user (cached; treat the result as read-only)"""
+        try:
+            return await self.cache.get_or_load_async(
+                ("user_sessions", user_id),
+                lambda: self._load_user_sessions(user_id),
+                tags=[("user", user_id)]
+            )
+        except Exception as e:
+            print(f"Error getting user sessions: {e}")
+            return []
+
+    async def _load_user_score_trend(self, user_id: str) -> List[Dict]:
+        url = await self._user_url(user_id)
+        async with self.get_read_connection(user_id, database_url=url) as conn:
+            async with conn.cursor(dictionary=True) as cursor:
+                await cursor.execute(USER_SCORE_TREND_SQL, (user_id,))
+                return build_trend(await cursor.fetchall())
+
+    async def get_user_score_trend(self, user_id: str) -> List[Dict]:
+        """Per-session overall, quality and character ratings of a user, oldest first (cached)"""
+        try:
+            return await self.cache.get_or_load_async(
+                ("user_score_trend", user_id),
+                lambda: self._load_user_score_trend(user_id),
+                tags=[("user", user_id)]
+            )
+        except Exception as e:
+            print(f"Error getting user score trend: {e}")
+            return []
+
+    async def _load_session_summary(self, session_id: str) -> Dict:
+        url = await self._session_url(session_id)
+        async with self.get_read_connection(session_id, database_url=url) as conn:
+            async with conn.cursor(dictionary=True) as cursor:
+                await cursor.execute(SESSION_SUMMARY_SQL, (session_id,))
+                return await cursor.fetchone()
+
+    async def get_session_summary(self, session_id: str) -> Dict:
+        """Get the materialized summary row for a session (None if nothing saved yet; cached)"""
+        try:
+            return await self.cache.get_or_load_async(
+                ("summary", session_id),
+                lambda: self._load_session_summary(session_id)
+            )
+        except Exception as e:
+            print(f"Error getting session summary: {e}")
+            return None
+
+    async def _load_session_metrics(self, session_id: str) -> Dict:
+        url = await self._session_url(session_id)
+        rows = []
+        async with self.get_read_connection(session_id, database_url=url) as conn:
+            async with conn.cursor(dictionary=True) as cursor:
+                for sql, params in session_metrics.queries([session_id]):
+                    await cursor.execute(sql, params)
+                    rows.append(await cursor.fetchall())
+        return session_metrics.fold(*rows).get(session_id, session_metrics.empty())
+
+    async def get_session_metrics(self, session_id: str) -> Dict:
+        """Chart aggregates of a session computed in SQL (see utils/session_metrics.py; cached)"""
+        try:
+            return await self.cache.get_or_load_async(
+                ("metrics", session_id),
+                lambda: self._load_session_metrics(session_id)
+            )
+        except Exception as e:
+            print(f"Error getting session metrics: {e}")
+            return session_metrics.empty()
+
+    async def get_session_info(self, session_id: str) -> Dict:
+        """Get session information with user details"""
+        try:
+            url = await self._session_url(session_id)
+            async with self.get_read_connection(session_id, database_url=url) as conn:
+                async with conn.cursor(dictionary=True) as cursor:
+                    await cursor.execute(SESSION_INFO_SQL, (session_id,))
+                    row = await cursor.fetchone()
+            if row:
+                return {
+                    'session_id': row["id"],
+                    'user_id': row["user_id"],
+                    'created_at': row["created_at"],
+                    'completed': row["completed"],
+                    'username': row["username"]
+                }
+            return None
+        except Exception as e:
+            print(f"Error getting session info: {e}")
+            return None
+
+    async def get_user_by_username(self, username: str) -> Dict:
+        """Get user by username (cached; treat the result as read-only)"""
+        try:
+            return await self._lookup_user(username)
+        except Exception as e:
+            print(f"Error getting user by username: {e}")
+            return None
+
+    async def get_user_sessions_by_username(self, username: str) -> List[Dict]:
+        """Get all sessions for a user by username"""
+        try:
+            # Through the user cache and the cached, replica-routed session list, as Database does
+            user = await self._lookup_user(username)
+            return await self.get_user_sessions(user["id"]) if user else []
+        except Exception as e:
+            print(f"Error getting user sessions by username: {e}")
+            return []
+
+    async def create_or_get_user(self, username: str) -> str:
+        """Create user if not exists, or get existing user ID"""
+        try:
+            existing_user = await self.get_user_by_username(username)
+            if existing_user:
+                return existing_user['id']
+
+            user_id = str(uuid.uuid4())
+            if await self.create_user(user_id, username) is None:
+                # Lost a race to another process (its "missing" answer may still be cached)
+                self._invalidate_user(username)
+                existing_user = await self.get_user_by_username(username)
+                if existing_user:
+                    return existing_user['id']
+            return user_id
+        except Exception as e:
+            print(f"Error in create_or_get_user: {e}")
+            return str(uuid.uuid4())
+
+    async def load_dashboard_data(self, session_id: str, username: str = None) -> Dict:
+        """Fetch everything the dashboard needs for a session concurrently"""
+        tasks = [
+            self.get_session_info(session_id),
+            self.get_session_responses(session_id),
+            self.get_session_summary(session_id),
+            self.get_session_metrics(session_id),
+        ]
+        if username:
+            tasks.append(self.get_user_sessions_by_username(username))
+        results = await asyncio.gather(*tasks)
+        return {
+            "session_info": results[0],
+            "responses": results[1],
+            "summary": results[2],
+            "metrics": results[3],
+            "sessions": results[4] if username else [],
+        }
+
+
+class SyncDatabase:
+    """Blocking wrapper that runs AsyncDatabase coroutines on the background loop.
+
+    Every AsyncDatabase coroutine method is available under the same name
+    and returns its result directly.
+    """
+
+    def __init__(self, async_db: AsyncDatabase, timeout: float = 30.0):
+        self.async_db = async_db
+        self.timeout = timeout
+
+    def __getattr__(self, name):
+        attr = getattr(self.async_db, name)
+        if not asyncio.iscoroutinefunction(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            return run_sync(attr(*args, **kwargs), self.timeout)
+        return call
+
+    def gather(self, *coros) -> List[Any]:
+        """Run several AsyncDatabase coroutines concurrently and return their results"""
+        async def _gather():
+            return await asyncio.gather(*coros)
+        return run_sync(_gather(), self.timeout)
@@ -0,0 +1,225 @@
+# utils/blob_codec.py
+"""Compact storage for the responses/analysis JSON documents.
+
+Rows written before migration 4 (or with DB_BLOB_FORMAT=json) keep the
+documents as JSON text in the `responses`/`analysis` TEXT columns. With a
+compact format, the documents go to `responses_blob`/`analysis_blob`
+instead, prefixed by a one-byte format version:
+
+    0x01  zlib-compressed JSON (standard library, always available)
+    0x02  zstd-compressed msgpack (needs the `msgpack` and `zstandard` packages)
+
+Readers accept either layout, so rows can be converted online:
+
+    python -m utils.blob_codec migrate --format zlib --batch-size 500
+    python -m utils.blob_codec benchmark --sample 1000
+"""
+import argparse
+import json
+import time
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import msgpack
+    import zstandard
+except ImportError:  # optional: only needed for the msgpack-zstd format
+    msgpack = None
+    zstandard = None
+
+try:
+    import orjson
+except ImportError:  # optional: faster JSON parsing
+    orjson = None
+
+
+FORMAT_JSON = "json"
+FORMAT_ZLIB = "zlib"
+FORMAT_MSGPACK_ZSTD = "msgpack-zstd"
+
+_VERSION_BYTES = {
+    FORMAT_ZLIB: b"\x01",
+    FORMAT_MSGPACK_ZSTD: b"\x02",
+}
+
+
+def available_formats():
+    formats = [FORMAT_JSON, FORMAT_ZLIB]
+    if msgpack is not None and zstandard is not None:
+        formats.append(FORMAT_MSGPACK_ZSTD)
+    return formats
+
+
+def encode_blob(value: Any, fmt: str) -> bytes:
+    """Serialize a JSON-compatible value into a versioned compact blob"""
+    if fmt == FORMAT_ZLIB:
+        payload = zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"), 6)
+    elif fmt == FORMAT_MSGPACK_ZSTD:
+        if msgpack is None or zstandard is None:
+            raise RuntimeError("msgpack-zstd format needs the msgpack and zstandard packages")
+        payload = zstandard.ZstdCompressor(level=3).compress(msgpack.packb(value, use_bin_type=True))
+    else:
+        raise ValueError(f"Unknown blob format: {fmt!r}")
+    return _VERSION_BYTES[fmt] + payload
+
+
+def loads(data) -> Any:
+    """json.loads, via orjson when installed (falling back for NaN and other non-strict JSON)"""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
+
+def decode_blob(blob: bytes) -> Any:
+    """Inverse of encode_blob; dispatches on the leading version byte"""
+    blob = bytes(blob)
+    version, payload = blob[:1], blob[1:]
+    if version == b"\x01":
+        return loads(zlib.decompress(payload))
+    if version == b"\x02":
+        if msgpack is None or zstandard is None:
+            raise RuntimeError("Row uses msgpack-zstd format; install msgpack and zstandard")
+        return msgpack.unpackb(zstandard.ZstdDecompressor().decompress(payload), raw=False)
+    raise ValueError(f"Unknown blob format version: {version!r}")
+
+
+def decode_field(text, blob) -> Any:
+    """Decode a stored document from whichever column holds it"""
+    if blob is not None:
+        return decode_blob(blob)
+    return loads(text)
+
+
+def encode_fields(responses: Any, analysis: Any, fmt: str) -> Tuple[str, str, Optional[bytes], Optional[bytes]]:
+    """Column values (responses, analysis, responses_blob, analysis_blob) for one row"""
+    if fmt == FORMAT_JSON:
+        return json.dumps(responses), json.dumps(analysis), None, None
+    # TEXT columns are NOT NULL; leave them empty when the blob holds the data
+    return "", "", encode_blob(responses, fmt), encode_blob(analysis, fmt)
+
+
+def migrate_rows(db, fmt: str = FORMAT_ZLIB, batch_size: int = 500, progress: bool = False) -> int:
+    """Convert JSON-text rows to `fmt` in small batches, one transaction each.
+
+    Batches walk the primary key, so no long-running lock is held and the
+    app keeps reading and writing while this runs. Returns rows converted.
+    """
+    if fmt == FORMAT_JSON:
+        raise ValueError("Choose a compact format to migrate to")
+    converted = 0
+    last_id = 0
+    while True:
+        with db.get_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT id, responses, analysis
+                FROM p1_mb_character_responses
+                WHERE id > %s AND responses_blob IS NULL
+                ORDER BY id
+                LIMIT %s
+            """, (last_id, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            cursor.executemany("""
+                UPDATE p1_mb_character_responses
+                SET responses_blob = %s, analysis_blob = %s, responses = '', analysis = ''
+                WHERE id = %s AND responses_blob IS NULL
+            """, [
+                (encode_blob(json.loads(row["responses"]), fmt),
+                 encode_blob(json.loads(row["analysis"]), fmt),
+                 row["id"])
+                for row in rows
+            ])
+        last_id = rows[-1]["id"]
+        converted += len(rows)
+        if progress:
+            print(f"Converted {converted} rows (last id {last_id})")
+    return converted
+
+
+def benchmark(samples, repeat: int = 3) -> Dict[str, Dict[str, float]]:
+    """Compare stored size and encode/decode time per format for (responses, analysis) pairs"""
+    results = {}
+    for fmt in available_formats():
+        if fmt == FORMAT_JSON:
+            encode = lambda value: json.dumps(value).encode("utf-8")
+            decode = lambda data: json.loads(data)
+        else:
+            encode = lambda value, fmt=fmt: encode_blob(value, fmt)
+            decode = decode_blob
+
+        encoded = [(encode(r), encode(a)) for r, a in samples]
+        size = sum(len(r) + len(a) for r, a in encoded)
+
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for r, a in samples:
+                encode(r)
+                encode(a)
+        encode_seconds = (time.perf_counter() - started) / repeat
+
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for r, a in encoded:
+                decode(r)
+                decode(a)
+        decode_seconds = (time.perf_counter() - started) / repeat
+
+        count = max(len(samples), 1)
+        results[fmt] = {
+            "avg_row_bytes": size / count,
+            "encode_us_per_row": encode_seconds / count * 1e6,
+            "decode_us_per_row": decode_seconds / count * 1e6,
+        }
+    return results
+
+
+def _load_samples(db, limit: int):
+    with db.get_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("""
+            SELECT responses, analysis, responses_blob, analysis_blob
+            FROM p1_mb_character_responses
+            ORDER BY id DESC
+            LIMIT %s
+        """, (limit,))
+        return [
+            (decode_field(row["responses"], row["responses_blob"]),
+             decode_field(row["analysis"], row["analysis_blob"]))
+            for row in cursor.fetchall()
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact storage for response/analysis documents")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = subparsers.add_parser("migrate", help="Convert JSON-text rows to a compact format")
+    migrate_parser.add_argument("--format", default=FORMAT_ZLIB, choices=available_formats()[1:])
+    migrate_parser.add_argument("--batch-size", type=int, default=500)
+    bench_parser = subparsers.add_parser("benchmark", help="Compare formats on stored rows")
+    bench_parser.add_argument("--sample", type=int, default=1000, help="Most recent rows to sample")
+    args = parser.parse_args()
+
+    from utils.database import Database
+    db = Database()
+
+    if args.command == "migrate":
+        converted = sum(migrate_rows(view, args.format, args.batch_size, progress=True)
+                        for view in db.shard_views())
+        print(f"Converted {converted} rows to {args.format}")
+    elif args.command == "benchmark":
+        samples = _load_samples(db, args.sample)
+        if not samples:
+            print("No rows to sample")
+            return
+        print(f"{'format':<14}{'bytes/row':>12}{'encode us':>12}{'decode us':>12}")
+        for fmt, r in benchmark(samples).items():
+            print(f"{fmt:<14}{r['avg_row_bytes']:>12.0f}{r['encode_us_per_row']:>12.1f}{r['decode_us_per_row']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
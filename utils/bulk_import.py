@@ -0,0 +1,275 @@
+# utils/bulk_import.py
+"""Bulk import of historical assessments.
+
+Input is JSONL, one session per line:
+
+    {"username": "alice", "user_id": "...", "session_id": "...",
+     "created_at": "2024-03-01T10:00:00",
+     "responses": [{"character_id": 0, "character_name": "Arjun",
+                    "read_passage": true, "responses": [...],
+                    "analysis": {...}, "created_at": "..."}]}
+
+`user_id` defaults to a stable UUID derived from the username, and
+`session_id` to a new id routed to the user's shard (utils/sharding.py).
+A username that is already registered keeps its id: each chunk looks the
+usernames up first (in the username directory on shard 0 when sharded), and
+their sessions are attached to the existing users.
+With several shards, each chunk is split into one transaction per shard,
+and the username directory, histogram deltas and character catalogue are
+written to shard 0 afterwards. Users and sessions that already exist are
+left alone, but their responses are still inserted, so import a file only
+once. Rows are written in chunks with multi-row executemany inserts,
+one transaction per chunk, and each chunk's `completed` counters, session
+summaries, score trends and answer search rows are recomputed once. Run from the project root:
+
+    python -m utils.bulk_import legacy.jsonl --chunk-size 1000
+"""
+import argparse
+import gzip
+import json
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List
+
+from utils.blob_codec import FORMAT_JSON, encode_fields
+from utils.rating_histograms import DELTA_INSERT_SQL, histogram_rows
+from utils.answer_search import rebuild_search
+from utils.score_trend import rebuild_trends
+from utils.session_summary import rebuild_summaries
+from utils.sharding import new_session_id, user_bucket
+
+
+USER_NAMESPACE = uuid.UUID("6f1c2d4e-8a7b-4c3d-9e0f-1a2b3c4d5e6f")
+
+
+def _insert_ignore(dialect: str) -> str:
+    return "INSERT OR IGNORE" if dialect == "sqlite" else "INSERT IGNORE"
+
+
+def _to_timestamp(value) -> str:
+    """Normalise ISO strings/datetimes to 'YYYY-MM-DD HH:MM:SS' (both dialects accept it)"""
+    if value is None:
+        return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield one record per non-blank line of a JSONL (or .jsonl.gz) file"""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_no}: invalid JSON ({e})") from e
+
+
+def _chunks(records: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _user_id(record: Dict) -> str:
+    return record.get("user_id") or str(uuid.uuid5(USER_NAMESPACE, record["username"]))
+
+
+def _existing_user_ids(db, usernames: List[str], batch_size: int = 500) -> Dict[str, str]:
+    """{username: user_id} of the usernames already registered in `db`"""
+    sharded = getattr(getattr(db, "shards", None), "sharded", False)
+    sql = ("SELECT username, user_id FROM p1_mb_user_directory" if sharded
+           else "SELECT username, id FROM p1_mb_users")
+    found = {}
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        for start in range(0, len(usernames), batch_size):
+            batch = usernames[start:start + batch_size]
+            cursor.execute(f"{sql} WHERE username IN ({', '.join(['%s'] * len(batch))})", batch)
+            found.update((username, user_id) for username, user_id in cursor.fetchall())
+    return found
+
+
+def _resolve_users(db, records: List[Dict]) -> List[Dict]:
+    """`records` with the ids of registered usernames, which INSERT IGNORE would otherwise skip"""
+    existing = _existing_user_ids(db, sorted({record["username"] for record in records}))
+    if not existing:
+        return records
+    return [dict(record, user_id=existing[record["username"]]) if record["username"] in existing else record
+            for record in records]
+
+
+def _prepare_chunk(records: List[Dict], blob_format: str = FORMAT_JSON):
+    users, sessions, responses, histogram, characters = {}, [], [], [], {}
+    for record in records:
+        username = record["username"]
+        user_id = _user_id(record)
+        session_id = record.get("session_id") or new_session_id(user_id)
+        session_created = _to_timestamp(record.get("created_at"))
+
+        users.setdefault(user_id, (
+            user_id, username, record.get("password", ""),
+            _to_timestamp(record.get("user_created_at") or record.get("created_at")),
+            user_bucket(user_id)
+        ))
+        sessions.append((session_id, user_id, session_created))
+
+        for response in record.get("responses", []):
+            responses.append((
+                session_id,
+                response["character_id"],
+                response["character_name"],
+                int(bool(response.get("read_passage", False))),
+                *encode_fields(response.get("responses", []), response.get("analysis", {}), blob_format),
+                _to_timestamp(response.get("created_at") or session_created)
+            ))
+            histogram.extend(histogram_rows(response["character_id"], response.get("analysis", {})))
+            characters.setdefault(response["character_id"], response["character_name"])
+    return list(users.values()), sessions, responses, histogram, sorted(characters.items())
+
+
+def _write_global_rows(cursor, dialect: str, users: List[tuple], histogram: List[tuple],
+                       characters: List[tuple]):
+    cursor.executemany(
+        f"{_insert_ignore(dialect)} INTO p1_mb_user_directory (username, user_id) VALUES (%s, %s)",
+        [(user[1], user[0]) for user in users]
+    )
+    # Names already in the catalogue win over historical ones
+    if characters:
+        cursor.executemany(
+            f"{_insert_ignore(dialect)} INTO p1_mb_characters (id, name) VALUES (%s, %s)",
+            characters
+        )
+    if histogram:
+        cursor.executemany(DELTA_INSERT_SQL, histogram)
+
+
+def import_chunk(db, records: List[Dict], global_db=None) -> Dict[str, int]:
+    """Write one chunk of session records in a single transaction.
+
+    The username directory, histogram deltas and character catalogue are
+    part of the same transaction, or with `global_db` (shard 0 of a sharded
+    Database) are written there once it has committed.
+    """
+    users, sessions, responses, histogram, characters = _prepare_chunk(
+        records, getattr(db, "blob_format", FORMAT_JSON)
+    )
+    insert_ignore = _insert_ignore(db.dialect)
+
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            f"{insert_ignore} INTO p1_mb_users (id, username, password, created_at, shard_bucket) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            users
+        )
+        cursor.executemany(
+            f"{insert_ignore} INTO p1_mb_sessions (id, user_id, created_at, completed) "
+            "VALUES (%s, %s, %s, 0)",
+            sessions
+        )
+        if responses:
+            cursor.executemany(
+                "INSERT INTO p1_mb_character_responses "
+                "(session_id, character_id, character_name, read_passage, responses, analysis, "
+                "responses_blob, analysis_blob, created_at) "
+                "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                responses
+            )
+        if global_db is None:
+            _write_global_rows(cursor, db.dialect, users, histogram, characters)
+
+        # One counter/summary refresh per chunk instead of a SELECT-then-UPDATE per row
+        session_ids = [s[0] for s in sessions]
+        placeholders = ", ".join(["%s"] * len(session_ids))
+        cursor.execute(f"""
+            UPDATE p1_mb_sessions
+            SET completed = (
+                SELECT COUNT(*) FROM p1_mb_character_responses r
+                WHERE r.session_id = p1_mb_sessions.id
+            )
+            WHERE id IN ({placeholders})
+        """, session_ids)
+        rebuild_summaries(cursor, session_ids)
+        rebuild_trends(cursor, session_ids)
+        rebuild_search(cursor, session_ids)
+
+    if global_db is not None:
+        with global_db.get_connection() as conn:
+            _write_global_rows(conn.cursor(), global_db.dialect, users, histogram, characters)
+
+    return {"users": len(users), "sessions": len(sessions), "responses": len(responses)}
+
+
+def _import_sharded_chunk(db, views: List, records: List[Dict]) -> Dict[str, int]:
+    by_shard: Dict[int, List[Dict]] = {}
+    for record in records:
+        shard = db.shards.shard_of_user(_user_id(record), write=True)
+        by_shard.setdefault(shard, []).append(record)
+    counts = {"users": 0, "sessions": 0, "responses": 0}
+    for shard, group in sorted(by_shard.items()):
+        for key, value in import_chunk(views[shard], group, global_db=views[0]).items():
+            counts[key] += value
+    return counts
+
+
+def bulk_import(db, records: Iterable[Dict], chunk_size: int = 1000,
+                progress: bool = False) -> Dict[str, Any]:
+    """Stream records into the database chunk by chunk.
+
+    Returns totals plus elapsed seconds and response rows/sec. A failed
+    chunk is rolled back as a whole and the error is raised.
+    """
+    totals = {"users": 0, "sessions": 0, "responses": 0, "chunks": 0}
+    started = time.perf_counter()
+    shards = getattr(db, "shards", None)
+    views = db.shard_views() if shards is not None and shards.sharded else None
+
+    for chunk in _chunks(records, chunk_size):
+        chunk = _resolve_users(db, chunk)
+        if views is None:
+            counts = import_chunk(db, chunk)
+        else:
+            counts = _import_sharded_chunk(db, views, chunk)
+        for key, value in counts.items():
+            totals[key] += value
+        totals["chunks"] += 1
+        if progress:
+            elapsed = time.perf_counter() - started
+            print(f"chunk {totals['chunks']}: {totals['sessions']} sessions, "
+                  f"{totals['responses']} responses ({totals['responses'] / elapsed:,.0f} rows/s)")
+
+    elapsed = time.perf_counter() - started
+    totals["seconds"] = elapsed
+    totals["rows_per_second"] = totals["responses"] / elapsed if elapsed else 0.0
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import assessment sessions from JSONL")
+    parser.add_argument("path", help="JSONL file, one session per line")
+    parser.add_argument("--chunk-size", type=int, default=1000,
+                        help="Sessions per transaction (default: 1000)")
+    args = parser.parse_args()
+
+    from utils.database import Database
+    db = Database()
+    totals = bulk_import(db, iter_jsonl(args.path), chunk_size=args.chunk_size, progress=True)
+    print(
+        f"Imported {totals['sessions']} sessions and {totals['responses']} responses "
+        f"in {totals['seconds']:.1f}s ({totals['rows_per_second']:,.0f} rows/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+# utils/cache.py
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Tuple
+
+
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cache-refresh")
+# Background refreshes started by get_or_load_async, kept referenced until they finish
+_refresh_tasks = set()
+# _end_load's value for a load that raised
+_NOT_LOADED = object()
+
+
+class _Entry:
+    __slots__ = ("value", "stored_at", "tags")
+
+    def __init__(self, value, tags):
+        self.value = value
+        self.stored_at = time.monotonic()
+        self.tags = tags
+
+
+class ReadThroughCache:
+    """Thread-safe LRU cache with TTL, tag invalidation and stale-while-revalidate.
+
+    An entry younger than `ttl` is served as is. Between `ttl` and
+    `ttl + stale_ttl` it is still served, while a background refresh reloads
+    it; past that it is reloaded synchronously. Cached values are shared
+    between callers and must be treated as read-only.
+
+    A load that a matching invalidate / invalidate_tag overtakes is returned
+    but not cached: each key and tag with a load in flight has a generation,
+    bumped on invalidation and compared before the loaded value is stored.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 30.0, stale_ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._tags: Dict[Hashable, set] = {}
+        self._refreshing = set()
+        # Generations and load counts of the keys and tags with a load in flight
+        self._generations: Dict[Hashable, int] = {}
+        self._loading: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0,
+                       "refresh_errors": 0, "evictions": 0, "invalidations": 0}
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any],
+                    tags: Iterable[Hashable] = ()) -> Any:
+        """Return the cached value for `key`, calling `loader()` when needed.
+
+        Exceptions from a synchronous load propagate and nothing is cached.
+        """
+        found, value, stale = self._lookup(key)
+        if stale is not None:
+            _refresh_executor.submit(self._refresh, key, loader, tuple(tags), stale)
+        if found:
+            return value
+
+        with self.loading(key, tags) as store:
+            value = loader()
+            store(value)
+        return value
+
+    async def get_or_load_async(self, key: Hashable, loader: Callable[[], Awaitable],
+                                tags: Iterable[Hashable] = ()) -> Any:
+        """get_or_load for coroutine loaders; stale entries are refreshed in a task on the running loop"""
+        found, value, stale = self._lookup(key)
+        if stale is not None:
+            task = asyncio.ensure_future(self._refresh_async(key, loader, tuple(tags), stale))
+            _refresh_tasks.add(task)
+            task.add_done_callback(_refresh_tasks.discard)
+        if found:
+            return value
+
+        with self.loading(key, tags) as store:
+            value = await loader()
+            store(value)
+        return value
+
+    @contextmanager
+    def loading(self, key: Hashable, tags: Iterable[Hashable] = ()):
+        """Guard a load of `key`: the value passed to the yielded `store` is cached
+        on exit, unless `key` or one of `tags` was invalidated in the meantime"""
+        tags = tuple(tags)
+        token = self._begin_load(key, tags)
+        loaded = []
+        try:
+            yield loaded.append
+        except BaseException:
+            self._end_load(key, tags, token)
+            raise
+        self._end_load(key, tags, token, *loaded[-1:])
+
+    @staticmethod
+    def _markers(key, tags) -> Tuple:
+        return (("key", key),) + tuple(("tag", tag) for tag in tags)
+
+    def _begin_load(self, key, tags) -> Tuple:
+        """Register a load of `key`; returns the generations to compare when it ends"""
+        markers = self._markers(key, tags)
+        with self._lock:
+            for marker in markers:
+                self._loading[marker] = self._loading.get(marker, 0) + 1
+            return tuple(self._generations.get(marker, 0) for marker in markers)
+
+    def _end_load(self, key, tags, token, value=_NOT_LOADED):
+        """Store `value` unless the key or a tag was invalidated since _begin_load"""
+        markers = self._markers(key, tags)
+        with self._lock:
+            current = tuple(self._generations.get(marker, 0) for marker in markers)
+            if value is not _NOT_LOADED and current == token:
+                self._store(key, _Entry(value, tags))
+            for marker in markers:
+                self._loading[marker] -= 1
+                if not self._loading[marker]:
+                    del self._loading[marker]
+                    self._generations.pop(marker, None)
+
+    def _bump(self, marker):
+        # Only loads in flight compare generations, so idle markers need none
+        if marker in self._loading:
+            self._generations[marker] = self._generations.get(marker, 0) + 1
+
+    def _lookup(self, key: Hashable) -> Tuple[bool, Any, Any]:
+        """(found, value, stale entry to refresh in the background, if any)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry.stored_at
+                if age < self.ttl:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return True, entry.value, None
+                if age < self.ttl + self.stale_ttl:
+                    self._entries.move_to_end(key)
+                    self._stats["stale_hits"] += 1
+                    if key in self._refreshing:
+                        return True, entry.value, None
+                    self._refreshing.add(key)
+                    return True, entry.value, entry
+            self._stats["misses"] += 1
+        return False, None, None
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a cached value without loading, or `default` if absent/expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry.stored_at >= self.ttl + self.stale_ttl:
+                self._stats["misses"] += 1
+                return default
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry.value
+
+    def set(self, key: Hashable, value: Any, tags: Iterable[Hashable] = ()):
+        with self._lock:
+            self._store(key, _Entry(value, tuple(tags)))
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._bump(("key", key))
+            if self._remove(key):
+                self._stats["invalidations"] += 1
+
+    def invalidate_tag(self, tag: Hashable):
+        """Drop every entry stored with `tag`"""
+        with self._lock:
+            self._bump(("tag", tag))
+            for key in list(self._tags.get(tag, ())):
+                if self._remove(key):
+                    self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            for marker in self._loading:
+                self._bump(marker)
+            self._entries.clear()
+            self._tags.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["entries"] = len(self._entries)
+        return snapshot
+
+    def _refresh(self, key, loader, tags, stale_entry):
+        try:
+            value = loader()
+        except Exception as e:
+            self._refresh_failed(key, e)
+            return
+        self._refreshed(key, value, tags, stale_entry)
+
+    async def _refresh_async(self, key, loader, tags, stale_entry):
+        try:
+            value = await loader()
+        except Exception as e:
+            self._refresh_failed(key, e)
+            return
+        self._refreshed(key, value, tags, stale_entry)
+
+    def _refresh_failed(self, key, error: Exception):
+        print(f"Error refreshing cache entry {key!r}: {error}")
+        with self._lock:
+            self._stats["refresh_errors"] += 1
+            self._refreshing.discard(key)
+
+    def _refreshed(self, key, value, tags, stale_entry):
+        with self._lock:
+            self._refreshing.discard(key)
+            self._stats["refreshes"] += 1
+            # Skip the write if the entry was invalidated or replaced while loading
+            if self._entries.get(key) is stale_entry:
+                self._store(key, _Entry(value, tags))
+
+    def _store(self, key, entry: _Entry):
+        self._remove(key)
+        self._entries[key] = entry
+        for tag in entry.tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._stats["evictions"] += 1
+
+    def _remove(self, key) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+        return True
+
+
+_caches: Dict[Any, ReadThroughCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(key, factory: Callable[[], ReadThroughCache]) -> ReadThroughCache:
+    """Return the process-wide cache for `key`, creating it on first use"""
+    cache = _caches.get(key)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(key)
+            if cache is None:
+                cache = factory()
+                _caches[key] = cache
+    return cache
@@ -0,0 +1,240 @@
+# utils/connection_pool.py
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection became available in time"""
+
+
+class PooledConnection:
+    """A raw DB-API connection plus the per-connection state the pool keeps"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self._statements = {}
+
+    def cursor(self, *args, **kwargs):
+        return self.raw.cursor(*args, **kwargs)
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def prepared(self, sql: str, dictionary: bool = False):
+        """Return a cached prepared cursor for `sql` on this connection.
+
+        MySQL Connector only re-prepares when it sees a different operation
+        object, so callers should pass module-level SQL constants. It has no
+        buffered prepared cursor, so `buffered=False` overrides the
+        connection's default; callers must fetch every row before the
+        connection runs another statement. Statement handles belong to the
+        server session, so the pool pings without reconnecting and calls
+        reset_statements after any error on the connection.
+        """
+        key = (sql, dictionary)
+        cursor = self._statements.get(key)
+        if cursor is None:
+            cursor = self.raw.cursor(prepared=True, dictionary=dictionary, buffered=False)
+            self._statements[key] = cursor
+        return cursor
+
+    def reset_statements(self):
+        """Close the cached prepared cursors; the next prepared() call prepares again"""
+        for cursor in self._statements.values():
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        self._statements.clear()
+
+    def close(self):
+        self.reset_statements()
+        try:
+            self.raw.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """Thread-safe, blocking connection pool with idle health checks.
+
+    Connections are opened lazily up to `size`. A connection that sat idle
+    longer than `idle_check` seconds is pinged before being handed out, and
+    one older than `max_lifetime` seconds is recycled.
+    """
+
+    def __init__(self, connect: Callable[[], Any], size: int = 5, timeout: float = 10.0,
+                 idle_check: float = 30.0, max_lifetime: float = 3600.0,
+                 ping: Optional[Callable[[Any], None]] = None):
+        self._connect = connect
+        # No silent reconnect: a new server session would orphan the prepared statements,
+        # so a failed ping replaces the connection instead
+        self._ping = ping or (lambda raw: raw.ping(reconnect=False))
+        self.size = max(1, int(size))
+        self.timeout = timeout
+        self.idle_check = idle_check
+        self.max_lifetime = max_lifetime
+
+        self._idle = deque()
+        self._open = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "created": 0,
+            "recycled": 0,
+            "health_check_failures": 0,
+            "discarded": 0,
+        }
+
+    def acquire(self) -> PooledConnection:
+        """Check out a healthy connection, waiting up to `timeout` seconds"""
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        with self._cond:
+            while True:
+                if self._idle:
+                    pooled = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    pooled = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(
+                        f"No database connection available after {self.timeout:.1f}s "
+                        f"(pool size {self.size})"
+                    )
+                if not waited:
+                    self._stats["waits"] += 1
+                    waited = True
+                self._cond.wait(remaining)
+            self._stats["checkouts"] += 1
+
+        if pooled is None:
+            # The slot is already counted as open; _create releases it on failure
+            return self._create()
+        return self._validate(pooled)
+
+    def release(self, pooled: PooledConnection, broken: bool = False):
+        """Return a connection to the pool, or drop it if it is broken"""
+        if broken:
+            pooled.close()
+            with self._cond:
+                self._open -= 1
+                self._stats["discarded"] += 1
+                self._cond.notify()
+            return
+
+        pooled.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(pooled)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Context manager yielding a pooled connection"""
+        pooled = self.acquire()
+        broken = False
+        try:
+            yield pooled
+        except Exception:
+            broken = not self._is_usable(pooled)
+            if not broken:
+                # The error may have come from a statement handle the server no longer knows
+                pooled.reset_statements()
+            raise
+        finally:
+            self.release(pooled, broken=broken)
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of pool counters"""
+        with self._cond:
+            snapshot = dict(self._stats)
+            snapshot["size"] = self.size
+            snapshot["open"] = self._open
+            snapshot["idle"] = len(self._idle)
+            snapshot["in_use"] = self._open - len(self._idle)
+        return snapshot
+
+    def close_all(self):
+        """Close every idle connection (checked-out ones close on release)"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open -= len(idle)
+        for pooled in idle:
+            pooled.close()
+
+    def _create(self) -> PooledConnection:
+        try:
+            pooled = PooledConnection(self._connect())
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats["created"] += 1
+        return pooled
+
+    def _validate(self, pooled: PooledConnection) -> PooledConnection:
+        now = time.monotonic()
+        if now - pooled.created_at > self.max_lifetime:
+            pooled.close()
+            with self._cond:
+                self._stats["recycled"] += 1
+            return self._create()
+
+        if now - pooled.last_used > self.idle_check:
+            try:
+                self._ping(pooled.raw)
+            except Exception:
+                pooled.close()
+                with self._cond:
+                    self._stats["health_check_failures"] += 1
+                return self._create()
+        return pooled
+
+    def _is_usable(self, pooled: PooledConnection) -> bool:
+        is_connected = getattr(pooled.raw, "is_connected", None)
+        if is_connected is None:
+            return True
+        try:
+            return bool(is_connected())
+        except Exception:
+            return False
+
+
+_pools: Dict[Any, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, factory: Callable[[], ConnectionPool]) -> ConnectionPool:
+    """Return the process-wide pool for `key`, creating it on first use"""
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = factory()
+                _pools[key] = pool
+    return pool
+
+
+def all_pool_stats() -> Dict[str, Dict[str, Any]]:
+    """Stats for every pool created in this process"""
+    with _pools_lock:
+        pools = list(_pools.items())
+    return {str(key): pool.stats() for key, pool in pools}
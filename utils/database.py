@@ -1,319 +1,1146 @@
 # utils/database.py
+import heapq
 import json
 import os
+import time
 import uuid
 import streamlit as st
-from datetime import datetime
-from typing import List, Dict, Any
+from collections import Counter
 from contextlib import contextmanager
-import mysql.connector
-from mysql.connector import Error
-import urllib.parse
+from datetime import datetime
+from typing import List, Dict, Any, Iterator, Tuple
 from dotenv import load_dotenv
+from utils.storage_backends import create_backend
+from utils import migrations
+from utils import bulk_import
+from utils import retention
+from utils import answer_search
+from utils import outbox
+from utils.cache import ReadThroughCache, get_cache
+from utils.replicas import ReplicaRouter, get_router
+from utils import sharding
+from utils.sharding import ShardRouter, ShardView
+from utils.response_rows import ResponseRow
+from utils.score_trend import build_trend, trend_params, trend_upsert_sql
+from utils.session_summary import summary_params, summary_upsert_sql
+from utils import rating_histograms
+from utils import session_metrics
+from utils.blob_codec import FORMAT_JSON, decode_field, encode_fields
+from utils.instrumentation import (
+    InstrumentedConnection, QueryMetrics, current_query, get_metrics, instrumented
+)
+
+
+INSERT_CHARACTER_RESPONSE_SQL = """
+    INSERT INTO p1_mb_character_responses
+    (session_id, character_id, character_name, read_passage, responses, analysis,
+     responses_blob, analysis_blob)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+SELECT_SESSION_RESPONSES_SQL = """
+    SELECT character_id, character_name, read_passage, responses, analysis,
+           responses_blob, analysis_blob, created_at
+    FROM p1_mb_character_responses
+    WHERE session_id = %s
+    ORDER BY created_at, id
+"""
+
+RESPONSE_EXPORT_SELECT = """
+    SELECT r.id, r.session_id, s.user_id, r.character_id, r.character_name, r.read_passage,
+           r.responses, r.analysis, r.responses_blob, r.analysis_blob, r.created_at
+    FROM p1_mb_character_responses r
+    JOIN p1_mb_sessions s ON s.id = r.session_id
+"""
+
+BATCH_SESSION_INFO_SELECT = """
+    SELECT s.id, s.user_id, s.created_at, s.completed, u.username,
+           m.session_id AS summary_session_id, m.completed AS summary_completed, m.avg_rating,
+           m.best_character_id, m.best_character_name, m.best_rating, m.strength_count,
+           m.last_activity
+    FROM p1_mb_sessions s
+    JOIN p1_mb_users u ON u.id = s.user_id
+    LEFT JOIN p1_mb_session_summary m ON m.session_id = s.id
+"""
+
+BATCH_RESPONSES_SELECT = """
+    SELECT session_id, character_id, character_name, read_passage, responses, analysis,
+           responses_blob, analysis_blob, created_at
+    FROM p1_mb_character_responses
+"""
+
+# Primary-key order, so the rows come straight off the (user_id, ...) key;
+# build_trend orders the sessions by start time
+USER_SCORE_TREND_SQL = """
+    SELECT t.session_id, s.created_at, t.character_id, t.character_name,
+           t.metric, t.rating_sum, t.rating_count
+    FROM p1_mb_user_score_trend t
+    JOIN p1_mb_sessions s ON s.id = t.session_id
+    WHERE t.user_id = %s
+    ORDER BY t.session_id, t.character_id, t.metric
+"""
+
+# Ids per IN (...) list in batch reads
+BATCH_SIZE = 500
+
+SESSION_PAGE_SELECT = """
+    SELECT s.id, s.created_at, s.completed,
+           m.avg_rating, m.best_character_name, m.last_activity
+    FROM p1_mb_sessions s
+    LEFT JOIN p1_mb_session_summary m ON m.session_id = s.id
+"""
+
+USER_BY_USERNAME_SQL = "SELECT id, username, created_at FROM p1_mb_users WHERE username = %s"
+
+USER_BY_ID_SQL = "SELECT id, username, created_at FROM p1_mb_users WHERE id = %s"
+
+# Username -> user id for every shard's users; the directory lives on shard 0
+DIRECTORY_LOOKUP_SQL = "SELECT user_id FROM p1_mb_user_directory WHERE username = %s"
+
+SESSION_INFO_SQL = """
+    SELECT s.id, s.user_id, s.created_at, s.completed, u.username
+    FROM p1_mb_sessions s
+    JOIN p1_mb_users u ON s.user_id = u.id
+    WHERE s.id = %s
+"""
+
+SESSION_SUMMARY_SQL = """
+    SELECT session_id, completed, avg_rating, best_character_id,
+           best_character_name, best_rating, strength_count, last_activity
+    FROM p1_mb_session_summary
+    WHERE session_id = %s
+"""
+
+# {marks}: one placeholder per user id
+LATEST_SESSIONS_SQL = """
+    SELECT id, user_id, created_at, completed
+    FROM p1_mb_sessions
+    WHERE user_id IN ({marks}) AND completed > 0
+    ORDER BY user_id DESC, created_at DESC, id DESC
+"""
+
+# {marks}: one placeholder per session id
+STORED_KEYS_SQL = "SELECT session_id, character_id FROM p1_mb_character_responses WHERE session_id IN ({marks})"
+
+
+def session_data_from_row(row: Dict) -> Dict:
+    """{"session_info", "summary", "responses": []} from a BATCH_SESSION_INFO_SELECT row"""
+    return {
+        "session_info": {
+            'session_id': row["id"],
+            'user_id': row["user_id"],
+            'created_at': row["created_at"],
+            'completed': row["completed"],
+            'username': row["username"]
+        },
+        "summary": {
+            "session_id": row["id"],
+            "completed": row["summary_completed"],
+            "avg_rating": row["avg_rating"],
+            "best_character_id": row["best_character_id"],
+            "best_character_name": row["best_character_name"],
+            "best_rating": row["best_rating"],
+            "strength_count": row["strength_count"],
+            "last_activity": row["last_activity"]
+        } if row["summary_session_id"] is not None else None,
+        "responses": [],
+    }
+
+
+def get_setting(name: str, default=None):
+    """Read a setting from Streamlit secrets, falling back to the environment"""
+    try:
+        return st.secrets[name]
+    except (KeyError, FileNotFoundError):
+        return os.getenv(name, default)
+
+
+def is_admin(username: str) -> bool:
+    """Admin pages are open to the usernames listed in ADMIN_USERNAMES (comma-separated)"""
+    admins = {u.strip() for u in (get_setting("ADMIN_USERNAMES") or "").split(",") if u.strip()}
+    return bool(username) and username in admins
+
+
+def is_coach(username: str) -> bool:
+    """The coach view is open to COACH_USERNAMES (comma-separated) and to admins"""
+    coaches = {u.strip() for u in (get_setting("COACH_USERNAMES") or "").split(",") if u.strip()}
+    return bool(username) and (username in coaches or is_admin(username))
+
+
+def pool_options() -> Dict:
+    """Connection pool settings shared by the primary and replica backends"""
+    return {
+        "pool_size": int(get_setting("MYSQL_POOL_SIZE", 5)),
+        "pool_timeout": float(get_setting("MYSQL_POOL_TIMEOUT", 10)),
+        "idle_check": float(get_setting("MYSQL_POOL_IDLE_CHECK", 30)),
+        "max_lifetime": float(get_setting("MYSQL_POOL_MAX_LIFETIME", 3600)),
+    }
+
+
+def get_replica_router(primary) -> ReplicaRouter:
+    """Process-wide replica router for a primary backend, from DATABASE_REPLICA_URLS"""
+    def build():
+        urls = [u.strip() for u in (get_setting("DATABASE_REPLICA_URLS") or "").split(",") if u.strip()]
+        max_lag = float(get_setting("REPLICA_MAX_LAG", 5))
+        return ReplicaRouter(
+            primary,
+            [create_backend(url, **pool_options()) for url in urls],
+            max_lag=max_lag,
+            check_interval=float(get_setting("REPLICA_CHECK_INTERVAL", 5)),
+            pin_seconds=float(get_setting("REPLICA_PIN_SECONDS", max_lag))
+        )
+    return get_router(primary.key, build)
+
+
+def get_response_outbox(db) -> "outbox.ResponseOutbox":
+    """Process-wide local outbox draining into `db` (None when RESPONSE_OUTBOX is "0")"""
+    if str(get_setting("RESPONSE_OUTBOX", "1")) == "0":
+        return None
+    path = get_setting("RESPONSE_OUTBOX_PATH", "response_outbox.db")
+    return outbox.get_outbox(path, lambda: outbox.ResponseOutbox(
+        path,
+        db,
+        batch_size=int(get_setting("RESPONSE_OUTBOX_BATCH_SIZE", 100)),
+        flush_interval=float(get_setting("RESPONSE_OUTBOX_FLUSH_INTERVAL", 1)),
+        max_retry_delay=float(get_setting("RESPONSE_OUTBOX_MAX_RETRY_DELAY", 60)),
+        max_attempts=int(get_setting("RESPONSE_OUTBOX_MAX_ATTEMPTS", 100)),
+        synchronous=get_setting("RESPONSE_OUTBOX_SYNCHRONOUS", "NORMAL")
+    ))
+
+
+def get_shard_router(primary) -> ShardRouter:
+    """Process-wide shard router: shard 0 is `primary`, then DATABASE_SHARD_URLS in order"""
+    def build():
+        urls = [u.strip() for u in (get_setting("DATABASE_SHARD_URLS") or "").split(",") if u.strip()]
+        return ShardRouter(
+            [primary] + [create_backend(url, **pool_options()) for url in urls],
+            map_ttl=float(get_setting("SHARD_MAP_TTL", 5)),
+            move_wait=float(get_setting("SHARD_MOVE_WAIT", 30))
+        )
+    return sharding.get_router(primary.key, build)
+
+
+def get_read_cache(key) -> ReadThroughCache:
+    """Process-wide read-through cache of a database, shared by Database and AsyncDatabase"""
+    return get_cache(key, lambda: ReadThroughCache(
+        max_entries=int(get_setting("DB_CACHE_MAX_ENTRIES", 1024)),
+        ttl=float(get_setting("DB_CACHE_TTL", 30)),
+        stale_ttl=float(get_setting("DB_CACHE_STALE_TTL", 300))
+    ))
+
+
+def get_user_caches(key) -> Tuple[ReadThroughCache, ReadThroughCache]:
+    """Process-wide (found, missing) user caches of a database, keyed by ("username", name) and ("id", id)"""
+    found = get_cache((key, "users"), lambda: ReadThroughCache(
+        max_entries=int(get_setting("USER_CACHE_MAX_ENTRIES", 4096)),
+        ttl=float(get_setting("USER_CACHE_TTL", 300)),
+        stale_ttl=0
+    ))
+    missing = get_cache((key, "missing_users"), lambda: ReadThroughCache(
+        max_entries=int(get_setting("USER_CACHE_MAX_ENTRIES", 4096)),
+        ttl=float(get_setting("USER_CACHE_NEGATIVE_TTL", 10)),
+        stale_ttl=0
+    ))
+    return found, missing
+
+
+# (database key, catalogue) pairs already written by register_characters
+_registered_characters = set()
 
 
 class Database:
-    def __init__(self):
-        """Initialize MySQL database connection"""
+    def __init__(self, migrate: bool = True):
+        """Initialize the storage backend named by DATABASE_URL (or MYSQL_URL)"""
         load_dotenv()
-        try:
-            mysql_url = st.secrets["MYSQL_URL"]
-        except (KeyError, FileNotFoundError):
-            mysql_url = os.getenv("MYSQL_URL")
-        url = urllib.parse.urlparse(mysql_url)
-
-        self.host = url.hostname
-        self.port = url.port
-        self.user = url.username
-        self.password = url.password
-        mysql_db = url.path.lstrip('/') 
-        self.database = mysql_db
+        database_url = get_setting("DATABASE_URL") or get_setting("MYSQL_URL")
+
+        # One pool per database, shared by every Streamlit session in the process
+        self.backend = create_backend(database_url, **pool_options())
+        self.dialect = self.backend.dialect
+        self.key = self.backend.key
+        self.pool = self.backend.pool
+        # "json" keeps TEXT columns; "zlib"/"msgpack-zstd" write compact blobs (utils/blob_codec.py)
+        self.blob_format = get_setting("DB_BLOB_FORMAT", FORMAT_JSON)
+
+        self.histogram_compact_interval = float(get_setting("HISTOGRAM_COMPACT_INTERVAL", 300))
+
+        # Optional read replicas of shard 0 for dashboard reads (utils/replicas.py)
+        self.replicas = get_replica_router(self.backend)
+
+        # Per-user data spread over DATABASE_URL plus DATABASE_SHARD_URLS (utils/sharding.py)
+        self.shards = get_shard_router(self.backend)
+
+        # Process-wide read-through cache for dashboard reads, invalidated on writes
+        self.cache = get_read_cache(self.key)
+
+        # User rows by username and by id; misses are cached briefly to absorb signup bursts
+        self.user_cache, self.missing_user_cache = get_user_caches(self.key)
+
+        # Process-wide per-query latency histograms and slow-query log (utils/instrumentation.py)
+        self.metrics = get_metrics(self.key, lambda: QueryMetrics(
+            slow_query_ms=float(get_setting("DB_SLOW_QUERY_MS", 250)),
+            slow_log_path=get_setting("DB_SLOW_QUERY_LOG")
+        ))
         
-        # Initialize database on creation
-        self.init_database()
+        # Schema version is checked once per process per shard, not on every construction
+        if migrate:
+            for view in self.shard_views():
+                migrations.ensure_schema(
+                    view, auto_apply=str(get_setting("DB_AUTO_MIGRATE", "1")) != "0"
+                )
+
+        # Local outbox for submitted responses, drained in the background (utils/outbox.py)
+        self.outbox = get_response_outbox(self)
+
+    def get_pool_stats(self) -> Dict:
+        """Pool metrics: checkouts, waits, timeouts, open/idle connections"""
+        return self.backend.stats()
 
     @contextmanager
-    def get_connection(self):
-        """Context manager for MySQL database connections"""
-        conn = None
+    def _instrumented_connection(self, backend, query: str = None):
+        name = query or current_query()
+        started = time.perf_counter()
+        connected = False
         try:
-            conn = mysql.connector.connect(
-                host=self.host,
-                port=self.port,
-                user=self.user,
-                password=self.password,
-                database=self.database,
-                ssl_disabled=False
-            )
-            yield conn
-            conn.commit()
-        except Error as e:
-            if conn:
-                conn.rollback()
-            raise e
-        finally:
-            if conn and conn.is_connected():
-                conn.close()
-    
-    def init_database(self):
-        """Initialize database tables"""
+            with backend.connection() as conn:
+                connected = True
+                self.metrics.observe(name, "connect", (time.perf_counter() - started) * 1000)
+                yield InstrumentedConnection(conn, self.metrics, name)
+        except Exception:
+            if not connected:
+                # Pool timeouts and failed connects; statement errors are counted by the cursor
+                self.metrics.record_error(name)
+            raise
+
+    def get_connection(self, query: str = None, shard: int = 0):
+        """Context manager for pooled connections to a shard's primary (shard 0 by default).
+
+        Statements run on the connection are timed under `query`, defaulting
+        to the name of the instrumented method currently running.
+        """
+        return self._instrumented_connection(self.shards.backends[shard], query)
+
+    @contextmanager
+    def get_read_connection(self, *keys, query: str = None, shard: int = 0):
+        """Like get_connection, but may use a healthy replica.
+
+        `keys` are the session/user ids the read concerns; reads for ids
+        written in the last few seconds stay on the primary. A replica that
+        fails is taken out of rotation. Replicas are only configured for
+        shard 0.
+        """
+        if shard:
+            with self._instrumented_connection(self.shards.backends[shard], query) as conn:
+                yield conn
+            return
+        backend = self.replicas.choose(keys)
+        if backend is self.backend:
+            with self._instrumented_connection(backend, query) as conn:
+                yield conn
+            return
+        try:
+            with self._instrumented_connection(backend, query) as conn:
+                yield conn
+        except Exception as e:
+            self.replicas.mark_failed(backend, e)
+            raise
+
+    def shard_views(self) -> List[ShardView]:
+        """One single-database view per shard, for maintenance jobs"""
+        return [ShardView(self, shard) for shard in range(len(self.shards.backends))]
+
+    def new_session_id(self, user_id: str) -> str:
+        """Id for a new session of `user_id`; it routes to the user's shard by itself"""
+        return sharding.new_session_id(user_id)
+
+    def get_cache_stats(self) -> Dict:
+        """Read-through cache metrics: hits, stale hits, misses, evictions"""
+        return self.cache.stats()
+
+    def get_user_cache_stats(self) -> Dict:
+        """User cache counters; hit_rate counts cached misses as hits"""
+        found = self.user_cache.stats()
+        missing = self.missing_user_cache.stats()
+        lookups = found["hits"] + found["misses"]
+        hits = found["hits"] + missing["hits"]
+        return {
+            "lookups": lookups,
+            "hits": found["hits"],
+            "negative_hits": missing["hits"],
+            "misses": lookups - hits,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": found["entries"],
+            "negative_entries": missing["entries"],
+            "evictions": found["evictions"] + missing["evictions"],
+        }
+
+    def _cache_user(self, user: Dict):
+        self.user_cache.set(("username", user["username"]), user)
+        self.user_cache.set(("id", user["id"]), user)
+        self.missing_user_cache.invalidate(("username", user["username"]))
+
+    def _invalidate_user(self, username: str, user_id: str = None):
+        """Forget a user after creation so lookups see the new row"""
+        self.user_cache.invalidate(("username", username))
+        if user_id:
+            self.user_cache.invalidate(("id", user_id))
+        self.missing_user_cache.invalidate(("username", username))
+
+    def _fetch_user_by_id(self, user_id: str) -> Dict:
+        with self.get_connection(shard=self.shards.shard_of_user(user_id)) as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(USER_BY_ID_SQL, (user_id,))
+            return cursor.fetchone()
+
+    def _fetch_user(self, username: str) -> Dict:
+        """User row by username; with several shards, via the username directory on shard 0"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            if not self.shards.sharded:
+                cursor.execute(USER_BY_USERNAME_SQL, (username,))
+                return cursor.fetchone()
+            cursor.execute(DIRECTORY_LOOKUP_SQL, (username,))
+            row = cursor.fetchone()
+        return self._fetch_user_by_id(row["user_id"]) if row else None
+
+    def _insert_user(self, user_id: str, username: str, password: str):
+        """Claim the username in the directory and write the user row to its shard"""
+        shard = self.shards.shard_of_user(user_id, write=True)
+        row = (user_id, username, password, sharding.user_bucket(user_id))
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            
-            # Users table with password - MYSQL SYNTAX
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS p1_mb_users (
-                    id VARCHAR(36) PRIMARY KEY,
-                    username VARCHAR(255) NOT NULL UNIQUE,
-                    password VARCHAR(255) NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Sessions table - MYSQL SYNTAX
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS p1_mb_sessions (
-                    id VARCHAR(36) PRIMARY KEY,
-                    user_id VARCHAR(36) NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    completed INT DEFAULT 0,
-                    FOREIGN KEY (user_id) REFERENCES p1_mb_users(id) ON DELETE CASCADE
-                )
-            """)
-            
-            # Character responses table - MYSQL SYNTAX
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS p1_mb_character_responses (
-                    id INT PRIMARY KEY AUTO_INCREMENT,
-                    session_id VARCHAR(36) NOT NULL,
-                    character_id INT NOT NULL,
-                    character_name VARCHAR(255) NOT NULL,
-                    read_passage INT DEFAULT 0,
-                    responses TEXT NOT NULL,
-                    analysis TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (session_id) REFERENCES p1_mb_sessions(id) ON DELETE CASCADE
+            cursor.execute(sharding.DIRECTORY_INSERT_SQL, (username, user_id))
+            if shard == 0:
+                cursor.execute(sharding.USER_INSERT_SQL, row)
+        if shard == 0:
+            return
+        try:
+            with self.get_connection(shard=shard) as conn:
+                conn.cursor().execute(sharding.USER_INSERT_SQL, row)
+        except Exception:
+            # Give the username back
+            with self.get_connection() as conn:
+                conn.cursor().execute(
+                    "DELETE FROM p1_mb_user_directory WHERE username = %s AND user_id = %s",
+                    (username, user_id)
                 )
-            """)
-            
-            # Create indexes for better query performance
-            # MySQL doesn't support IF NOT EXISTS for indexes, so wrap in try-except
-            try:
-                cursor.execute("""
-                    CREATE INDEX idx_p1_mb_sessions_user_id 
-                    ON p1_mb_sessions(user_id)
-                """)
-            except Error:
-                pass  # Index already exists
-            
-            try:
-                cursor.execute("""
-                    CREATE INDEX idx_p1_mb_character_responses_session_id 
-                    ON p1_mb_character_responses(session_id)
-                """)
-            except Error:
-                pass
-            
-            try:
-                cursor.execute("""
-                    CREATE INDEX idx_p1_mb_users_username 
-                    ON p1_mb_users(username)
-                """)
-            except Error:
-                pass
-            
-            conn.commit()
-            print("Database Initialized")
+            raise
+
+    def _lookup_user(self, username: str) -> Dict:
+        """User row by username through the user cache (None if absent)"""
+        user = self.user_cache.get(("username", username))
+        if user is not None:
+            return user
+        if self.missing_user_cache.get(("username", username)):
+            return None
+        # A signup that invalidates the name while this runs keeps it out of the negative cache
+        with self.missing_user_cache.loading(("username", username)) as store_missing:
+            user = self._fetch_user(username)
+            if not user:
+                store_missing(True)
+        if user:
+            self._cache_user(user)
+        return user
+
+    def get_replica_stats(self) -> Dict:
+        """Replica health, lag and read counts by destination"""
+        return self.replicas.stats()
+
+    def get_query_stats(self) -> Dict:
+        """Per-query connect/execute/fetch histograms plus pool and cache counters"""
+        snapshot = self.metrics.snapshot()
+        snapshot["pool"] = self.get_pool_stats()
+        snapshot["cache"] = self.get_cache_stats()
+        snapshot["user_cache"] = self.get_user_cache_stats()
+        snapshot["replicas"] = self.get_replica_stats()
+        snapshot["shards"] = self.shards.stats()
+        snapshot["outbox"] = self.outbox.stats() if self.outbox is not None else None
+        return snapshot
+
+    def dump_query_stats(self, path: str):
+        """Write get_query_stats() to `path` as JSON"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.get_query_stats(), f, indent=2)
+
+    def _invalidate_session(self, session_id: str, user_id: str = None):
+        """Drop cached reads affected by a write to a session and pin them to the primary"""
+        self.replicas.pin(session_id, user_id)
+        self.cache.invalidate(("responses", session_id))
+        self.cache.invalidate(("summary", session_id))
+        self.cache.invalidate(("metrics", session_id))
+        if user_id:
+            self.cache.invalidate_tag(("user", user_id))
+    
+    def init_database(self):
+        """Apply any pending schema migrations (see utils/migrations.py)"""
+        migrations.upgrade(self)
+        print("Database Initialized")
     
+    @instrumented("create_user_with_password")
     def create_user_with_password(self, user_id: str, username: str, password: str):
         """Create a new user with password"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "INSERT INTO p1_mb_users (id, username, password) VALUES (%s, %s, %s)",
-                    (user_id, username, password)
-                )
-                return {"id": user_id, "username": username}
+            self._insert_user(user_id, username, password)
+            self._invalidate_user(username, user_id)
+            return {"id": user_id, "username": username}
         except Exception as e:
             print(f"Error creating user: {e}")
             return None
     
+    @instrumented("verify_user_login")
     def verify_user_login(self, username: str, password: str) -> Dict:
-        """Verify user login credentials"""
+        """Verify user login credentials (the password is always checked against the database)"""
         try:
-            with self.get_connection() as conn:
+            # No negative cache here: a user just created by another process must be able to log in
+            if self.shards.sharded:
+                # The username resolves through the directory; the password lives on the user's shard
+                user = self.user_cache.get(("username", username)) or self._fetch_user(username)
+                if not user:
+                    return None
+                shard, column, value = self.shards.shard_of_user(user["id"]), "id", user["id"]
+            else:
+                shard, column, value = 0, "username", username
+            with self.get_connection(shard=shard) as conn:
                 cursor = conn.cursor(dictionary=True)
                 cursor.execute(
-                    "SELECT id, username, created_at FROM p1_mb_users WHERE username = %s AND password = %s",
-                    (username, password)
+                    f"SELECT id, username, created_at FROM p1_mb_users WHERE {column} = %s AND password = %s",
+                    (value, password)
                 )
                 row = cursor.fetchone()
                 
                 if row:
+                    self._cache_user(row)
                     return row
                 return None
         except Exception as e:
             print(f"Error verifying login: {e}")
             return None
     
+    @instrumented("check_username_exists")
     def check_username_exists(self, username: str) -> bool:
-        """Check if username already exists"""
+        """Check if username already exists (cached, including "no" answers)"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT id FROM p1_mb_users WHERE username = %s", (username,))
-                return cursor.fetchone() is not None
+            return self._lookup_user(username) is not None
         except Exception as e:
             print(f"Error checking username: {e}")
             return False
     
+    @instrumented("create_user")
     def create_user(self, user_id: str, username: str):
         """Create a new user"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "INSERT INTO p1_mb_users (id, username, password) VALUES (%s, %s, '')",
-                    (user_id, username)
-                )
-                return {"id": user_id, "username": username}
+            self._insert_user(user_id, username, '')
+            self._invalidate_user(username, user_id)
+            return {"id": user_id, "username": username}
         except Exception as e:
             print(f"Error creating user: {e}")
             return None
     
+    @instrumented("create_session")
     def create_session(self, session_id: str, user_id: str):
         """Create a new session"""
         try:
-            with self.get_connection() as conn:
+            bucket = sharding.bucket_from_session_id(session_id)
+            if bucket is not None and bucket != sharding.user_bucket(user_id):
+                raise ValueError(f"session id {session_id} was issued for another user")
+            with self.get_connection(shard=self.shards.shard_of_user(user_id, write=True)) as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     "INSERT INTO p1_mb_sessions (id, user_id, completed) VALUES (%s, %s, 0)",
                     (session_id, user_id)
                 )
-                return {"id": session_id, "user_id": user_id}
+            self._invalidate_session(session_id, user_id)
+            return {"id": session_id, "user_id": user_id}
+        except ValueError as e:
+            print(f"Error creating session: {e}")
+            return None
         except Exception as e:
             print(f"Error creating session: {e}")
+            return self._queue_session(session_id, user_id)
+
+    def _queue_session(self, session_id: str, user_id: str):
+        """Hand a session the database could not create to the outbox, which creates it before
+        flushing its responses; None when the outbox is disabled or cannot be written"""
+        if self.outbox is None:
+            return None
+        try:
+            self.outbox.put_session(session_id, user_id)
+            return {"id": session_id, "user_id": user_id, "queued": True}
+        except Exception as e:
+            print(f"Error queueing session: {e}")
             return None
+
+    @instrumented("save_sessions")
+    def save_sessions(self, items: List[Dict]) -> Dict:
+        """Create queued sessions ({"session_id", "user_id"} dicts) that do not exist yet.
+
+        Returns the session ids that now exist ("saved") and "failed":
+        {session_id: error} for the rest.
+        """
+        result = {"saved": [], "failed": {}}
+        for item in items:
+            session_id, user_id = item["session_id"], item["user_id"]
+            try:
+                with self.get_connection(shard=self.shards.shard_of_user(user_id, write=True)) as conn:
+                    cursor = conn.cursor()
+                    cursor.execute("SELECT 1 FROM p1_mb_sessions WHERE id = %s", (session_id,))
+                    if cursor.fetchone() is None:
+                        cursor.execute("SELECT 1 FROM p1_mb_users WHERE id = %s", (user_id,))
+                        if cursor.fetchone() is None:
+                            result["failed"][session_id] = f"user {user_id} not found"
+                            continue
+                        cursor.execute(
+                            "INSERT INTO p1_mb_sessions (id, user_id, completed) VALUES (%s, %s, 0)",
+                            (session_id, user_id)
+                        )
+                self._invalidate_session(session_id, user_id)
+                result["saved"].append(session_id)
+            except Exception as e:
+                print(f"Error saving queued session: {e}")
+                result["failed"][session_id] = str(e)
+        return result
         
+    @instrumented("delete_session")
     def delete_session(self, session_id: str) -> bool:
         """Delete a session and all its associated data"""
         try:
-            with self.get_connection() as conn:
+            with self.get_connection(shard=self.shards.shard_of_session(session_id, write=True)) as conn:
                 cursor = conn.cursor()
+                cursor.execute("SELECT user_id FROM p1_mb_sessions WHERE id = %s", (session_id,))
+                row = cursor.fetchone()
                 # Foreign key constraints will handle cascading deletes
                 cursor.execute("DELETE FROM p1_mb_sessions WHERE id = %s", (session_id,))
-                return True
+            self._invalidate_session(session_id, row[0] if row else None)
+            return True
         except Exception as e:
             print(f"Error deleting session: {e}")
             return False
 
     
+    @instrumented("save_character_response")
     def save_character_response(self, session_id: str, character_id: int, 
                                 character_name: str, read_passage: bool,
                                 responses: List[Any], analysis: Dict):
         """Save character assessment response"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor(dictionary=True)
-                
-                # Insert character response (convert bool to int, JSON to string)
-                cursor.execute("""
-                    INSERT INTO p1_mb_character_responses 
-                    (session_id, character_id, character_name, read_passage, responses, analysis)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                """, (
+            shard = self.shards.shard_of_session(session_id, write=True)
+            deltas = rating_histograms.histogram_rows(character_id, analysis)
+            with self.get_connection(shard=shard) as conn:
+                # Insert character response (convert bool to int, JSON to string or compact blob)
+                conn.prepared(INSERT_CHARACTER_RESPONSE_SQL).execute(INSERT_CHARACTER_RESPONSE_SQL, (
                     session_id, 
                     character_id, 
                     character_name, 
                     int(read_passage),
-                    json.dumps(responses),
-                    json.dumps(analysis)
+                    *encode_fields(responses, analysis, self.blob_format)
                 ))
                 
-                # Update session completed count
+                # Update session completed count and summary atomically in the same transaction
+                cursor = conn.cursor(dictionary=True)
                 cursor.execute(
-                    "SELECT completed FROM p1_mb_sessions WHERE id = %s",
+                    "UPDATE p1_mb_sessions SET completed = completed + 1 WHERE id = %s",
                     (session_id,)
                 )
+                cursor.execute(
+                    summary_upsert_sql(self.dialect),
+                    summary_params(session_id, character_id, character_name, analysis)
+                )
+                cursor.execute("SELECT user_id FROM p1_mb_sessions WHERE id = %s", (session_id,))
                 row = cursor.fetchone()
-                
+                # Per-user trend rollups, one row per rated metric, and searchable answers
                 if row:
-                    current_completed = row["completed"]
-                    cursor.execute(
-                        "UPDATE p1_mb_sessions SET completed = %s WHERE id = %s",
-                        (current_completed + 1, session_id)
+                    cursor.executemany(
+                        trend_upsert_sql(self.dialect),
+                        trend_params(row["user_id"], session_id, character_id, character_name, analysis)
                     )
-                
-                return {"session_id": session_id, "character_id": character_id}
+                    cursor.executemany(
+                        answer_search.SEARCH_INSERT_SQL,
+                        answer_search.search_params(row["user_id"], session_id, character_id,
+                                                    character_name, responses)
+                    )
+                # Population histograms: append-only deltas, folded in by maybe_compact
+                if shard == 0:
+                    cursor.executemany(rating_histograms.DELTA_INSERT_SQL, deltas)
+            
+            if shard != 0:
+                # Histograms are global and live on shard 0
+                with self.get_connection() as conn:
+                    conn.cursor().executemany(rating_histograms.DELTA_INSERT_SQL, deltas)
+            rating_histograms.maybe_compact(self, self.histogram_compact_interval)
+            # Invalidate only after commit so a concurrent reader can't re-cache old rows
+            self._invalidate_session(session_id, row["user_id"] if row else None)
+            return {"session_id": session_id, "character_id": character_id}
         except Exception as e:
             print(f"Error saving character response: {e}")
             return None
     
-    def get_session_responses(self, session_id: str) -> List[Dict]:
-        """Get all responses for a session"""
+    @instrumented("queue_character_response")
+    def queue_character_response(self, session_id: str, character_id: int,
+                                 character_name: str, read_passage: bool,
+                                 responses: List[Any], analysis: Dict):
+        """Commit a response to the local outbox and return; it is saved in the background.
+
+        Falls back to save_character_response when the outbox is disabled or
+        cannot be written.
+        """
+        if self.outbox is not None:
+            try:
+                self.outbox.put(session_id, character_id, character_name, read_passage,
+                                responses, analysis)
+                return {"session_id": session_id, "character_id": character_id, "queued": True}
+            except Exception as e:
+                print(f"Error queueing character response, saving directly: {e}")
+        return self.save_character_response(session_id, character_id, character_name,
+                                            read_passage, responses, analysis)
+
+    @instrumented("save_character_responses")
+    def save_character_responses(self, items: List[Dict]) -> Dict:
+        """Save a batch of responses, at most one per (session_id, character_id).
+
+        `items` are dicts of save_character_response's arguments. Each shard
+        is written in one transaction. Returns the (session_id, character_id)
+        keys that were "saved", that were already stored ("skipped"), whose
+        session no longer exists ("missing"), and "failed": {key: error} for
+        shards that could not be written.
+        """
+        result = {"saved": [], "skipped": [], "missing": [], "failed": {}}
+        by_shard: Dict[int, List[Dict]] = {}
+        for item in items:
+            try:
+                shard = self.shards.shard_of_session(item["session_id"], write=True)
+            except Exception as e:
+                result["failed"][(item["session_id"], item["character_id"])] = str(e)
+                continue
+            by_shard.setdefault(shard, []).append(item)
+
+        for shard, shard_items in by_shard.items():
+            try:
+                saved, skipped, missing = self._save_shard_responses(shard, shard_items)
+            except Exception as e:
+                print(f"Error saving character responses: {e}")
+                for item in shard_items:
+                    result["failed"][(item["session_id"], item["character_id"])] = str(e)
+                continue
+            result["saved"] += saved
+            result["skipped"] += skipped
+            result["missing"] += missing
+        return result
+
+    def _save_shard_responses(self, shard: int, items: List[Dict]):
+        session_ids = sorted({item["session_id"] for item in items})
+        marks = ", ".join(["%s"] * len(session_ids))
+        dialect = self.shards.backends[shard].dialect
+        saved, skipped, missing, deltas = [], [], [], []
+        with self.get_connection(shard=shard) as conn:
+            cursor = conn.cursor()
+            # Lock the sessions first, so two flushers can't both insert the same key
+            if dialect == "sqlite":
+                cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(
+                f"SELECT id, user_id FROM p1_mb_sessions WHERE id IN ({marks})"
+                + (" FOR UPDATE" if dialect == "mysql" else ""),
+                session_ids
+            )
+            owners = {session_id: user_id for session_id, user_id in cursor.fetchall()}
+            cursor.execute(STORED_KEYS_SQL.format(marks=marks), session_ids)
+            stored = {(session_id, character_id) for session_id, character_id in cursor.fetchall()}
+
+            rows, completed = [], Counter()
+            for item in items:
+                key = (item["session_id"], item["character_id"])
+                if item["session_id"] not in owners:
+                    missing.append(key)
+                    continue
+                if key in stored:
+                    skipped.append(key)
+                    continue
+                stored.add(key)
+                saved.append(key)
+                rows.append((
+                    item["session_id"],
+                    item["character_id"],
+                    item["character_name"],
+                    int(item["read_passage"]),
+                    *encode_fields(item["responses"], item["analysis"], self.blob_format)
+                ))
+                completed[item["session_id"]] += 1
+                cursor.execute(
+                    summary_upsert_sql(dialect),
+                    summary_params(item["session_id"], item["character_id"],
+                                   item["character_name"], item["analysis"])
+                )
+                cursor.executemany(
+                    trend_upsert_sql(dialect),
+                    trend_params(owners[item["session_id"]], item["session_id"], item["character_id"],
+                                 item["character_name"], item["analysis"])
+                )
+                cursor.executemany(
+                    answer_search.SEARCH_INSERT_SQL,
+                    answer_search.search_params(owners[item["session_id"]], item["session_id"],
+                                                item["character_id"], item["character_name"],
+                                                item["responses"])
+                )
+                deltas += rating_histograms.histogram_rows(item["character_id"], item["analysis"])
+
+            if rows:
+                cursor.executemany(INSERT_CHARACTER_RESPONSE_SQL, rows)
+                cursor.executemany(
+                    "UPDATE p1_mb_sessions SET completed = completed + %s WHERE id = %s",
+                    [(count, session_id) for session_id, count in completed.items()]
+                )
+                if shard == 0:
+                    cursor.executemany(rating_histograms.DELTA_INSERT_SQL, deltas)
+
+        if deltas and shard != 0:
+            # The responses are committed; a lost histogram delta is repaired by a rebuild
+            try:
+                with self.get_connection() as conn:
+                    conn.cursor().executemany(rating_histograms.DELTA_INSERT_SQL, deltas)
+            except Exception as e:
+                print(f"Error saving rating histogram deltas: {e}")
+        if saved:
+            rating_histograms.maybe_compact(self, self.histogram_compact_interval)
+        for session_id in completed:
+            self._invalidate_session(session_id, owners[session_id])
+        return saved, skipped, missing
+
+    @instrumented("bulk_import")
+    def bulk_import(self, records, chunk_size: int = 1000) -> Dict:
+        """Bulk-insert historical sessions in chunked transactions (see utils/bulk_import.py)"""
+        return bulk_import.bulk_import(self, records, chunk_size=chunk_size)
+    
+    @instrumented("search_answers")
+    def search_answers(self, query: str, character_id: int = None, page: int = 1,
+                       page_size: int = 20) -> Dict:
+        """Ranked, paginated full-text search over answers (see utils/answer_search.py)"""
+        try:
+            return answer_search.search(self, query, character_id, page, page_size)
+        except Exception as e:
+            print(f"Error searching answers: {e}")
+            return {"results": [], "total": 0, "participants": 0, "page": page,
+                    "page_size": page_size, "pages": 0}
+    
+    @instrumented("register_characters")
+    def register_characters(self, characters: List[Dict]) -> bool:
+        """Record the character catalogue ({"id", "character"} dicts) in p1_mb_characters.
+
+        Writes shard 0 once per process for a given catalogue; later calls
+        with the same characters return at once.
+        """
         try:
+            rows = tuple(sorted((c['id'], c['character']) for c in characters))
+            if (self.key, rows) in _registered_characters:
+                return True
+            if self.backend.dialect == "sqlite":
+                upsert = "ON CONFLICT(id) DO UPDATE SET name = excluded.name"
+            else:
+                upsert = "ON DUPLICATE KEY UPDATE name = VALUES(name)"
             with self.get_connection() as conn:
-                cursor = conn.cursor(dictionary=True)
-                cursor.execute("""
-                    SELECT character_id, character_name, read_passage, responses, analysis, created_at
-                    FROM p1_mb_character_responses
-                    WHERE session_id = %s
-                    ORDER BY created_at
-                """, (session_id,))
-                
-                rows = cursor.fetchall()
-                return [
-                    {
-                        "character_id": row["character_id"],
-                        "character_name": row["character_name"],
-                        "read_passage": bool(row["read_passage"]),
-                        "responses": json.loads(row["responses"]),
-                        "analysis": json.loads(row["analysis"]),
-                        "created_at": row["created_at"]
-                    }
-                    for row in rows
-                ]
+                cursor = conn.cursor()
+                cursor.executemany(
+                    f"INSERT INTO p1_mb_characters (id, name) VALUES (%s, %s) {upsert}",
+                    rows
+                )
+            _registered_characters.add((self.key, rows))
+            self.cache.invalidate(("characters",))
+            return True
+        except Exception as e:
+            print(f"Error registering characters: {e}")
+            return False
+
+    @instrumented("get_characters")
+    def _load_characters(self) -> Dict[int, str]:
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, name FROM p1_mb_characters ORDER BY id")
+            return {character_id: name for character_id, name in cursor.fetchall()}
+
+    def get_characters(self) -> Dict[int, str]:
+        """{character_id: name} from the character catalogue (cached)"""
+        try:
+            return self.cache.get_or_load(("characters",), self._load_characters)
+        except Exception as e:
+            print(f"Error getting characters: {e}")
+            return {}
+
+    @instrumented("run_retention")
+    def run_retention(self, archive_after_days: float = 365, abandoned_after_hours: float = 24,
+                      to: str = "table", chunk_size: int = 500) -> Dict:
+        """Archive inactive sessions and purge abandoned ones (see utils/retention.py)"""
+        return retention.run(self, archive_after_days, abandoned_after_hours,
+                             to=to, chunk_size=chunk_size)
+    
+    @instrumented("get_session_responses")
+    def _load_session_responses(self, session_id: str) -> List[Dict]:
+        shard = self.shards.shard_of_session(session_id)
+        with self.get_read_connection(session_id, shard=shard) as conn:
+            cursor = conn.prepared(SELECT_SESSION_RESPONSES_SQL, dictionary=True)
+            cursor.execute(SELECT_SESSION_RESPONSES_SQL, (session_id,))
+            
+            # Documents are decoded on first access (utils/response_rows.py)
+            return [ResponseRow.from_row(row) for row in cursor.fetchall()]
+    
+    def get_session_responses(self, session_id: str) -> List[Dict]:
+        """Get all responses for a session, plus any still in the outbox (cached; treat as read-only)"""
+        try:
+            # Read the outbox first: a row flushed in between is then found in the database
+            pending = self.outbox.pending(session_id) if self.outbox is not None else []
+            rows = self.cache.get_or_load(
+                ("responses", session_id),
+                lambda: self._load_session_responses(session_id)
+            )
+            return outbox.merge_pending(rows, pending)
         except Exception as e:
             print(f"Error getting session responses: {e}")
             return []
     
+    def iter_responses(self, since=None, fetch_size: int = 1000,
+                       created_from=None) -> Iterator[Dict]:
+        """Stream every character response in id order.
+
+        Uses an unbuffered (server-side) cursor, so memory stays constant
+        regardless of table size; the pooled connection is held until the
+        iterator is exhausted or closed. `since` is a watermark as returned
+        in each row's "watermark": a tuple with the last streamed response id
+        of each shard (ids are per shard); only rows with larger ids are
+        returned. Ids are assigned on insert, so rows added later with older
+        created_at values (bulk imports, shard moves) are still picked up.
+        `created_from` additionally limits the stream to rows created at or
+        after that timestamp. With several shards, the shards' streams are
+        merged in (created_at, shard, id) order.
+        """
+        shard_count = len(self.shards.backends)
+        last_ids = list(since or ())
+        # Shards added since the watermark was taken start from the beginning
+        last_ids += [0] * (shard_count - len(last_ids))
+        if not self.shards.sharded:
+            for row in self._iter_shard_responses(0, last_ids[0], created_from, fetch_size):
+                del row["shard"]
+                last_ids[0] = row["id"]
+                row["watermark"] = tuple(last_ids)
+                yield row
+            return
+        streams = [self._iter_shard_responses(shard, last_ids[shard], created_from, fetch_size)
+                   for shard in range(shard_count)]
+        try:
+            for row in heapq.merge(
+                *streams, key=lambda row: (row["created_at"], row["shard"], row["id"])
+            ):
+                # Each shard streams in id order, so its last row carries its highest id
+                last_ids[row.pop("shard")] = row["id"]
+                row["watermark"] = tuple(last_ids)
+                yield row
+        finally:
+            for stream in streams:
+                stream.close()
+
+    def _iter_shard_responses(self, shard: int, last_id: int, created_from,
+                              fetch_size: int) -> Iterator[Dict]:
+        with self.get_read_connection(query="iter_responses", shard=shard) as conn:
+            cursor = conn.cursor(dictionary=True, buffered=False)
+            where, params = ["r.id > %s"], [last_id or 0]
+            if created_from:
+                where.append("r.created_at >= %s")
+                params.append(created_from)
+            cursor.execute(f"""
+                {RESPONSE_EXPORT_SELECT}
+                WHERE {" AND ".join(where)}
+                ORDER BY r.id
+            """, tuple(params))
+            finished = False
+            try:
+                while True:
+                    rows = cursor.fetchmany(fetch_size)
+                    if not rows:
+                        finished = True
+                        break
+                    for row in rows:
+                        yield {
+                            "id": row["id"],
+                            "session_id": row["session_id"],
+                            "user_id": row["user_id"],
+                            "character_id": row["character_id"],
+                            "character_name": row["character_name"],
+                            "read_passage": bool(row["read_passage"]),
+                            "responses": decode_field(row["responses"], row["responses_blob"]),
+                            "analysis": decode_field(row["analysis"], row["analysis_blob"]),
+                            "created_at": row["created_at"],
+                            "shard": shard
+                        }
+            finally:
+                if not finished:
+                    # Unread rows on an unbuffered cursor would break the next pooled query
+                    while cursor.fetchmany(fetch_size):
+                        pass
+    
+    @instrumented("get_user_sessions")
+    def _load_user_sessions(self, user_id: str) -> List[Dict]:
+        with self.get_read_connection(user_id, shard=self.shards.shard_of_user(user_id)) as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"""
+                {SESSION_PAGE_SELECT}
+                WHERE s.user_id = %s
+                ORDER BY s.created_at DESC, s.id DESC
+            """, (user_id,))
+            
+            rows = cursor.fetchall()
+            return [
+                {
+                    "id": row["id"],
+                    "created_at": row["created_at"],
+                    "completed": row["completed"],
+                    "avg_rating": row["avg_rating"],
+                    "best_character_name": row["best_character_name"],
+                    "last_activity": row["last_activity"]
+                }
+                for row in rows
+            ]
+    
     def get_user_sessions(self, user_id: str) -> List[Dict]:
-        """Get all sessions for a user"""
+        """Get all sessions for a user (cached; treat the result as read-only)"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor(dictionary=True)
-                cursor.execute("""
-                    SELECT id, created_at, completed
-                    FROM p1_mb_sessions
-                    WHERE user_id = %s
-                    ORDER BY created_at DESC
-                """, (user_id,))
-                
-                rows = cursor.fetchall()
-                return [
-                    {
-                        "id": row["id"],
-                        "created_at": row["created_at"],
-                        "completed": row["completed"]
-                    }
-                    for row in rows
-                ]
+            return self.cache.get_or_load(
+                ("user_sessions", user_id),
+                lambda: self._load_user_sessions(user_id),
+                tags=[("user", user_id)]
+            )
         except Exception as e:
             print(f"Error getting user sessions: {e}")
             return []
     
+    @instrumented("get_user_score_trend")
+    def _load_user_score_trend(self, user_id: str) -> List[Dict]:
+        with self.get_read_connection(user_id, shard=self.shards.shard_of_user(user_id)) as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(USER_SCORE_TREND_SQL, (user_id,))
+            return build_trend(cursor.fetchall())
+
+    def get_user_score_trend(self, user_id: str) -> List[Dict]:
+        """Overall, per-quality and per-character ratings of each of a user's sessions,
+        oldest first, from the trend rollups (cached; treat the result as read-only)"""
+        try:
+            return self.cache.get_or_load(
+                ("user_score_trend", user_id),
+                lambda: self._load_user_score_trend(user_id),
+                tags=[("user", user_id)]
+            )
+        except Exception as e:
+            print(f"Error getting user score trend: {e}")
+            return []
+
+    @instrumented("get_session_summary")
+    def _load_session_summary(self, session_id: str) -> Dict:
+        shard = self.shards.shard_of_session(session_id)
+        with self.get_read_connection(session_id, shard=shard) as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(SESSION_SUMMARY_SQL, (session_id,))
+            return cursor.fetchone()
+    
+    def get_session_summary(self, session_id: str) -> Dict:
+        """Get the materialized summary row for a session (None if nothing saved yet)"""
+        try:
+            return self.cache.get_or_load(
+                ("summary", session_id),
+                lambda: self._load_session_summary(session_id)
+            )
+        except Exception as e:
+            print(f"Error getting session summary: {e}")
+            return None
+    
+    @instrumented("get_sessions_metrics")
+    def _load_sessions_metrics(self, session_ids: List[str]) -> Dict[str, Dict]:
+        found: Dict[str, Dict] = {}
+        groups = self._group_by_shard(session_ids, self.shards.shard_of_session)
+        for shard, ids in groups.items():
+            for start in range(0, len(ids), BATCH_SIZE):
+                chunk = ids[start:start + BATCH_SIZE]
+                with self.get_read_connection(*chunk, shard=shard) as conn:
+                    found.update(session_metrics.load(conn.cursor(dictionary=True), chunk))
+        return found
+
+    def get_sessions_metrics(self, session_ids: List[str]) -> Dict[str, Dict]:
+        """Chart aggregates of many sessions, computed in SQL (see utils/session_metrics.py).
+
+        Returns {session_id: {"characters": {name: overall_rating},
+        "qualities": {label: mean}}} for the sessions with saved ratings,
+        with two queries per shard however many sessions are asked for.
+        """
+        try:
+            return self._load_sessions_metrics(session_ids)
+        except Exception as e:
+            print(f"Error getting sessions metrics: {e}")
+            return {}
+
+    def get_session_metrics(self, session_id: str) -> Dict:
+        """Chart aggregates of one session (empty until a rating is saved)"""
+        try:
+            return self.cache.get_or_load(
+                ("metrics", session_id),
+                lambda: self._load_sessions_metrics([session_id]).get(session_id, session_metrics.empty())
+            )
+        except Exception as e:
+            print(f"Error getting session metrics: {e}")
+            return session_metrics.empty()
+    
+    def _load_histograms(self, pairs) -> Dict:
+        with self.get_read_connection() as conn:
+            return rating_histograms.load_histograms(conn.cursor(), pairs)
+    
+    @instrumented("get_rating_percentiles")
+    def get_rating_percentiles(self, responses: List[Dict]) -> Dict[int, Dict[str, float]]:
+        """Population percentile of each response's overall and quality ratings.
+
+        Returns {character_id: {"overall_rating": pct, "quality_<name>": pct}}.
+        Histograms are cached per (character, metric) for DB_CACHE_TTL, so
+        this costs one query over the histogram buckets at most.
+        """
+        try:
+            wanted = {}
+            for response in responses:
+                character_id = response['character_id']
+                for _, metric, _ in rating_histograms.histogram_rows(character_id, response['analysis']):
+                    wanted[(character_id, metric)] = ("rating_histogram", character_id, metric)
+            
+            histograms = {}
+            missing = []
+            for pair, key in wanted.items():
+                histogram = self.cache.get(key)
+                if histogram is None:
+                    missing.append(pair)
+                else:
+                    histograms[pair] = histogram
+            if missing:
+                for pair, histogram in self._load_histograms(missing).items():
+                    self.cache.set(wanted[pair], histogram)
+                    histograms[pair] = histogram
+            
+            percentiles = {}
+            for response in responses:
+                character_id = response['character_id']
+                analysis = response['analysis']
+                ratings = {rating_histograms.OVERALL_METRIC: analysis.get('overall_rating')}
+                for name, value in (analysis.get('quality_ratings') or {}).items():
+                    ratings[rating_histograms.quality_column(name)] = value
+                for metric, value in ratings.items():
+                    histogram = histograms.get((character_id, metric))
+                    if histogram is None or not isinstance(value, (int, float)):
+                        continue
+                    pct = rating_histograms.percentile(histogram, value)
+                    if pct is not None:
+                        percentiles.setdefault(character_id, {})[metric] = pct
+            return percentiles
+        except Exception as e:
+            print(f"Error getting rating percentiles: {e}")
+            return {}
+    
+    @instrumented("get_session_info")
     def get_session_info(self, session_id: str) -> Dict:
         """Get session information with user details"""
         try:
-            with self.get_connection() as conn:
+            shard = self.shards.shard_of_session(session_id)
+            with self.get_read_connection(session_id, shard=shard) as conn:
                 cursor = conn.cursor(dictionary=True)
-                cursor.execute("""
-                    SELECT s.id, s.user_id, s.created_at, s.completed, u.username
-                    FROM p1_mb_sessions s
-                    JOIN p1_mb_users u ON s.user_id = u.id
-                    WHERE s.id = %s
-                """, (session_id,))
+                cursor.execute(SESSION_INFO_SQL, (session_id,))
                 
                 row = cursor.fetchone()
                 
@@ -330,34 +1157,204 @@ class Database:
             print(f"Error getting session info: {e}")
             return None
     
+    def _group_by_shard(self, keys: List[str], shard_of) -> Dict[int, List[str]]:
+        groups: Dict[int, List[str]] = {}
+        for key in dict.fromkeys(keys):
+            groups.setdefault(shard_of(key), []).append(key)
+        return groups
+
+    @instrumented("get_sessions_data")
+    def get_sessions_data(self, session_ids: List[str]) -> Dict[str, Dict]:
+        """Session info (with username), summary and responses for many sessions at once.
+
+        Returns {session_id: {"session_info", "summary", "responses"}} in the
+        order given, for the sessions that exist. Each shard involved is read
+        with two queries on one connection, whatever the number of sessions;
+        responses still in the outbox are merged in.
+        """
+        try:
+            found: Dict[str, Dict] = {}
+            groups = self._group_by_shard(session_ids, self.shards.shard_of_session)
+            for shard, ids in groups.items():
+                for start in range(0, len(ids), BATCH_SIZE):
+                    chunk = ids[start:start + BATCH_SIZE]
+                    marks = ", ".join(["%s"] * len(chunk))
+                    with self.get_read_connection(*chunk, shard=shard) as conn:
+                        cursor = conn.cursor(dictionary=True)
+                        cursor.execute(f"{BATCH_SESSION_INFO_SELECT} WHERE s.id IN ({marks})", chunk)
+                        for row in cursor.fetchall():
+                            found[row["id"]] = session_data_from_row(row)
+                        cursor.execute(
+                            f"{BATCH_RESPONSES_SELECT} WHERE session_id IN ({marks}) "
+                            "ORDER BY session_id, created_at, id",
+                            chunk
+                        )
+                        for row in cursor.fetchall():
+                            if row["session_id"] in found:
+                                found[row["session_id"]]["responses"].append(ResponseRow.from_row(row))
+
+            pending = self.outbox.pending_by_session(list(found)) if self.outbox is not None else {}
+            for session_id, rows in pending.items():
+                found[session_id]["responses"] = outbox.merge_pending(found[session_id]["responses"], rows)
+            return {session_id: found[session_id] for session_id in dict.fromkeys(session_ids)
+                    if session_id in found}
+        except Exception as e:
+            print(f"Error getting sessions data: {e}")
+            return {}
+
+    @instrumented("get_user_ids")
+    def get_user_ids(self, usernames: List[str]) -> Dict[str, str]:
+        """{username: user_id} for the usernames that exist, from the user cache or one query"""
+        try:
+            ids, missing = {}, []
+            for username in dict.fromkeys(usernames):
+                user = self.user_cache.get(("username", username))
+                if user is not None:
+                    ids[username] = user["id"]
+                elif not self.missing_user_cache.get(("username", username)):
+                    missing.append(username)
+            # The directory on shard 0 lists every user, sharded or not
+            for start in range(0, len(missing), BATCH_SIZE):
+                chunk = missing[start:start + BATCH_SIZE]
+                with self.get_read_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute(
+                        f"SELECT username, user_id FROM p1_mb_user_directory "
+                        f"WHERE username IN ({', '.join(['%s'] * len(chunk))})",
+                        chunk
+                    )
+                    ids.update({username: user_id for username, user_id in cursor.fetchall()})
+            return {username: ids[username] for username in dict.fromkeys(usernames) if username in ids}
+        except Exception as e:
+            print(f"Error getting user ids: {e}")
+            return {}
+
+    @instrumented("get_latest_sessions")
+    def get_latest_sessions(self, user_ids: List[str], limit: int = 5) -> Dict[str, List[Dict]]:
+        """Each user's `limit` most recent sessions with responses, newest first, one query per shard"""
+        try:
+            latest = {user_id: [] for user_id in dict.fromkeys(user_ids)}
+            groups = self._group_by_shard(list(latest), self.shards.shard_of_user)
+            for shard, ids in groups.items():
+                for start in range(0, len(ids), BATCH_SIZE):
+                    chunk = ids[start:start + BATCH_SIZE]
+                    with self.get_read_connection(*chunk, shard=shard) as conn:
+                        cursor = conn.cursor(dictionary=True)
+                        cursor.execute(
+                            LATEST_SESSIONS_SQL.format(marks=", ".join(["%s"] * len(chunk))), chunk
+                        )
+                        for row in cursor.fetchall():
+                            sessions = latest[row["user_id"]]
+                            if len(sessions) < limit:
+                                sessions.append({"id": row["id"], "created_at": row["created_at"],
+                                                 "completed": row["completed"]})
+            return latest
+        except Exception as e:
+            print(f"Error getting latest sessions: {e}")
+            return {}
+
+    @instrumented("get_user_by_username")
     def get_user_by_username(self, username: str) -> Dict:
-        """Get user by username"""
+        """Get user by username (cached; treat the result as read-only)"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor(dictionary=True)
-                cursor.execute(
-                    "SELECT id, username, created_at FROM p1_mb_users WHERE username = %s",
-                    (username,)
-                )
-                row = cursor.fetchone()
-                
-                if row:
-                    return row
-                return None
+            return self._lookup_user(username)
         except Exception as e:
             print(f"Error getting user by username: {e}")
             return None
     
+    @instrumented("get_user_by_id")
+    def get_user_by_id(self, user_id: str) -> Dict:
+        """Get user by id (cached; treat the result as read-only)"""
+        try:
+            user = self.user_cache.get(("id", user_id))
+            if user is not None:
+                return user
+            user = self._fetch_user_by_id(user_id)
+            if user:
+                self._cache_user(user)
+            return user
+        except Exception as e:
+            print(f"Error getting user by id: {e}")
+            return None
+    
+    def _get_user_id(self, username: str) -> str:
+        """Resolve a username to its id through the user cache"""
+        user = self.get_user_by_username(username)
+        return user['id'] if user else None
+    
+    @instrumented("list_user_sessions")
+    def _load_session_page(self, user_id: str, limit: int, cursor_key) -> Dict:
+        with self.get_read_connection(user_id, shard=self.shards.shard_of_user(user_id)) as conn:
+            cursor = conn.cursor(dictionary=True)
+            if cursor_key:
+                created_at, last_id = cursor_key
+                cursor.execute(f"""
+                    {SESSION_PAGE_SELECT}
+                    WHERE s.user_id = %s
+                      AND (s.created_at < %s OR (s.created_at = %s AND s.id < %s))
+                    ORDER BY s.created_at DESC, s.id DESC
+                    LIMIT %s
+                """, (user_id, created_at, created_at, last_id, limit + 1))
+            else:
+                cursor.execute(f"""
+                    {SESSION_PAGE_SELECT}
+                    WHERE s.user_id = %s
+                    ORDER BY s.created_at DESC, s.id DESC
+                    LIMIT %s
+                """, (user_id, limit + 1))
+            rows = cursor.fetchall()
+        
+        sessions = [
+            {
+                "id": row["id"],
+                "created_at": row["created_at"],
+                "completed": row["completed"],
+                "avg_rating": row["avg_rating"],
+                "best_character_name": row["best_character_name"],
+                "last_activity": row["last_activity"]
+            }
+            for row in rows[:limit]
+        ]
+        next_cursor = None
+        if len(rows) > limit:
+            last = sessions[-1]
+            # The stored value goes back unchanged: truncating it would skip or
+            # repeat sessions created within the same second
+            next_cursor = (last["created_at"], last["id"])
+        return {"sessions": sessions, "next_cursor": next_cursor}
+    
+    def list_user_sessions(self, username: str, limit: int = 10, cursor=None) -> Dict:
+        """Page through a user's sessions, newest first.
+
+        Keyset pagination on (created_at, id): pass the returned
+        `next_cursor` back as `cursor` to get the following page; it is None
+        on the last page. Each page is one indexed query that also returns
+        progress counts and summary columns.
+        """
+        try:
+            user_id = self._get_user_id(username)
+            if not user_id:
+                return {"sessions": [], "next_cursor": None}
+            cursor_key = tuple(cursor) if cursor else None
+            return self.cache.get_or_load(
+                ("session_page", user_id, limit, cursor_key),
+                lambda: self._load_session_page(user_id, limit, cursor_key),
+                tags=[("user", user_id)]
+            )
+        except Exception as e:
+            print(f"Error listing user sessions: {e}")
+            return {"sessions": [], "next_cursor": None}
+    
     def get_user_sessions_by_username(self, username: str) -> List[Dict]:
         """Get all sessions for a user by username"""
         try:
-            # First get user by username
-            user = self.get_user_by_username(username)
-            if not user:
+            # First get user id by username
+            user_id = self._get_user_id(username)
+            if not user_id:
                 return []
             
             # Then get all sessions for that user
-            return self.get_user_sessions(user['id'])
+            return self.get_user_sessions(user_id)
         except Exception as e:
             print(f"Error getting user sessions by username: {e}")
             return []
@@ -373,7 +1370,12 @@ class Database:
             
             # Create new user
             user_id = str(uuid.uuid4())
-            self.create_user(user_id, username)
+            if self.create_user(user_id, username) is None:
+                # Lost a race to another process (its "missing" answer may still be cached)
+                self._invalidate_user(username)
+                existing_user = self.get_user_by_username(username)
+                if existing_user:
+                    return existing_user['id']
             return user_id
             
         except Exception as e:
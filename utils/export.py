@@ -0,0 +1,206 @@
+# utils/export.py
+"""Streaming export of character responses for analytics.
+
+Rows are read through Database.iter_responses (an unbuffered cursor) and
+written as they arrive, so memory stays flat however large the table is.
+
+    python -m utils.export responses.jsonl
+    python -m utils.export responses.csv --format csv
+    python -m utils.export responses.parquet --format parquet --state export.state
+
+CSV and Parquet are flattened to one row per response with one
+`quality_<name>` column per quality rating. Quality names are free-form LLM
+output, so unless `--qualities` is given they are discovered with a first
+streaming pass over the same range. With `--state`, the export starts after
+the watermark stored by the previous run and records the new one on success.
+The watermark is the last exported response id of each shard, so rows bulk
+imported with older created_at values are still exported by the next run;
+state files from before this (a created_at watermark) trigger one full
+re-export. `--since "YYYY-MM-DD HH:MM:SS"` only exports rows created at or
+after that timestamp. `--format parquet` needs the pyarrow package
+(listed in requirements.txt).
+"""
+import argparse
+import csv
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from utils.rating_histograms import quality_column
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only needed for --format parquet
+    pa = None
+    pq = None
+
+
+FLAT_COLUMNS = [
+    "id", "session_id", "user_id", "character_id", "character_name",
+    "read_passage", "created_at", "overall_rating", "strength_count",
+    "improvement_count",
+]
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def flatten(row: Dict, qualities: List[str]) -> Dict[str, Any]:
+    """One flat record per response; missing qualities are None"""
+    analysis = row["analysis"] or {}
+    ratings = {
+        quality_column(name): value
+        for name, value in (analysis.get("quality_ratings") or {}).items()
+    }
+    flat = {
+        "id": row["id"],
+        "session_id": row["session_id"],
+        "user_id": row["user_id"],
+        "character_id": row["character_id"],
+        "character_name": row["character_name"],
+        "read_passage": row["read_passage"],
+        "created_at": row["created_at"],
+        "overall_rating": analysis.get("overall_rating"),
+        "strength_count": len(analysis.get("strengths") or []),
+        "improvement_count": len(analysis.get("areas_for_improvement") or []),
+    }
+    for column in qualities:
+        flat[column] = ratings.get(column)
+    return flat
+
+
+def discover_qualities(db, since=None, created_from: str = None) -> List[str]:
+    """Stream the export range once and collect every quality column name"""
+    columns = set()
+    for row in db.iter_responses(since, created_from=created_from):
+        for name in ((row["analysis"] or {}).get("quality_ratings") or {}):
+            columns.add(quality_column(name))
+    return sorted(columns)
+
+
+def write_jsonl(rows: Iterable[Dict], path: str) -> Tuple[int, Optional[Tuple]]:
+    count, watermark = 0, None
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            watermark = row.pop("watermark")
+            f.write(json.dumps(row, default=_json_default))
+            f.write("\n")
+            count += 1
+    return count, watermark
+
+
+def write_csv(rows: Iterable[Dict], path: str, qualities: List[str]) -> Tuple[int, Optional[Tuple]]:
+    count, watermark = 0, None
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FLAT_COLUMNS + qualities)
+        writer.writeheader()
+        for row in rows:
+            watermark = row["watermark"]
+            writer.writerow(flatten(row, qualities))
+            count += 1
+    return count, watermark
+
+
+def _parquet_schema(qualities: List[str]):
+    fields = [
+        ("id", pa.int64()), ("session_id", pa.string()), ("user_id", pa.string()),
+        ("character_id", pa.int64()), ("character_name", pa.string()),
+        ("read_passage", pa.bool_()), ("created_at", pa.timestamp("s")),
+        ("overall_rating", pa.float64()), ("strength_count", pa.int64()),
+        ("improvement_count", pa.int64()),
+    ]
+    fields += [(column, pa.float64()) for column in qualities]
+    return pa.schema(fields)
+
+
+def write_parquet(rows: Iterable[Dict], path: str, qualities: List[str],
+                  row_group_size: int = 10000) -> Tuple[int, Optional[Tuple]]:
+    """Write row groups of `row_group_size` rows, never holding more in memory"""
+    if pa is None:
+        raise RuntimeError("Parquet export needs the pyarrow package (see requirements.txt)")
+    schema = _parquet_schema(qualities)
+    count, watermark, batch = 0, None, []
+    with pq.ParquetWriter(path, schema) as writer:
+        for row in rows:
+            watermark = row["watermark"]
+            batch.append(flatten(row, qualities))
+            if len(batch) >= row_group_size:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                count += len(batch)
+                batch = []
+        if batch or count == 0:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            count += len(batch)
+    return count, watermark
+
+
+def load_watermark(state_path: str) -> Optional[Tuple]:
+    if not state_path or not os.path.exists(state_path):
+        return None
+    with open(state_path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    if "ids" not in state:
+        # A created_at watermark could have skipped backdated rows; start over once
+        print(f"{state_path} holds an old created_at watermark; exporting every row")
+        return None
+    return tuple(state["ids"])
+
+
+def save_watermark(state_path: str, watermark: Tuple):
+    """Atomically replace the state file so a crash never leaves it half-written"""
+    # Last exported response id per shard (ids are per shard)
+    state = {"ids": list(watermark)}
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_path)
+
+
+def export(db, path: str, fmt: str = "jsonl", since=None,
+           qualities: List[str] = None, created_from: str = None) -> Dict[str, Any]:
+    """Export responses after `since` to `path`; returns the row count and new watermark"""
+    if fmt == "jsonl":
+        count, watermark = write_jsonl(db.iter_responses(since, created_from=created_from), path)
+    else:
+        if qualities is None:
+            qualities = discover_qualities(db, since, created_from)
+        else:
+            qualities = [quality_column(name) for name in qualities]
+        rows = db.iter_responses(since, created_from=created_from)
+        if fmt == "csv":
+            count, watermark = write_csv(rows, path, qualities)
+        elif fmt == "parquet":
+            count, watermark = write_parquet(rows, path, qualities)
+        else:
+            raise ValueError(f"Unknown export format: {fmt!r}")
+    return {"rows": count, "watermark": watermark or since}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream character responses to JSONL, CSV or Parquet")
+    parser.add_argument("path", help="Output file")
+    parser.add_argument("--format", choices=["jsonl", "csv", "parquet"], default="jsonl",
+                        help="parquet needs the pyarrow package")
+    parser.add_argument("--since", help="Only rows created at or after this 'YYYY-MM-DD HH:MM:SS' timestamp")
+    parser.add_argument("--state", help="Watermark file read before and updated after the export")
+    parser.add_argument("--qualities", help="Comma-separated quality names (skips discovery pass)")
+    args = parser.parse_args()
+
+    since = load_watermark(args.state)
+    qualities = [q for q in args.qualities.split(",") if q.strip()] if args.qualities else None
+
+    from utils.database import Database
+    db = Database()
+    result = export(db, args.path, args.format, since, qualities, created_from=args.since)
+    if args.state and result["watermark"]:
+        save_watermark(args.state, result["watermark"])
+    print(f"Exported {result['rows']} rows to {args.path} (watermark {result['watermark']})")
+
+
+if __name__ == "__main__":
+    main()
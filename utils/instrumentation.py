@@ -0,0 +1,288 @@
+# utils/instrumentation.py
+"""Per-query timing for Database.
+
+Every Database method that touches the database runs under a query name
+(the `instrumented` decorator). Connections handed out by
+Database.get_connection are wrapped, so for each named query we record
+pool checkout ("connect"), statement execution ("execute"), result
+fetching ("fetch") and the whole call ("total") in fixed-bucket histograms,
+plus call, error and row counts.
+
+Statements slower than DB_SLOW_QUERY_MS are written as JSON lines to
+DB_SLOW_QUERY_LOG (stdout when unset) with parameter values replaced by
+their types. `Database.get_query_stats()` returns a snapshot and
+`Database.dump_query_stats(path)` writes one to a file.
+"""
+import contextvars
+import functools
+import json
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+PHASES = ("connect", "execute", "fetch", "total")
+
+_current_query = contextvars.ContextVar("current_query", default="other")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+class Histogram:
+    """Latency histogram over BUCKETS_MS (the last bucket is open-ended)"""
+
+    __slots__ = ("buckets", "count", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float):
+        index = len(BUCKETS_MS)
+        for i, bound in enumerate(BUCKETS_MS):
+            if ms <= bound:
+                index = i
+                break
+        self.buckets[index] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th percentile (capped at max)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                bound = BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max_ms
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms": round(self.percentile(0.50), 3),
+            "p95_ms": round(self.percentile(0.95), 3),
+            "p99_ms": round(self.percentile(0.99), 3),
+            "buckets": dict(zip([f"<={b}" for b in BUCKETS_MS] + ["inf"], self.buckets)),
+        }
+
+
+class _QueryStats:
+    __slots__ = ("calls", "errors", "rows", "phases")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.phases = {phase: Histogram() for phase in PHASES}
+
+
+def redact(params) -> List[str]:
+    """Replace parameter values with their type (and length for strings/bytes)"""
+    if params is None:
+        return []
+    if isinstance(params, dict):
+        params = list(params.values())
+    redacted = []
+    for value in params:
+        if isinstance(value, (str, bytes)):
+            redacted.append(f"<{type(value).__name__}:{len(value)}>")
+        else:
+            redacted.append(f"<{type(value).__name__}>")
+    return redacted
+
+
+class QueryMetrics:
+    """Thread-safe registry of per-query histograms and the slow-query log"""
+
+    def __init__(self, slow_query_ms: float = 250.0, slow_log_path: str = None):
+        self.slow_query_ms = slow_query_ms
+        self.slow_log_path = slow_log_path
+        self.started_at = datetime.now()
+        self.slow_queries = 0
+        self._queries: Dict[str, _QueryStats] = {}
+        self._lock = threading.Lock()
+
+    def _stats(self, name: str) -> _QueryStats:
+        stats = self._queries.get(name)
+        if stats is None:
+            stats = self._queries[name] = _QueryStats()
+        return stats
+
+    def observe(self, name: str, phase: str, ms: float, rows: int = 0):
+        with self._lock:
+            stats = self._stats(name)
+            stats.phases[phase].observe(ms)
+            stats.rows += rows
+            if phase == "total":
+                stats.calls += 1
+
+    def record_error(self, name: str):
+        with self._lock:
+            self._stats(name).errors += 1
+
+    def log_slow(self, name: str, sql: str, params, ms: float, many: bool = False):
+        if ms < self.slow_query_ms:
+            return
+        entry = {
+            "at": datetime.now().isoformat(timespec="milliseconds"),
+            "query": name,
+            "ms": round(ms, 3),
+            "sql": _WHITESPACE_RE.sub(" ", sql).strip()[:1000],
+            "params": f"<{len(params)} rows>" if many else redact(params),
+        }
+        line = json.dumps(entry)
+        with self._lock:
+            self.slow_queries += 1
+            if self.slow_log_path:
+                with open(self.slow_log_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+        if not self.slow_log_path:
+            print(f"Slow query: {line}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            queries = {
+                name: {
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "rows": stats.rows,
+                    "phases": {phase: h.snapshot() for phase, h in stats.phases.items() if h.count},
+                }
+                for name, stats in sorted(self._queries.items())
+            }
+            return {
+                "since": self.started_at.isoformat(timespec="seconds"),
+                "slow_query_ms": self.slow_query_ms,
+                "slow_queries": self.slow_queries,
+                "queries": queries,
+            }
+
+    def reset(self):
+        with self._lock:
+            self._queries.clear()
+            self.slow_queries = 0
+            self.started_at = datetime.now()
+
+
+class InstrumentedCursor:
+    """Cursor proxy timing execute and fetch calls for one named query"""
+
+    def __init__(self, cursor, metrics: QueryMetrics, name: str):
+        self._cursor = cursor
+        self._metrics = metrics
+        self._name = name
+
+    def _execute(self, method, sql, params, many):
+        started = time.perf_counter()
+        try:
+            result = method(sql, params)
+        except Exception:
+            self._metrics.record_error(self._name)
+            raise
+        ms = (time.perf_counter() - started) * 1000
+        self._metrics.observe(self._name, "execute", ms)
+        self._metrics.log_slow(self._name, sql, params, ms, many)
+        return result
+
+    def execute(self, sql: str, params=()):
+        return self._execute(self._cursor.execute, sql, params, many=False)
+
+    def executemany(self, sql: str, seq_of_params):
+        seq_of_params = list(seq_of_params)
+        return self._execute(self._cursor.executemany, sql, seq_of_params, many=True)
+
+    def _fetch(self, method, *args):
+        started = time.perf_counter()
+        try:
+            result = method(*args)
+        except Exception:
+            self._metrics.record_error(self._name)
+            raise
+        rows = 0 if result is None else (len(result) if isinstance(result, list) else 1)
+        self._metrics.observe(self._name, "fetch", (time.perf_counter() - started) * 1000, rows)
+        return result
+
+    def fetchone(self):
+        return self._fetch(self._cursor.fetchone)
+
+    def fetchmany(self, size: int = None):
+        return self._fetch(self._cursor.fetchmany, *([size] if size else []))
+
+    def fetchall(self):
+        return self._fetch(self._cursor.fetchall)
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def __getattr__(self, attr):
+        return getattr(self._cursor, attr)
+
+
+class InstrumentedConnection:
+    """Connection proxy whose cursors report to QueryMetrics under `name`"""
+
+    def __init__(self, conn, metrics: QueryMetrics, name: str):
+        self._conn = conn
+        self._metrics = metrics
+        self._name = name
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs), self._metrics, self._name)
+
+    def prepared(self, sql: str, dictionary: bool = False):
+        return InstrumentedCursor(self._conn.prepared(sql, dictionary), self._metrics, self._name)
+
+    def __getattr__(self, attr):
+        return getattr(self._conn, attr)
+
+
+def current_query() -> str:
+    return _current_query.get()
+
+
+def instrumented(name: str) -> Callable:
+    """Run a Database method under query `name` and time the whole call"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            token = _current_query.set(name)
+            started = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self.metrics.observe(name, "total", (time.perf_counter() - started) * 1000)
+                _current_query.reset(token)
+        return wrapper
+    return decorator
+
+
+_registries: Dict[Any, QueryMetrics] = {}
+_registries_lock = threading.Lock()
+
+
+def get_metrics(key, factory: Callable[[], QueryMetrics]) -> QueryMetrics:
+    """Return the process-wide metrics registry for `key`, creating it on first use"""
+    metrics = _registries.get(key)
+    if metrics is None:
+        with _registries_lock:
+            metrics = _registries.get(key)
+            if metrics is None:
+                metrics = factory()
+                _registries[key] = metrics
+    return metrics
@@ -0,0 +1,670 @@
+# utils/migrations.py
+"""Versioned schema migrations for the p1_mb_* tables.
+
+Each migration is a (version, description, function) entry in MIGRATIONS;
+the function receives a cursor and the backend dialect ("mysql" or
+"sqlite") and runs its DDL. Applied versions are recorded in
+p1_mb_schema_version. A migration never calls application code that may
+change later: its DDL and backfill are frozen copies of the logic as of that
+version, so an applied version always means the same thing. Only the blob
+decoder and the shard hash are shared, since stored rows and routing depend
+on them staying compatible. Every step is safe to re-run, as MySQL commits
+DDL implicitly and a migration that failed partway is retried from the
+start. Run from the project root:
+
+    python -m utils.migrations status
+    python -m utils.migrations upgrade [--target N]
+"""
+import argparse
+import json
+import threading
+from collections import Counter
+from typing import Callable, Dict, List, Tuple
+
+from utils.blob_codec import decode_field
+from utils.sharding import user_bucket
+
+
+SCHEMA_VERSION_TABLE = "p1_mb_schema_version"
+MIGRATION_LOCK_NAME = "p1_mb_migrations"
+MIGRATION_LOCK_TIMEOUT = 60
+
+
+def _create_index(cursor, dialect: str, name: str, table: str, columns: str):
+    """Create an index if missing (MySQL has no IF NOT EXISTS for indexes)"""
+    if dialect == "sqlite":
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table}({columns})")
+        return
+    try:
+        cursor.execute(f"CREATE INDEX {name} ON {table}({columns})")
+    except Exception as e:
+        if getattr(e, "errno", None) != 1061:  # ER_DUP_KEYNAME
+            raise
+
+
+def _drop_index(cursor, dialect: str, name: str, table: str):
+    """Drop an index if present"""
+    if dialect == "sqlite":
+        cursor.execute(f"DROP INDEX IF EXISTS {name}")
+        return
+    try:
+        cursor.execute(f"DROP INDEX {name} ON {table}")
+    except Exception as e:
+        if getattr(e, "errno", None) != 1091:  # ER_CANT_DROP_FIELD_OR_KEY
+            raise
+
+
+def _add_column(cursor, dialect: str, table: str, column: str, definition: str):
+    """Add a column if missing (neither backend has ADD COLUMN IF NOT EXISTS)"""
+    if dialect == "sqlite":
+        cursor.execute(f"PRAGMA table_info({table})")
+        exists = any(row[1] == column for row in cursor.fetchall())
+    else:
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+        """, (table, column))
+        exists = cursor.fetchone()[0] > 0
+    if not exists:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def _insert_ignore(dialect: str) -> str:
+    return "INSERT OR IGNORE" if dialect == "sqlite" else "INSERT IGNORE"
+
+
+def _session_batches(cursor, batch_size: int):
+    """Ids of the sessions with responses, `batch_size` at a time, with their placeholders"""
+    cursor.execute("SELECT DISTINCT session_id FROM p1_mb_character_responses")
+    session_ids = [row[0] for row in cursor.fetchall()]
+    for start in range(0, len(session_ids), batch_size):
+        batch = session_ids[start:start + batch_size]
+        yield batch, ", ".join(["%s"] * len(batch))
+
+
+def _quality_metric(name) -> str:
+    """Metric name of a quality rating, as of v7: "Team Work" -> quality_team_work"""
+    return "quality_" + "_".join(str(name).strip().lower().split())
+
+
+def _rating_metrics(analysis: Dict) -> List[Tuple[str, float]]:
+    """(metric, rating) of an analysis's overall and quality ratings, as of v7"""
+    ratings = []
+    if isinstance(analysis.get("overall_rating"), (int, float)):
+        ratings.append(("overall_rating", float(analysis["overall_rating"])))
+    for name, value in (analysis.get("quality_ratings") or {}).items():
+        if isinstance(value, (int, float)):
+            ratings.append((_quality_metric(name), float(value)))
+    return ratings
+
+
+def _auto_increment(dialect: str) -> str:
+    return "INTEGER PRIMARY KEY AUTOINCREMENT" if dialect == "sqlite" else "INT PRIMARY KEY AUTO_INCREMENT"
+
+
+def _v1_initial_schema(cursor, dialect):
+    # Users table with password
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS p1_mb_users (
+            id VARCHAR(36) PRIMARY KEY,
+            username VARCHAR(255) NOT NULL UNIQUE,
+            password VARCHAR(255) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Sessions table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS p1_mb_sessions (
+            id VARCHAR(36) PRIMARY KEY,
+            user_id VARCHAR(36) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            completed INT DEFAULT 0,
+            FOREIGN KEY (user_id) REFERENCES p1_mb_users(id) ON DELETE CASCADE
+        )
+    """)
+
+    # Character responses table
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS p1_mb_character_responses (
+            id {_auto_increment(dialect)},
+            session_id VARCHAR(36) NOT NULL,
+            character_id INT NOT NULL,
+            character_name VARCHAR(255) NOT NULL,
+            read_passage INT DEFAULT 0,
+            responses TEXT NOT NULL,
+            analysis TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (session_id) REFERENCES p1_mb_sessions(id) ON DELETE CASCADE
+        )
+    """)
+
+    _create_index(cursor, dialect, "idx_p1_mb_sessions_user_id", "p1_mb_sessions", "user_id")
+    _create_index(cursor, dialect, "idx_p1_mb_character_responses_session_id",
+                  "p1_mb_character_responses", "session_id")
+    _create_index(cursor, dialect, "idx_p1_mb_users_username", "p1_mb_users", "username")
+
+
+def _v2_session_summary(cursor, dialect):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS p1_mb_session_summary (
+            session_id VARCHAR(36) PRIMARY KEY,
+            completed INT NOT NULL DEFAULT 0,
+            rating_sum DOUBLE NOT NULL DEFAULT 0,
+            avg_rating DOUBLE NOT NULL DEFAULT 0,
+            best_character_id INT NULL,
+            best_character_name VARCHAR(255) NULL,
+            best_rating DOUBLE NULL,
+            strength_count INT NOT NULL DEFAULT 0,
+            last_activity TIMESTAMP NULL,
+            FOREIGN KEY (session_id) REFERENCES p1_mb_sessions(id) ON DELETE CASCADE
+        )
+    """)
+    # Backfill from existing responses; analyses are JSON text until v4
+    for batch, marks in _session_batches(cursor, 500):
+        cursor.execute(f"""
+            SELECT session_id, character_id, character_name, analysis, created_at
+            FROM p1_mb_character_responses
+            WHERE session_id IN ({marks})
+            ORDER BY session_id, created_at, id
+        """, batch)
+        summaries = {}
+        for session_id, character_id, character_name, analysis, created_at in cursor.fetchall():
+            analysis = json.loads(analysis)
+            rating = analysis.get('overall_rating')
+            rating = float(rating) if isinstance(rating, (int, float)) else 0.0
+            summary = summaries.setdefault(session_id, {
+                "completed": 0, "rating_sum": 0.0, "best": None, "strengths": 0, "last": None,
+            })
+            summary["completed"] += 1
+            summary["rating_sum"] += rating
+            summary["strengths"] += len(analysis.get('strengths', []) or [])
+            # Strict > keeps the first character on ties
+            if summary["best"] is None or rating > summary["best"][2]:
+                summary["best"] = (character_id, character_name, rating)
+            if summary["last"] is None or created_at > summary["last"]:
+                summary["last"] = created_at
+        if summaries:
+            cursor.executemany("""
+                REPLACE INTO p1_mb_session_summary
+                (session_id, completed, rating_sum, avg_rating, best_character_id,
+                 best_character_name, best_rating, strength_count, last_activity)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, [
+                (session_id, s["completed"], s["rating_sum"], s["rating_sum"] / s["completed"],
+                 *s["best"], s["strengths"], s["last"])
+                for session_id, s in summaries.items()
+            ])
+
+
+def _v3_session_keyset_index(cursor, dialect):
+    # Serves keyset pagination: WHERE user_id = ? ORDER BY created_at DESC, id DESC
+    _create_index(cursor, dialect, "idx_p1_mb_sessions_user_created",
+                  "p1_mb_sessions", "user_id, created_at, id")
+
+
+def _v4_compact_blob_columns(cursor, dialect):
+    # Nullable columns appended at the end: an instant, non-rewriting ALTER on
+    # MySQL 8 and SQLite. Existing rows stay as JSON text until
+    # `python -m utils.blob_codec migrate` converts them.
+    blob_type = "BLOB" if dialect == "sqlite" else "MEDIUMBLOB"
+    for column in ("responses_blob", "analysis_blob"):
+        _add_column(cursor, dialect, "p1_mb_character_responses", column, f"{blob_type} NULL")
+
+
+def _v5_response_export_index(cursor, dialect):
+    # Serves export ranges (created_at >= --since); incremental exports follow the id
+    _create_index(cursor, dialect, "idx_p1_mb_character_responses_created",
+                  "p1_mb_character_responses", "created_at, id")
+
+
+def _v6_archive_tables(cursor, dialect):
+    blob_type = "BLOB" if dialect == "sqlite" else "MEDIUMBLOB"
+    # Same columns as the hot tables, without foreign keys, plus when the row moved
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS p1_mb_sessions_archive (
+            id VARCHAR(36) PRIMARY KEY,
+            user_id VARCHAR(36) NOT NULL,
+            created_at TIMESTAMP NULL,
+            completed INT DEFAULT 0,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS p1_mb_character_responses_archive (
+            id INT PRIMARY KEY,
+            session_id VARCHAR(36) NOT NULL,
+            character_id INT NOT NULL,
+            character_name VARCHAR(255) NOT NULL,
+            read_passage INT DEFAULT 0,
+            responses TEXT NOT NULL,
+            analysis TEXT NOT NULL,
+            responses_blob {blob_type} NULL,
+            analysis_blob {blob_type} NULL,
+            created_at TIMESTAMP NULL,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    _create_index(cursor, dialect, "idx_p1_mb_sessions_archive_user_id",
+                  "p1_mb_sessions_archive", "user_id")
+    _create_index(cursor, dialect, "idx_p1_mb_character_responses_archive_session_id",
+                  "p1_mb_character_responses_archive", "session_id")
+    # Serves the abandoned-session purge: WHERE completed = 0 AND created_at < cutoff
+    _create_index(cursor, dialect, "idx_p1_mb_sessions_completed_created",
+                  "p1_mb_sessions", "completed, created_at")
+
+
+def _v7_rating_histograms(cursor, dialect):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS p1_mb_rating_histogram (
+            character_id INT NOT NULL,
+            metric VARCHAR(191) NOT NULL,
+            bucket INT NOT NULL,
+            count INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (character_id, metric, bucket)
+        )
+    """)
+    # Append-only increments from saves; folded into the table above by compaction
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS p1_mb_rating_histogram_delta (
+            id {_auto_increment(dialect)},
+            character_id INT NOT NULL,
+            metric VARCHAR(191) NOT NULL,
+            bucket INT NOT NULL
+        )
+    """)
+    _create_index(cursor, dialect, "idx_p1_mb_rating_histogram_delta_metric",
+                  "p1_mb_rating_histogram_delta", "character_id, metric, bucket")
+    # Backfill from existing responses: 10 buckets per rating point, 0-10
+    counts = Counter()
+    last_id = 0
+    while True:
+        cursor.execute("""
+            SELECT id, character_id, analysis, analysis_blob
+            FROM p1_mb_character_responses
+            WHERE id > %s
+            ORDER BY id
+            LIMIT 1000
+        """, (last_id,))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        for _, character_id, analysis, analysis_blob in rows:
+            for metric, rating in _rating_metrics(decode_field(analysis, analysis_blob)):
+                counts[(character_id, metric, int(round(min(max(rating, 0.0), 10.0) * 10)))] += 1
+        last_id = rows[-1][0]
+    cursor.execute("DELETE FROM p1_mb_rating_histogram_delta")
+    cursor.execute("DELETE FROM p1_mb_rating_histogram")
+    cursor.executemany(
+        "INSERT INTO p1_mb_rating_histogram (character_id, metric, bucket, count) VALUES (%s, %s, %s, %s)",
+        [key + (count,) for key, count in counts.items()]
+    )
+
+
+def _v8_shard_routing(cursor, dialect):
+    # Bucket of each user (utils/sharding.py), so a bucket can be copied between shards
+    _add_column(cursor, dialect, "p1_mb_users", "shard_bucket", "INT NULL")
+    _create_index(cursor, dialect, "idx_p1_mb_users_shard_bucket", "p1_mb_users", "shard_bucket")
+    # Global tables, used on shard 0 only
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS p1_mb_user_directory (
+            username VARCHAR(255) PRIMARY KEY,
+            user_id VARCHAR(36) NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS p1_mb_shard_map (
+            bucket INT PRIMARY KEY,
+            shard INT NOT NULL,
+            moving INT NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("SELECT id, username FROM p1_mb_users")
+    users = cursor.fetchall()
+    cursor.executemany("UPDATE p1_mb_users SET shard_bucket = %s WHERE id = %s",
+                       [(user_bucket(user_id), user_id) for user_id, _ in users])
+    cursor.executemany(f"{_insert_ignore(dialect)} INTO p1_mb_user_directory (username, user_id) VALUES (%s, %s)",
+                       [(username, user_id) for user_id, username in users])
+
+
+def _v9_user_score_trend(cursor, dialect):
+    # Leading user_id: a user's whole history is one primary-key range
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS p1_mb_user_score_trend (
+            user_id VARCHAR(36) NOT NULL,
+            session_id VARCHAR(36) NOT NULL,
+            character_id INT NOT NULL,
+            metric VARCHAR(191) NOT NULL,
+            character_name VARCHAR(255) NOT NULL,
+            rating_sum DOUBLE NOT NULL DEFAULT 0,
+            rating_count INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, session_id, character_id, metric),
+            FOREIGN KEY (session_id) REFERENCES p1_mb_sessions(id) ON DELETE CASCADE
+        )
+    """)
+    _create_index(cursor, dialect, "idx_p1_mb_user_score_trend_session",
+                  "p1_mb_user_score_trend", "session_id")
+    # Backfill from existing responses
+    for batch, marks in _session_batches(cursor, 500):
+        cursor.execute(f"""
+            SELECT s.user_id, r.session_id, r.character_id, r.character_name, r.analysis, r.analysis_blob
+            FROM p1_mb_character_responses r
+            JOIN p1_mb_sessions s ON s.id = r.session_id
+            WHERE r.session_id IN ({marks})
+        """, batch)
+        rollups: Dict[Tuple, List] = {}
+        for user_id, session_id, character_id, character_name, analysis, analysis_blob in cursor.fetchall():
+            for metric, rating in _rating_metrics(decode_field(analysis, analysis_blob)):
+                rollup = rollups.setdefault((user_id, session_id, character_id, metric),
+                                            [character_name, 0.0, 0])
+                rollup[1] += rating
+                rollup[2] += 1
+        cursor.execute(f"DELETE FROM p1_mb_user_score_trend WHERE session_id IN ({marks})", batch)
+        cursor.executemany("""
+            INSERT INTO p1_mb_user_score_trend
+            (user_id, session_id, character_id, metric, character_name, rating_sum, rating_count)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, [key + tuple(value) for key, value in rollups.items()])
+
+
+def _v10_answer_search(cursor, dialect):
+    # Side table with a FULLTEXT index (MySQL) or FTS5 table (SQLite), see utils/answer_search.py
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS p1_mb_answer_search (
+            id {_auto_increment(dialect)},
+            session_id VARCHAR(36) NOT NULL,
+            user_id VARCHAR(36) NOT NULL,
+            character_id INT NOT NULL,
+            character_name VARCHAR(255) NOT NULL,
+            question_no INT NOT NULL,
+            question TEXT NOT NULL,
+            answer TEXT NOT NULL,
+            FOREIGN KEY (session_id) REFERENCES p1_mb_sessions(id) ON DELETE CASCADE
+        )
+    """)
+    _create_index(cursor, dialect, "idx_p1_mb_answer_search_session", "p1_mb_answer_search", "session_id")
+    if dialect == "sqlite":
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS p1_mb_answer_search_fts
+            USING fts5(answer, content='p1_mb_answer_search', content_rowid='id')
+        """)
+        # Cascaded deletes fire these triggers too
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS p1_mb_answer_search_ai AFTER INSERT ON p1_mb_answer_search
+            BEGIN
+                INSERT INTO p1_mb_answer_search_fts (rowid, answer) VALUES (new.id, new.answer);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS p1_mb_answer_search_ad AFTER DELETE ON p1_mb_answer_search
+            BEGIN
+                INSERT INTO p1_mb_answer_search_fts (p1_mb_answer_search_fts, rowid, answer)
+                VALUES ('delete', old.id, old.answer);
+            END
+        """)
+    else:
+        try:
+            cursor.execute("CREATE FULLTEXT INDEX ft_p1_mb_answer_search_answer ON p1_mb_answer_search(answer)")
+        except Exception as e:
+            if getattr(e, "errno", None) != 1061:  # ER_DUP_KEYNAME
+                raise
+
+    # Backfill from existing responses: one row per non-empty text answer,
+    # numbered by its position in the response's answer list
+    for batch, marks in _session_batches(cursor, 200):
+        cursor.execute(f"""
+            SELECT s.user_id, r.session_id, r.character_id, r.character_name, r.responses, r.responses_blob
+            FROM p1_mb_character_responses r
+            JOIN p1_mb_sessions s ON s.id = r.session_id
+            WHERE r.session_id IN ({marks})
+            ORDER BY r.session_id, r.created_at, r.id
+        """, batch)
+        rows = []
+        for user_id, session_id, character_id, character_name, responses, responses_blob in cursor.fetchall():
+            for question_no, item in enumerate(decode_field(responses, responses_blob) or [], start=1):
+                answer = item.get("answer") if isinstance(item, dict) else None
+                if isinstance(answer, str) and answer.strip():
+                    rows.append((session_id, user_id, character_id, character_name, question_no,
+                                 str(item.get("question") or ""), answer))
+        cursor.execute(f"DELETE FROM p1_mb_answer_search WHERE session_id IN ({marks})", batch)
+        # Multi-row statements: on SQLite the FTS5 sync trigger costs far more per single-row statement
+        for offset in range(0, len(rows), 500):
+            values = rows[offset:offset + 500]
+            cursor.execute(f"""
+                INSERT INTO p1_mb_answer_search
+                (session_id, user_id, character_id, character_name, question_no, question, answer)
+                VALUES {", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(values))}
+            """, [value for row in values for value in row])
+
+
+def _v11_index_redesign(cursor, dialect):
+    # Character catalogue, global like the directory (shard 0); backfilled from
+    # stored responses and kept current by Database.register_characters
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS p1_mb_characters (
+            id INT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL
+        )
+    """)
+    cursor.execute(f"""
+        {_insert_ignore(dialect)} INTO p1_mb_characters (id, name)
+        SELECT character_id, MAX(character_name) FROM p1_mb_character_responses GROUP BY character_id
+    """)
+    # Serves get_session_responses and batch reads without a sort:
+    # WHERE session_id ... ORDER BY created_at, id
+    _create_index(cursor, dialect, "idx_p1_mb_character_responses_session_created",
+                  "p1_mb_character_responses", "session_id, created_at, id")
+    # Covers the outbox's stored-key check: SELECT session_id, character_id WHERE session_id IN (...)
+    _create_index(cursor, dialect, "idx_p1_mb_character_responses_session_character",
+                  "p1_mb_character_responses", "session_id, character_id")
+    # Prefixes of the indexes above, of idx_p1_mb_sessions_user_created and of
+    # UNIQUE(username); the foreign keys use the longer indexes
+    _drop_index(cursor, dialect, "idx_p1_mb_character_responses_session_id", "p1_mb_character_responses")
+    _drop_index(cursor, dialect, "idx_p1_mb_sessions_user_id", "p1_mb_sessions")
+    _drop_index(cursor, dialect, "idx_p1_mb_users_username", "p1_mb_users")
+
+
+def _v12_session_metrics_index(cursor, dialect):
+    # Serves the dashboard's chart aggregates (utils/session_metrics.py) without a sort:
+    # WHERE session_id IN (...) AND metric ... ORDER BY / GROUP BY session_id, metric | character_id
+    _create_index(cursor, dialect, "idx_p1_mb_user_score_trend_session_metric",
+                  "p1_mb_user_score_trend", "session_id, metric, character_id")
+    # A prefix of the index above, which the foreign key uses instead
+    _drop_index(cursor, dialect, "idx_p1_mb_user_score_trend_session", "p1_mb_user_score_trend")
+
+
+def _v13_score_trend_labels(cursor, dialect):
+    # Quality names as the analyses wrote them, so chart labels match the stored names
+    _add_column(cursor, dialect, "p1_mb_user_score_trend", "label", "VARCHAR(255) NULL")
+    for batch, marks in _session_batches(cursor, 500):
+        cursor.execute(f"""
+            SELECT session_id, character_id, analysis, analysis_blob
+            FROM p1_mb_character_responses
+            WHERE session_id IN ({marks})
+        """, batch)
+        labels: Dict[Tuple, str] = {}
+        for session_id, character_id, analysis, analysis_blob in cursor.fetchall():
+            for name in (decode_field(analysis, analysis_blob).get("quality_ratings") or {}):
+                labels.setdefault((session_id, character_id, _quality_metric(name)), name)
+        cursor.executemany("""
+            UPDATE p1_mb_user_score_trend SET label = %s
+            WHERE session_id = %s AND character_id = %s AND metric = %s
+        """, [(label,) + key for key, label in labels.items()])
+
+
+def _v14_session_created_index(cursor, dialect):
+    # Serves the retention job's archive scan without a sort:
+    # WHERE created_at < cutoff AND (created_at, id) > keyset ORDER BY created_at, id
+    _create_index(cursor, dialect, "idx_p1_mb_sessions_created",
+                  "p1_mb_sessions", "created_at, id")
+
+
+# Ordered list of migrations. Append new entries; never edit an applied one.
+MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, "initial schema", _v1_initial_schema),
+    (2, "materialized session summary", _v2_session_summary),
+    (3, "session keyset pagination index", _v3_session_keyset_index),
+    (4, "compact response blob columns", _v4_compact_blob_columns),
+    (5, "response export watermark index", _v5_response_export_index),
+    (6, "archive tables and abandoned-session index", _v6_archive_tables),
+    (7, "rating histograms", _v7_rating_histograms),
+    (8, "shard routing", _v8_shard_routing),
+    (9, "per-user score trend rollups", _v9_user_score_trend),
+    (10, "answer full-text search", _v10_answer_search),
+    (11, "character catalogue and response index redesign", _v11_index_redesign),
+    (12, "session metrics index", _v12_session_metrics_index),
+    (13, "score trend quality labels", _v13_score_trend_labels),
+    (14, "session created_at index", _v14_session_created_index),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+_checked = set()
+_checked_lock = threading.Lock()
+
+
+def _ensure_version_table(cursor):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SCHEMA_VERSION_TABLE} (
+            version INT PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def _acquire_lock(cursor, dialect: str):
+    if dialect == "sqlite":
+        cursor.execute("BEGIN IMMEDIATE")
+        return
+    cursor.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK_NAME, MIGRATION_LOCK_TIMEOUT))
+    if cursor.fetchone()[0] != 1:
+        raise RuntimeError("Timed out waiting for the schema migration lock")
+
+
+def _release_lock(cursor, dialect: str):
+    # The SQLite write lock ends with the transaction when the connection commits
+    if dialect == "mysql":
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK_NAME,))
+        cursor.fetchall()
+
+
+def get_current_version(db) -> int:
+    """Highest applied migration version, 0 for an unmigrated database"""
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"SELECT MAX(version) FROM {SCHEMA_VERSION_TABLE}")
+        except Exception as e:
+            if db.backend.is_missing_table_error(e):
+                return 0
+            raise
+        row = cursor.fetchone()
+        return row[0] or 0
+
+
+def get_pending(db) -> List[Tuple[int, str, Callable]]:
+    """Migrations not yet applied to this database"""
+    current = get_current_version(db)
+    return [m for m in MIGRATIONS if m[0] > current]
+
+
+def upgrade(db, target: int = None) -> List[int]:
+    """Apply pending migrations up to `target` (default: latest).
+
+    Concurrent upgraders are serialised (a named lock on MySQL, a write
+    transaction on SQLite), so several app processes starting at once apply
+    each migration exactly once.
+    """
+    target = LATEST_VERSION if target is None else target
+    dialect = db.backend.dialect
+    applied = []
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        _acquire_lock(cursor, dialect)
+        try:
+            _ensure_version_table(cursor)
+            cursor.execute(f"SELECT version FROM {SCHEMA_VERSION_TABLE}")
+            done = {row[0] for row in cursor.fetchall()}
+
+            for version, description, migrate in MIGRATIONS:
+                if version in done or version > target:
+                    continue
+                migrate(cursor, dialect)
+                cursor.execute(
+                    f"INSERT INTO {SCHEMA_VERSION_TABLE} (version, description) VALUES (%s, %s)",
+                    (version, description)
+                )
+                if dialect == "mysql":
+                    # MySQL DDL commits implicitly; SQLite keeps the whole upgrade in one transaction
+                    conn.commit()
+                applied.append(version)
+                print(f"Applied migration {version}: {description}")
+        finally:
+            _release_lock(cursor, dialect)
+    return applied
+
+
+class BackendView:
+    """A storage backend on its own, for callers without a Database (AsyncDatabase)"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.dialect = backend.dialect
+        self.key = backend.key
+
+    def get_connection(self, query: str = None):
+        return self.backend.connection()
+
+
+def ensure_schema(db, auto_apply: bool = True):
+    """Check the schema version once per process per database.
+
+    Subsequent Database() constructions for the same database return
+    immediately without touching the server.
+    """
+    key = db.key
+    if key in _checked:
+        return
+    with _checked_lock:
+        if key in _checked:
+            return
+        if get_current_version(db) < LATEST_VERSION:
+            if not auto_apply:
+                raise RuntimeError(
+                    "Database schema is out of date; run `python -m utils.migrations upgrade`"
+                )
+            upgrade(db)
+        _checked.add(key)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage p1_mb_* schema migrations")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("status", help="Show applied and pending migrations")
+    upgrade_parser = subparsers.add_parser("upgrade", help="Apply pending migrations")
+    upgrade_parser.add_argument("--target", type=int, default=None,
+                                help="Stop after this version (default: latest)")
+    args = parser.parse_args()
+
+    from utils.database import Database
+    views = Database(migrate=False).shard_views()
+
+    # Every shard carries the full schema
+    for view in views:
+        if len(views) > 1:
+            print(f"Shard {view.shard}:")
+        if args.command == "status":
+            current = get_current_version(view)
+            print(f"Current schema version: {current} (latest {LATEST_VERSION})")
+            for version, description, _ in MIGRATIONS:
+                state = "applied" if version <= current else "pending"
+                print(f"  {version:>4}  {state:<8} {description}")
+        elif args.command == "upgrade":
+            applied = upgrade(view, args.target)
+            if not applied:
+                print("Schema already up to date")
+
+
+if __name__ == "__main__":
+    main()
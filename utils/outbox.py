@@ -0,0 +1,403 @@
+# utils/outbox.py
+"""Durable local outbox for character responses.
+
+submit_responses hands each analysed response to
+Database.queue_character_response, which commits it to a local SQLite file
+(RESPONSE_OUTBOX_PATH) and returns at once. A background thread drains the
+outbox into the database, up to RESPONSE_OUTBOX_BATCH_SIZE rows per call to
+Database.save_character_responses. Rows of a batch that fails are retried
+one at a time, each with its own exponential backoff capped at
+RESPONSE_OUTBOX_MAX_RETRY_DELAY seconds, so a slow or unavailable database
+neither delays the user nor loses the result, and one row the database
+keeps rejecting does not hold back the rows queued with it. After
+RESPONSE_OUTBOX_MAX_ATTEMPTS failed attempts a row is moved to the
+outbox_dead table, where `requeue` can put it back once the cause is fixed.
+
+(session_id, character_id) is the idempotency key at both ends: the outbox
+keeps the first result queued for a key, and save_character_responses skips
+keys that are already stored. Reruns and retried batches therefore never
+write a response twice. Until a response is flushed, get_session_responses
+merges it in from the outbox of the same process.
+
+Sessions that Database.create_session could not write are queued too, and
+each flush creates them before writing responses. A response whose session
+does not exist yet stays queued and is retried with the same backoff rather
+than dropped, so results survive the database being down when the session
+starts.
+
+The file uses WAL with synchronous=NORMAL by default, which survives a crash
+of the app process; RESPONSE_OUTBOX_SYNCHRONOUS=FULL also survives power
+loss, at the cost of an fsync per response. Rows left over from a previous
+run are flushed as soon as the outbox is opened again.
+
+    python -m utils.outbox status
+    python -m utils.outbox flush    # drain now, e.g. before retiring a host
+    python -m utils.outbox requeue  # retry dead-lettered rows
+"""
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.response_rows import ResponseRow
+
+
+SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS outbox (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT NOT NULL,
+        character_id INTEGER NOT NULL,
+        character_name TEXT NOT NULL,
+        read_passage INTEGER NOT NULL,
+        responses TEXT NOT NULL,
+        analysis TEXT NOT NULL,
+        queued_at REAL NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL DEFAULT 0,
+        last_error TEXT,
+        UNIQUE (session_id, character_id)
+    )
+"""
+
+DEAD_SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS outbox_dead (
+        seq INTEGER PRIMARY KEY,
+        session_id TEXT NOT NULL,
+        character_id INTEGER NOT NULL,
+        character_name TEXT NOT NULL,
+        read_passage INTEGER NOT NULL,
+        responses TEXT NOT NULL,
+        analysis TEXT NOT NULL,
+        queued_at REAL NOT NULL,
+        attempts INTEGER NOT NULL,
+        last_error TEXT,
+        dead_at REAL NOT NULL
+    )
+"""
+
+INSERT_SQL = """
+    INSERT INTO outbox (session_id, character_id, character_name, read_passage,
+                        responses, analysis, queued_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(session_id, character_id) DO NOTHING
+"""
+
+SESSION_SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS outbox_sessions (
+        session_id TEXT PRIMARY KEY,
+        user_id TEXT NOT NULL,
+        queued_at REAL NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL DEFAULT 0,
+        last_error TEXT
+    )
+"""
+
+SESSION_INSERT_SQL = """
+    INSERT INTO outbox_sessions (session_id, user_id, queued_at) VALUES (?, ?, ?)
+    ON CONFLICT(session_id) DO NOTHING
+"""
+
+MISSING_SESSION_ERROR = "session not found"
+
+ROW_COLUMNS = "session_id, character_id, character_name, read_passage, responses, analysis, queued_at"
+
+SELECT_COLUMNS = "seq, session_id, character_id, character_name, read_passage, responses, analysis, queued_at, attempts"
+
+
+class ResponseOutbox:
+    """Local queue of responses waiting to be written to the database"""
+
+    def __init__(self, path: str, db, batch_size: int = 100, flush_interval: float = 1.0,
+                 max_retry_delay: float = 60.0, max_attempts: int = 100, synchronous: str = "NORMAL",
+                 start: bool = True):
+        self.path = path
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retry_delay = max_retry_delay
+        self.max_attempts = max(1, int(max_attempts))
+
+        # One autocommit connection shared by callers and the flusher, guarded by _lock
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={'FULL' if str(synchronous).upper() == 'FULL' else 'NORMAL'}")
+        self._conn.execute(SCHEMA_SQL)
+        self._conn.execute(SESSION_SCHEMA_SQL)
+        self._conn.execute(DEAD_SCHEMA_SQL)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stats = {"queued": 0, "duplicates": 0, "saved": 0, "skipped": 0,
+                       "missing_session": 0, "failed_batches": 0, "dead_lettered": 0,
+                       "sessions_queued": 0, "sessions_created": 0}
+        self.last_error: Optional[str] = None
+
+        self._thread = None
+        if start:
+            self._thread = threading.Thread(target=self._run, name="response-outbox", daemon=True)
+            self._thread.start()
+
+    def put(self, session_id: str, character_id: int, character_name: str, read_passage: bool,
+            responses: List[Any], analysis: Dict) -> bool:
+        """Commit one response locally; False if (session_id, character_id) was already queued"""
+        params = (session_id, character_id, character_name, int(read_passage),
+                  json.dumps(responses), json.dumps(analysis), time.time())
+        with self._lock:
+            queued = self._conn.execute(INSERT_SQL, params).rowcount == 1
+            self._stats["queued" if queued else "duplicates"] += 1
+        self._wake.set()
+        return queued
+
+    def put_session(self, session_id: str, user_id: str) -> bool:
+        """Commit a session the database could not create; False if it was already queued"""
+        with self._lock:
+            queued = self._conn.execute(SESSION_INSERT_SQL, (session_id, user_id, time.time())).rowcount == 1
+            if queued:
+                self._stats["sessions_queued"] += 1
+        self._wake.set()
+        return queued
+
+    def _flush_sessions(self, force: bool = False) -> int:
+        """Create due queued sessions; returns sessions removed from the outbox"""
+        where = "" if force else "WHERE next_attempt_at <= ?"
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT session_id, user_id, attempts FROM outbox_sessions {where} ORDER BY queued_at",
+                () if force else (time.time(),)
+            ).fetchall()
+        if not rows:
+            return 0
+        try:
+            result = self.db.save_sessions([{"session_id": row[0], "user_id": row[1]} for row in rows])
+        except Exception as e:
+            result = {"saved": [], "failed": {row[0]: str(e) for row in rows}}
+
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            for session_id, _, attempts in rows:
+                if session_id in result["failed"]:
+                    delay = min(self.max_retry_delay, self.flush_interval * 2 ** attempts)
+                    self._conn.execute(
+                        "UPDATE outbox_sessions SET attempts = attempts + 1, next_attempt_at = ?, "
+                        "last_error = ? WHERE session_id = ?",
+                        (now + delay, result["failed"][session_id], session_id)
+                    )
+                else:
+                    self._conn.execute("DELETE FROM outbox_sessions WHERE session_id = ?", (session_id,))
+            self._conn.execute("COMMIT")
+            self._stats["sessions_created"] += len(result["saved"])
+            if result["failed"]:
+                self.last_error = next(iter(result["failed"].values()))
+        return len(rows) - len(result["failed"])
+
+    def pending(self, session_id: str) -> List[Dict]:
+        """Not-yet-flushed responses of a session, shaped like get_session_responses rows"""
+        return self.pending_by_session([session_id]).get(session_id, [])
+
+    def pending_by_session(self, session_ids: List[str]) -> Dict[str, List[Dict]]:
+        """pending() for many sessions in one query; sessions with nothing queued are left out"""
+        grouped: Dict[str, List[Dict]] = {}
+        for start in range(0, len(session_ids), 500):
+            chunk = session_ids[start:start + 500]
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT {SELECT_COLUMNS} FROM outbox "
+                    f"WHERE session_id IN ({', '.join('?' * len(chunk))}) ORDER BY seq",
+                    chunk
+                ).fetchall()
+            for row in rows:
+                grouped.setdefault(row[1], []).append(
+                    ResponseRow(row[2], row[3], row[4], datetime.fromtimestamp(row[7]), row[5], None, row[6], None)
+                )
+        return grouped
+
+    def _due_batch(self, now: float, force: bool) -> List[tuple]:
+        """Due rows in queue order: the new ones up to the first retry, or that retry alone"""
+        where = "" if force else "WHERE next_attempt_at <= ?"
+        params = () if force else (now,)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {SELECT_COLUMNS} FROM outbox {where} ORDER BY seq LIMIT ?",
+                params + (self.batch_size,)
+            ).fetchall()
+        # A row that already failed goes on its own, so it can't fail the rows batched with it
+        for index, row in enumerate(rows):
+            if row[8] > 0:
+                return rows[:index] or [row]
+        return rows
+
+    def _flush_batch(self, force: bool = False) -> Tuple[int, bool]:
+        """Write one batch of due rows; returns (rows removed, whether every row was)"""
+        rows = self._due_batch(time.time(), force)
+        if not rows:
+            return 0, False
+        items = [
+            {
+                "session_id": row[1],
+                "character_id": row[2],
+                "character_name": row[3],
+                "read_passage": bool(row[4]),
+                "responses": json.loads(row[5]),
+                "analysis": json.loads(row[6]),
+            }
+            for row in rows
+        ]
+        try:
+            result = self.db.save_character_responses(items)
+        except Exception as e:
+            error = str(e)
+            result = {"saved": [], "skipped": [], "missing": [],
+                      "failed": {(item["session_id"], item["character_id"]): error for item in items}}
+
+        # Responses of missing sessions stay queued: the session may still be in
+        # outbox_sessions or be created late, and dropping them would lose results
+        failed = dict(result["failed"])
+        for key in result["missing"]:
+            failed[tuple(key)] = MISSING_SESSION_ERROR
+        done = {tuple(key) for name in ("saved", "skipped") for key in result[name]}
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            for row in rows:
+                key = (row[1], row[2])
+                if key in done:
+                    self._conn.execute("DELETE FROM outbox WHERE seq = ?", (row[0],))
+                    continue
+                error = failed.get(key, "not written")
+                if row[8] + 1 >= self.max_attempts:
+                    print(f"Dead-lettering queued response {key[0]} (character {key[1]}) "
+                          f"after {row[8] + 1} attempts: {error}")
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO outbox_dead "
+                        f"(seq, {ROW_COLUMNS}, attempts, last_error, dead_at) "
+                        f"SELECT seq, {ROW_COLUMNS}, attempts + 1, ?, ? FROM outbox WHERE seq = ?",
+                        (error, now, row[0])
+                    )
+                    self._conn.execute("DELETE FROM outbox WHERE seq = ?", (row[0],))
+                    self._stats["dead_lettered"] += 1
+                else:
+                    delay = min(self.max_retry_delay, self.flush_interval * 2 ** row[8])
+                    self._conn.execute(
+                        "UPDATE outbox SET attempts = attempts + 1, next_attempt_at = ?, last_error = ? "
+                        "WHERE seq = ?",
+                        (now + delay, error, row[0])
+                    )
+            self._conn.execute("COMMIT")
+            self._stats["saved"] += len(result["saved"])
+            self._stats["skipped"] += len(result["skipped"])
+            self._stats["missing_session"] += len(result["missing"])
+            if failed:
+                self._stats["failed_batches"] += 1
+                self.last_error = next(iter(failed.values()))
+        return len(done), len(done) == len(rows)
+
+    def requeue_dead(self) -> int:
+        """Move dead-lettered rows back into the outbox with fresh attempts; returns rows moved"""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            moved = self._conn.execute(
+                f"INSERT INTO outbox ({ROW_COLUMNS}) SELECT {ROW_COLUMNS} FROM outbox_dead WHERE true "
+                "ORDER BY seq ON CONFLICT(session_id, character_id) DO NOTHING"
+            ).rowcount
+            self._conn.execute("DELETE FROM outbox_dead")
+            self._conn.execute("COMMIT")
+        self._wake.set()
+        return moved
+
+    def flush(self, force: bool = False) -> int:
+        """Drain every due row (every row when `force`); returns rows removed"""
+        removed = 0
+        with self._flush_lock:
+            # Sessions first, so their responses find them
+            self._flush_sessions(force)
+            while True:
+                count, complete = self._flush_batch(force)
+                removed += count
+                # Stop on an empty outbox or once the database rejects a write
+                if not complete:
+                    return removed
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing response outbox: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending, oldest, retrying, waiting = self._conn.execute(
+                "SELECT COUNT(*), MIN(queued_at), SUM(attempts > 0), SUM(last_error = ?) FROM outbox",
+                (MISSING_SESSION_ERROR,)
+            ).fetchone()
+            pending_sessions = self._conn.execute("SELECT COUNT(*) FROM outbox_sessions").fetchone()[0]
+            dead = self._conn.execute("SELECT COUNT(*) FROM outbox_dead").fetchone()[0]
+            snapshot = dict(self._stats)
+        snapshot.update(
+            path=self.path,
+            pending=pending,
+            retrying=retrying or 0,
+            waiting_for_session=waiting or 0,
+            pending_sessions=pending_sessions,
+            dead=dead,
+            oldest_age=time.time() - oldest if oldest is not None else None,
+            last_error=self.last_error
+        )
+        return snapshot
+
+
+_outboxes: Dict[Any, ResponseOutbox] = {}
+_outboxes_lock = threading.Lock()
+
+
+def get_outbox(key, factory: Callable[[], ResponseOutbox]) -> ResponseOutbox:
+    """Return the process-wide outbox for `key`, creating it on first use"""
+    outbox = _outboxes.get(key)
+    if outbox is None:
+        with _outboxes_lock:
+            outbox = _outboxes.get(key)
+            if outbox is None:
+                outbox = factory()
+                _outboxes[key] = outbox
+    return outbox
+
+
+def find_outbox(key) -> Optional[ResponseOutbox]:
+    """The outbox for `key` if this process has opened it"""
+    return _outboxes.get(key)
+
+
+def merge_pending(rows: List[Dict], pending: List[Dict]) -> List[Dict]:
+    """`rows` plus the pending responses for characters not stored yet"""
+    stored = {row["character_id"] for row in rows}
+    extra = [row for row in pending if row["character_id"] not in stored]
+    return rows + extra if extra else rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or drain the local response outbox")
+    parser.add_argument("command", choices=["status", "flush", "requeue"])
+    args = parser.parse_args()
+
+    from utils.database import Database, get_setting
+    if str(get_setting("RESPONSE_OUTBOX", "1")) == "0":
+        print("The response outbox is disabled (RESPONSE_OUTBOX=0)")
+        return
+    outbox = Database().outbox
+
+    if args.command == "requeue":
+        print(f"Requeued {outbox.requeue_dead()} dead-lettered responses")
+    if args.command in ("flush", "requeue"):
+        print(f"Flushed {outbox.flush(force=True)} responses")
+    print(json.dumps(outbox.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+# utils/query_plans.py
+"""EXPLAIN checks for the hot queries of utils/database.py.
+
+HOT_QUERIES lists the queries run on every page view or save, taken from the
+SQL constants Database issues; `hot_queries` adds the answer-search queries,
+whose SQL depends on the dialect. `check` EXPLAINs each one on every shard
+and reports any plan that reads a whole table (SQLite "SCAN <table>", MySQL
+access type ALL or index) or sorts outside an index (SQLite "USE TEMP
+B-TREE", MySQL "Using filesort" / "Using temporary"), except the sorts
+SEARCH_QUERIES make over their matched rows. Run it after any schema or
+query change, against a database seeded with realistic volumes, since MySQL
+prefers full scans of near-empty tables; it exits with status 1 when a plan
+regresses:
+
+    python -m utils.query_plans check
+    python -m utils.query_plans show    # print every plan
+"""
+import argparse
+import sys
+from typing import Callable, Dict, List, Tuple
+
+from utils import answer_search
+from utils import session_metrics
+from utils.database import (
+    BATCH_RESPONSES_SELECT, BATCH_SESSION_INFO_SELECT, DIRECTORY_LOOKUP_SQL, LATEST_SESSIONS_SQL,
+    SELECT_SESSION_RESPONSES_SQL, SESSION_INFO_SQL, SESSION_PAGE_SELECT, SESSION_SUMMARY_SQL,
+    STORED_KEYS_SQL, USER_BY_ID_SQL, USER_BY_USERNAME_SQL, USER_SCORE_TREND_SQL
+)
+
+
+# Stand-ins for an empty shard; EXPLAIN plans don't depend on the values
+PLACEHOLDER_SAMPLE = {
+    "session_ids": ("00000000-0000-0000-0000-000000000000", "00000000-0000-0000-0000-000000000001"),
+    "user_ids": ("00000000-0000-0000-0000-000000000000", "00000000-0000-0000-0000-000000000001"),
+    "username": "",
+    "created_at": "1970-01-01 00:00:00",
+}
+
+# (name, SQL, params from a sample) in the order Database runs them
+HOT_QUERIES: List[Tuple[str, str, Callable[[Dict], tuple]]] = [
+    ("get_user_by_username", USER_BY_USERNAME_SQL, lambda s: (s["username"],)),
+    # With several shards: the directory on shard 0, then the user's own shard
+    ("get_user_by_username (directory)", DIRECTORY_LOOKUP_SQL, lambda s: (s["username"],)),
+    ("get_user_by_username (user shard)", USER_BY_ID_SQL, lambda s: s["user_ids"][:1]),
+    ("get_session_info", SESSION_INFO_SQL, lambda s: s["session_ids"][:1]),
+    ("get_session_responses", SELECT_SESSION_RESPONSES_SQL, lambda s: s["session_ids"][:1]),
+    ("get_session_summary", SESSION_SUMMARY_SQL, lambda s: s["session_ids"][:1]),
+    ("get_user_sessions", f"""
+        {SESSION_PAGE_SELECT}
+        WHERE s.user_id = %s
+        ORDER BY s.created_at DESC, s.id DESC
+     """, lambda s: s["user_ids"][:1]),
+    ("list_user_sessions", f"""
+        {SESSION_PAGE_SELECT}
+        WHERE s.user_id = %s
+          AND (s.created_at < %s OR (s.created_at = %s AND s.id < %s))
+        ORDER BY s.created_at DESC, s.id DESC
+        LIMIT %s
+     """, lambda s: (s["user_ids"][0], s["created_at"], s["created_at"], s["session_ids"][0], 11)),
+    ("get_user_score_trend", USER_SCORE_TREND_SQL, lambda s: s["user_ids"][:1]),
+    ("get_sessions_data (sessions)",
+     f"{BATCH_SESSION_INFO_SELECT} WHERE s.id IN (%s, %s)",
+     lambda s: s["session_ids"]),
+    ("get_sessions_data (responses)",
+     f"{BATCH_RESPONSES_SELECT} WHERE session_id IN (%s, %s) ORDER BY session_id, created_at, id",
+     lambda s: s["session_ids"]),
+    ("get_session_metrics (characters)",
+     session_metrics.queries(["", ""])[0][0],
+     lambda s: s["session_ids"] + (session_metrics.OVERALL_METRIC,)),
+    ("get_session_metrics (qualities)",
+     session_metrics.queries(["", ""])[1][0],
+     lambda s: s["session_ids"] + (session_metrics.QUALITY_PATTERN,)),
+    ("get_latest_sessions", LATEST_SESSIONS_SQL.format(marks="%s, %s"), lambda s: s["user_ids"]),
+    ("save_character_responses (stored keys)", STORED_KEYS_SQL.format(marks="%s, %s"),
+     lambda s: s["session_ids"]),
+]
+
+# Full-text matches come in no index order, so ranking them and counting
+# distinct participants sorts the matched rows (never the whole table)
+SEARCH_QUERIES = {"search_answers (count)", "search_answers (hits)"}
+
+# Any word works; the plans don't depend on it
+SEARCH_TERM = "answer"
+
+
+def hot_queries(dialect: str) -> List[Tuple[str, str, Callable[[Dict], tuple]]]:
+    """HOT_QUERIES plus the answer-search queries as `dialect` runs them"""
+    (count_sql, count_params), (hits_sql, hits_params) = answer_search.queries(dialect, [SEARCH_TERM])
+    return HOT_QUERIES + [
+        ("search_answers (count)", count_sql, lambda s: count_params),
+        ("search_answers (hits)", hits_sql, lambda s: hits_params),
+    ]
+
+
+def sample(cursor) -> Dict:
+    """Real ids from the shard, so MySQL plans lookups it can't short-circuit"""
+    cursor.execute("""
+        SELECT s.id, s.user_id, s.created_at, u.username
+        FROM p1_mb_sessions s
+        JOIN p1_mb_users u ON u.id = s.user_id
+        LIMIT 2
+    """)
+    rows = cursor.fetchall()
+    if len(rows) < 2:
+        return PLACEHOLDER_SAMPLE
+    return {
+        "session_ids": (rows[0]["id"], rows[1]["id"]),
+        "user_ids": (rows[0]["user_id"], rows[1]["user_id"]),
+        "username": rows[0]["username"],
+        "created_at": rows[0]["created_at"],
+    }
+
+
+def explain(cursor, dialect: str, sql: str, params: tuple) -> List[Dict]:
+    """Plan rows: SQLite EXPLAIN QUERY PLAN rows or MySQL EXPLAIN rows, as dicts"""
+    cursor.execute(("EXPLAIN QUERY PLAN " if dialect == "sqlite" else "EXPLAIN ") + sql, params)
+    return cursor.fetchall()
+
+
+def plan_problems(dialect: str, plan: List[Dict], allow_sort: bool = False) -> List[str]:
+    """Full scans and sorts found in a plan (only full scans with `allow_sort`)"""
+    problems = []
+    for row in plan:
+        if dialect == "sqlite":
+            detail = row["detail"]
+            # Full-text lookups show up as scans of the virtual table
+            if detail.startswith("SCAN ") and "VIRTUAL TABLE" not in detail:
+                problems.append(f"full scan: {detail}")
+            if "USE TEMP B-TREE" in detail and not allow_sort:
+                problems.append(f"sort: {detail}")
+            continue
+        extra = row.get("Extra") or ""
+        # A full-text index is read through its own access type, never ALL
+        if row.get("type") in ("ALL", "index"):
+            problems.append(f"full scan of {row['table']} (type {row['type']})")
+        for marker in ("Using filesort", "Using temporary"):
+            if marker in extra and not allow_sort:
+                problems.append(f"{marker.lower()} on {row['table']}")
+    return problems
+
+
+def format_plan(dialect: str, plan: List[Dict]) -> List[str]:
+    if dialect == "sqlite":
+        return [row["detail"] for row in plan]
+    return [
+        f"{row['table']}: type={row['type']} key={row['key']} rows={row['rows']} {row.get('Extra') or ''}".rstrip()
+        for row in plan
+    ]
+
+
+def check(db) -> List[Dict]:
+    """EXPLAIN every hot query on every shard.
+
+    Returns one {"shard", "query", "plan", "problems"} entry per query and
+    shard; the schema is sound when no entry has problems.
+    """
+    results = []
+    for view in db.shard_views():
+        with view.get_connection(query="query_plans") as conn:
+            cursor = conn.cursor(dictionary=True)
+            values = sample(cursor)
+            for name, sql, params in hot_queries(view.dialect):
+                plan = explain(cursor, view.dialect, sql, params(values))
+                results.append({
+                    "shard": view.shard,
+                    "query": name,
+                    "plan": format_plan(view.dialect, plan),
+                    "problems": plan_problems(view.dialect, plan, allow_sort=name in SEARCH_QUERIES),
+                })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the query plans of hot queries")
+    parser.add_argument("command", choices=["check", "show"])
+    args = parser.parse_args()
+
+    from utils.database import Database
+    results = check(Database())
+
+    failed = [r for r in results if r["problems"]]
+    for result in results:
+        if args.command == "show" or result["problems"]:
+            status = "FAIL" if result["problems"] else "ok"
+            print(f"[{status}] shard {result['shard']} {result['query']}")
+            for line in result["plan"]:
+                print(f"    {line}")
+            for problem in result["problems"]:
+                print(f"    ! {problem}")
+    print(f"{len(results) - len(failed)}/{len(results)} query plans use indexes without sorting")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
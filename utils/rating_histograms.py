@@ -0,0 +1,241 @@
+# utils/rating_histograms.py
+"""Population rating histograms for percentile ranking.
+
+For every character we keep a histogram of overall_rating and of each
+quality rating (metric names match the export's `quality_<name>` columns),
+in buckets of 1 / BUCKETS_PER_POINT rating points. save_character_response
+appends one row per metric to p1_mb_rating_histogram_delta, so concurrent
+saves never contend on a shared counter row. `compact` folds the deltas
+into p1_mb_rating_histogram; it runs in the background at most every
+HISTOGRAM_COMPACT_INTERVAL seconds and can be run by hand. Reads sum both
+tables, so a percentile costs O(buckets) whatever the number of responses.
+
+    python -m utils.rating_histograms compact
+    python -m utils.rating_histograms rebuild   # recount from live responses
+"""
+import argparse
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.blob_codec import decode_field
+
+
+BUCKETS_PER_POINT = 10
+MAX_RATING = 10
+OVERALL_METRIC = "overall_rating"
+COMPACT_LOCK_NAME = "p1_mb_rating_histogram_compact"
+
+DELTA_INSERT_SQL = """
+    INSERT INTO p1_mb_rating_histogram_delta (character_id, metric, bucket)
+    VALUES (%s, %s, %s)
+"""
+
+
+def quality_column(name: str) -> str:
+    """Metric/column name for a free-form quality name, e.g. "Team Work" -> quality_team_work"""
+    return "quality_" + "_".join(str(name).strip().lower().split())
+
+
+def bucket_of(rating) -> int:
+    rating = min(max(float(rating), 0.0), float(MAX_RATING))
+    return int(round(rating * BUCKETS_PER_POINT))
+
+
+def histogram_rows(character_id: int, analysis: Dict) -> List[Tuple[int, str, int]]:
+    """(character_id, metric, bucket) for each rating in one analysis"""
+    rows = []
+    # Non-numeric ratings ("N/A" from the model) are left out, as score_trend does
+    if isinstance(analysis.get("overall_rating"), (int, float)):
+        rows.append((character_id, OVERALL_METRIC, bucket_of(analysis["overall_rating"])))
+    for name, value in (analysis.get("quality_ratings") or {}).items():
+        if isinstance(value, (int, float)):
+            rows.append((character_id, quality_column(name), bucket_of(value)))
+    return rows
+
+
+def _upsert_sql(dialect: str) -> str:
+    if dialect == "sqlite":
+        return """
+            INSERT INTO p1_mb_rating_histogram (character_id, metric, bucket, count)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT(character_id, metric, bucket) DO UPDATE SET count = count + excluded.count
+        """
+    return """
+        INSERT INTO p1_mb_rating_histogram (character_id, metric, bucket, count)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE count = count + VALUES(count)
+    """
+
+
+def percentile(histogram: Dict[int, int], rating) -> Optional[float]:
+    """Share of the population below `rating`, counting ties as half, in percent"""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    mine = bucket_of(rating)
+    below = sum(count for bucket, count in histogram.items() if bucket < mine)
+    return 100.0 * (below + histogram.get(mine, 0) / 2) / total
+
+
+def load_histograms(cursor, pairs: Iterable[Tuple[int, str]]) -> Dict[Tuple[int, str], Dict[int, int]]:
+    """Compacted plus pending counts for each (character_id, metric) pair"""
+    pairs = list(dict.fromkeys(pairs))
+    histograms = {pair: {} for pair in pairs}
+    if not pairs:
+        return histograms
+    character_ids = sorted({cid for cid, _ in pairs})
+    metrics = sorted({metric for _, metric in pairs})
+    cid_marks = ", ".join(["%s"] * len(character_ids))
+    metric_marks = ", ".join(["%s"] * len(metrics))
+    cursor.execute(f"""
+        SELECT character_id, metric, bucket, SUM(count) AS count FROM (
+            SELECT character_id, metric, bucket, count FROM p1_mb_rating_histogram
+            WHERE character_id IN ({cid_marks}) AND metric IN ({metric_marks})
+            UNION ALL
+            SELECT character_id, metric, bucket, 1 FROM p1_mb_rating_histogram_delta
+            WHERE character_id IN ({cid_marks}) AND metric IN ({metric_marks})
+        ) h
+        GROUP BY character_id, metric, bucket
+    """, character_ids + metrics + character_ids + metrics)
+    for character_id, metric, bucket, count in cursor.fetchall():
+        histogram = histograms.get((character_id, metric))
+        if histogram is not None:
+            histogram[bucket] = int(count)
+    return histograms
+
+
+def _acquire_lock(cursor, dialect: str) -> bool:
+    if dialect == "sqlite":
+        cursor.execute("BEGIN IMMEDIATE")
+        return True
+    cursor.execute("SELECT GET_LOCK(%s, 0)", (COMPACT_LOCK_NAME,))
+    return cursor.fetchone()[0] == 1
+
+
+def _release_lock(cursor, dialect: str):
+    if dialect == "mysql":
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (COMPACT_LOCK_NAME,))
+        cursor.fetchall()
+
+
+def compact(db) -> int:
+    """Fold pending deltas into the histogram; returns delta rows folded.
+
+    Serialised across processes (named lock / write transaction), so two
+    compactions never add the same deltas twice.
+    """
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        if not _acquire_lock(cursor, db.dialect):
+            return 0  # another process is compacting
+        try:
+            cursor.execute("SELECT MAX(id) FROM p1_mb_rating_histogram_delta")
+            max_id = cursor.fetchone()[0]
+            if max_id is None:
+                return 0
+            cursor.execute("""
+                SELECT character_id, metric, bucket, COUNT(*)
+                FROM p1_mb_rating_histogram_delta
+                WHERE id <= %s
+                GROUP BY character_id, metric, bucket
+            """, (max_id,))
+            grouped = cursor.fetchall()
+            cursor.executemany(_upsert_sql(db.dialect), [tuple(row) for row in grouped])
+            cursor.execute("DELETE FROM p1_mb_rating_histogram_delta WHERE id <= %s", (max_id,))
+            return sum(row[3] for row in grouped)
+        finally:
+            _release_lock(cursor, db.dialect)
+
+
+def count_responses(cursor, counts: Counter, batch_size: int = 1000) -> int:
+    """Add every response's ratings to `counts`; returns responses scanned.
+
+    Counts are accumulated in memory per (character, metric, bucket), which
+    stays small however many responses there are.
+    """
+    scanned = 0
+    last_id = 0
+    while True:
+        cursor.execute("""
+            SELECT id, character_id, analysis, analysis_blob
+            FROM p1_mb_character_responses
+            WHERE id > %s
+            ORDER BY id
+            LIMIT %s
+        """, (last_id, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        for _, character_id, analysis, analysis_blob in rows:
+            counts.update(histogram_rows(character_id, decode_field(analysis, analysis_blob)))
+        last_id = rows[-1][0]
+        scanned += len(rows)
+    return scanned
+
+
+def write_counts(cursor, counts: Counter):
+    """Replace both histogram tables with `counts`"""
+    cursor.execute("DELETE FROM p1_mb_rating_histogram_delta")
+    cursor.execute("DELETE FROM p1_mb_rating_histogram")
+    cursor.executemany(
+        "INSERT INTO p1_mb_rating_histogram (character_id, metric, bucket, count) VALUES (%s, %s, %s, %s)",
+        [(cid, metric, bucket, count) for (cid, metric, bucket), count in counts.items()]
+    )
+
+
+def rebuild(cursor, dialect: str, batch_size: int = 1000) -> int:
+    """Recount every histogram from p1_mb_character_responses; returns responses scanned"""
+    counts = Counter()
+    scanned = count_responses(cursor, counts, batch_size)
+    write_counts(cursor, counts)
+    return scanned
+
+
+_last_compact: Dict[object, float] = {}
+_compact_lock = threading.Lock()
+
+
+def maybe_compact(db, interval: float):
+    """Start a background compaction if none ran in this process for `interval` seconds"""
+    now = time.monotonic()
+    with _compact_lock:
+        if now - _last_compact.get(db.key, float("-inf")) < interval:
+            return
+        _last_compact[db.key] = now
+
+    def run():
+        try:
+            compact(db)
+        except Exception as e:
+            print(f"Error compacting rating histograms: {e}")
+
+    threading.Thread(target=run, name="histogram-compact", daemon=True).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain population rating histograms")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("compact", help="Fold pending deltas into the histograms")
+    subparsers.add_parser("rebuild", help="Recount histograms from all stored responses")
+    args = parser.parse_args()
+
+    from utils.database import Database
+    db = Database()
+
+    if args.command == "compact":
+        print(f"Folded {compact(db)} delta rows")
+    elif args.command == "rebuild":
+        # Responses live on every shard; the histograms on shard 0
+        counts, scanned = Counter(), 0
+        for view in db.shard_views():
+            with view.get_connection() as conn:
+                scanned += count_responses(conn.cursor(), counts)
+        with db.get_connection() as conn:
+            write_counts(conn.cursor(), counts)
+        print(f"Rebuilt histograms from {scanned} responses")
+
+
+if __name__ == "__main__":
+    main()
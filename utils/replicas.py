@@ -0,0 +1,166 @@
+# utils/replicas.py
+"""Read-replica routing for Database.
+
+DATABASE_REPLICA_URLS lists replica URLs (comma-separated, same scheme as
+DATABASE_URL). Read-only dashboard queries are spread round-robin over the
+replicas that passed their last health check; everything else, and every
+read when no replica is healthy, uses the primary.
+
+A replica is checked at most every REPLICA_CHECK_INTERVAL seconds, lazily
+on the read path: it must answer and report a replication lag of at most
+REPLICA_MAX_LAG seconds. After a write to a session or user, reads keyed
+on that session or user are pinned to the primary for REPLICA_PIN_SECONDS
+(default: the maximum lag), so a user sees their own saves immediately.
+"""
+import itertools
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+
+
+class Replica:
+    __slots__ = ("backend", "healthy", "lag", "checked_at", "reads", "failures",
+                 "last_error", "_check_lock")
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.healthy = False
+        self.lag: Optional[float] = None
+        self.checked_at = float("-inf")
+        self.reads = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self._check_lock = threading.Lock()
+
+
+class ReplicaRouter:
+    """Pick a backend per read: a healthy replica, or the primary"""
+
+    def __init__(self, primary, replicas: Iterable, max_lag: float = 5.0,
+                 check_interval: float = 5.0, pin_seconds: float = None):
+        self.primary = primary
+        self.replicas: List[Replica] = [Replica(backend) for backend in replicas]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.pin_seconds = max_lag if pin_seconds is None else pin_seconds
+        self._next = itertools.count()
+        self._pins: Dict[Hashable, float] = {}
+        self._lock = threading.Lock()
+        self._stats = {"primary_reads": 0, "pinned_reads": 0, "replica_reads": 0}
+
+    def pin(self, *keys: Hashable):
+        """Route reads for `keys` to the primary for the next pin_seconds"""
+        now = time.monotonic()
+        until = now + self.pin_seconds
+        with self._lock:
+            if len(self._pins) > 10000:
+                self._pins = {k: t for k, t in self._pins.items() if t > now}
+            for key in keys:
+                if key is not None:
+                    self._pins[key] = until
+
+    def _is_pinned(self, keys) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            pinned = False
+            for key in keys:
+                until = self._pins.get(key)
+                if until is None:
+                    continue
+                if until > now:
+                    pinned = True
+                else:
+                    del self._pins[key]
+            return pinned
+
+    def choose(self, keys: Iterable[Hashable] = ()) -> Any:
+        """Backend for a read concerning `keys` (session ids, user ids)"""
+        if not self.replicas:
+            return self.primary
+        if self._is_pinned(keys):
+            with self._lock:
+                self._stats["pinned_reads"] += 1
+            return self.primary
+
+        start = next(self._next)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            self._maybe_check(replica)
+            if replica.healthy:
+                with self._lock:
+                    replica.reads += 1
+                    self._stats["replica_reads"] += 1
+                return replica.backend
+
+        with self._lock:
+            self._stats["primary_reads"] += 1
+        return self.primary
+
+    def mark_failed(self, backend, error: Exception):
+        """Take a replica out of rotation until its next health check"""
+        for replica in self.replicas:
+            if replica.backend is backend:
+                with self._lock:
+                    replica.healthy = False
+                    replica.failures += 1
+                    replica.last_error = str(error)
+                    replica.checked_at = time.monotonic()
+
+    def _maybe_check(self, replica: Replica):
+        if time.monotonic() - replica.checked_at < self.check_interval:
+            return
+        # One thread checks; the others keep using the previous verdict
+        if not replica._check_lock.acquire(blocking=False):
+            return
+        try:
+            try:
+                with replica.backend.connection() as conn:
+                    lag = replica.backend.replication_lag(conn)
+                healthy = lag is not None and lag <= self.max_lag
+                error = None if healthy else f"replication lag {lag!r} exceeds {self.max_lag}s"
+            except Exception as e:
+                lag, healthy, error = None, False, str(e)
+            with self._lock:
+                if not healthy:
+                    replica.failures += 1
+                    if replica.healthy or replica.last_error is None:
+                        print(f"Replica {replica.backend.key} out of rotation: {error}")
+                replica.lag = lag
+                replica.healthy = healthy
+                replica.last_error = error
+                replica.checked_at = time.monotonic()
+        finally:
+            replica._check_lock.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["pinned_keys"] = len(self._pins)
+            snapshot["replicas"] = [
+                {
+                    "key": replica.backend.key,
+                    "healthy": replica.healthy,
+                    "lag": replica.lag,
+                    "reads": replica.reads,
+                    "failures": replica.failures,
+                    "last_error": replica.last_error,
+                }
+                for replica in self.replicas
+            ]
+        return snapshot
+
+
+_routers: Dict[Any, ReplicaRouter] = {}
+_routers_lock = threading.Lock()
+
+
+def get_router(key, factory: Callable[[], ReplicaRouter]) -> ReplicaRouter:
+    """Return the process-wide router for `key`, creating it on first use"""
+    router = _routers.get(key)
+    if router is None:
+        with _routers_lock:
+            router = _routers.get(key)
+            if router is None:
+                router = factory()
+                _routers[key] = router
+    return router
@@ -0,0 +1,211 @@
+# utils/response_rows.py
+"""Lazily decoded character response rows.
+
+get_session_responses returns ResponseRow objects instead of dicts. A row
+reads like the dict it replaces (row["analysis"]["overall_rating"],
+row.get("created_at"), dict(row)), but keeps the stored `responses` and
+`analysis` documents as raw text or blob until a key is first read. Each
+document is then decoded once, with orjson when it is installed (see
+blob_codec.loads), and the raw value is dropped. Most dashboard paths only
+need the analysis. The raw answers are decoded only when a "Show Your
+Responses" toggle is switched on or the JSON report is downloaded; the
+report is built when its button is clicked, not on every render. Rows use
+__slots__, so an undecoded row holds just its column values.
+
+The benchmark replays the dashboard's reads: a page view (analysis only)
+and, separately, a view followed by the JSON export. Retained memory is
+traced from before the raw rows are fetched, because lazy rows keep the
+fetched text alive while eager dicts let it go.
+
+    python -m utils.response_rows benchmark --sessions 50
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Iterator, List
+
+from utils.blob_codec import decode_field
+
+
+class _Raw(tuple):
+    """(text, blob) of a document that has not been decoded yet"""
+    __slots__ = ()
+
+
+KEYS = ("character_id", "character_name", "read_passage", "responses", "analysis", "created_at")
+
+
+class ResponseRow(Mapping):
+    """Read-only mapping over one p1_mb_character_responses row"""
+
+    # Each document slot holds a _Raw until first read, then the decoded value;
+    # a single slot keeps concurrent first reads (rows are shared via the cache) safe
+    __slots__ = ("character_id", "character_name", "read_passage", "created_at",
+                 "_responses", "_analysis")
+
+    def __init__(self, character_id: int, character_name: str, read_passage: bool, created_at,
+                 responses_text, responses_blob, analysis_text, analysis_blob):
+        self.character_id = character_id
+        self.character_name = character_name
+        self.read_passage = bool(read_passage)
+        self.created_at = created_at
+        self._responses = _Raw((responses_text, responses_blob))
+        self._analysis = _Raw((analysis_text, analysis_blob))
+
+    @classmethod
+    def from_row(cls, row: Dict) -> "ResponseRow":
+        """Build from a dictionary cursor row of SELECT_SESSION_RESPONSES_SQL's columns"""
+        return cls(row["character_id"], row["character_name"], row["read_passage"], row["created_at"],
+                   row["responses"], row["responses_blob"], row["analysis"], row["analysis_blob"])
+
+    @property
+    def responses(self) -> Any:
+        value = self._responses
+        if type(value) is _Raw:
+            value = self._responses = decode_field(*value)
+        return value
+
+    @property
+    def analysis(self) -> Any:
+        value = self._analysis
+        if type(value) is _Raw:
+            value = self._analysis = decode_field(*value)
+        return value
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(KEYS)
+
+    def __len__(self) -> int:
+        return len(KEYS)
+
+    def __repr__(self) -> str:
+        return f"ResponseRow(character_id={self.character_id!r}, character_name={self.character_name!r})"
+
+
+def _eager_field(text, blob) -> Any:
+    # The previous decoder: stdlib json for text columns
+    return json.loads(text) if blob is None else decode_field(None, blob)
+
+
+def _build(rows: List[Dict], lazy: bool) -> List:
+    """Rows as get_session_responses returns them, with lazy rows or (as before) eager dicts"""
+    if lazy:
+        return [ResponseRow.from_row(row) for row in rows]
+    return [
+        {
+            "character_id": row["character_id"],
+            "character_name": row["character_name"],
+            "read_passage": bool(row["read_passage"]),
+            "responses": _eager_field(row["responses"], row["responses_blob"]),
+            "analysis": _eager_field(row["analysis"], row["analysis_blob"]),
+            "created_at": row["created_at"]
+        }
+        for row in rows
+    ]
+
+
+def _dashboard_load(rows: List[Dict], lazy: bool, export: bool = False) -> List:
+    """Build a session's rows and read what the dashboard reads; `export` adds the JSON report"""
+    built = _build(rows, lazy)
+    sum(r["analysis"].get("overall_rating", 0) or 0 for r in built)
+    max(built, key=lambda r: r["analysis"].get("overall_rating", 0) or 0)
+    sum(len(r["analysis"].get("quality_ratings") or {}) for r in built)
+    for r in built:
+        # Individual deep dive (the answers stay behind their toggle)
+        r["analysis"].get("strengths")
+        r["analysis"].get("analysis")
+    if export:
+        json.dumps({"assessments": built}, default=lambda obj: dict(obj) if isinstance(obj, Mapping) else str(obj))
+    return built
+
+
+MODES = (("eager", False, False), ("lazy", True, False), ("eager+export", False, True), ("lazy+export", True, True))
+
+
+def benchmark(fetch: Callable[[], List[List[Dict]]], repeat: int = 5) -> Dict[str, Dict[str, float]]:
+    """Decode time and retained memory per dashboard load, eager dicts vs lazy rows.
+
+    `fetch` returns the raw rows of each sampled session; it is called inside
+    the memory trace so rows that keep fetched values alive are charged for them.
+    """
+    sessions = fetch()
+    count = max(len(sessions), 1)
+    results = {}
+    for name, lazy, export in MODES:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for rows in sessions:
+                _dashboard_load(rows, lazy, export)
+        seconds = (time.perf_counter() - started) / repeat
+
+        # Memory still held by the loaded rows, as the response cache would hold them
+        gc.collect()
+        tracemalloc.start()
+        fetched = fetch()
+        kept = [_dashboard_load(rows, lazy, export) for rows in fetched]
+        del fetched
+        gc.collect()
+        retained, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del kept
+
+        results[name] = {
+            "ms_per_load": seconds / count * 1000,
+            "kb_per_load": retained / count / 1024,
+        }
+    return results
+
+
+def _load_sessions(db, limit: int) -> List[List[Dict]]:
+    """Raw rows of the `limit` most recent sessions with responses"""
+    with db.get_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("""
+            SELECT session_id FROM p1_mb_character_responses
+            GROUP BY session_id
+            ORDER BY MAX(id) DESC
+            LIMIT %s
+        """, (limit,))
+        session_ids = [row["session_id"] for row in cursor.fetchall()]
+        sessions = []
+        for session_id in session_ids:
+            cursor.execute("""
+                SELECT character_id, character_name, read_passage, responses, analysis,
+                       responses_blob, analysis_blob, created_at
+                FROM p1_mb_character_responses
+                WHERE session_id = %s
+                ORDER BY created_at
+            """, (session_id,))
+            sessions.append(cursor.fetchall())
+        return sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lazily decoded response rows")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    bench_parser = subparsers.add_parser("benchmark", help="Compare eager and lazy decoding on stored sessions")
+    bench_parser.add_argument("--sessions", type=int, default=50, help="Most recent sessions to sample")
+    args = parser.parse_args()
+
+    from utils.database import Database
+    db = Database()
+
+    if args.command == "benchmark":
+        if not _load_sessions(db, 1):
+            print("No sessions to sample")
+            return
+        print(f"{'mode':<14}{'ms/load':>10}{'KiB/load':>10}")
+        for name, r in benchmark(lambda: _load_sessions(db, args.sessions)).items():
+            print(f"{name:<14}{r['ms_per_load']:>10.3f}{r['kb_per_load']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+# utils/retention.py
+"""Retention job keeping the hot p1_mb_* tables small.
+
+Two policies, each applied in bounded chunks with one short transaction per
+chunk, so no long-running lock is held on the live tables:
+
+* Sessions whose last activity is older than `archive_after_days` move to
+  p1_mb_sessions_archive / p1_mb_character_responses_archive (`--to table`),
+  or to gzip JSONL files in the bulk-import format (`--to file`), which
+  `python -m utils.bulk_import` can load back.
+* Sessions with no responses (`completed = 0`, e.g. "Start New Assessment"
+  clicked and abandoned) older than `abandoned_after_hours` are deleted.
+
+Run from the project root:
+
+    python -m utils.retention status
+    python -m utils.retention run --archive-after-days 365 --to file --archive-dir archive/
+"""
+import argparse
+import gzip
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from utils.blob_codec import decode_field
+
+
+SESSION_COLUMNS = "id, user_id, created_at, completed"
+RESPONSE_COLUMNS = (
+    "id, session_id, character_id, character_name, read_passage, "
+    "responses, analysis, responses_blob, analysis_blob, created_at"
+)
+
+
+def _cutoff_sql(dialect: str) -> str:
+    """SQL expression for 'now minus %s hours' in the server's own clock"""
+    if dialect == "sqlite":
+        return "datetime('now', '-' || %s || ' hours')"
+    return "NOW() - INTERVAL %s HOUR"
+
+
+def _placeholders(values) -> str:
+    return ", ".join(["%s"] * len(values))
+
+
+def _archive_candidates_sql(dialect: str) -> str:
+    # Activity never predates creation, so the indexed created_at range bounds
+    # the scan before the activity check; both take the same hours parameter
+    return f"""
+        FROM p1_mb_sessions s
+        LEFT JOIN p1_mb_session_summary m ON m.session_id = s.id
+        WHERE s.created_at < {_cutoff_sql(dialect)}
+          AND s.completed > 0
+          AND COALESCE(m.last_activity, s.created_at) < {_cutoff_sql(dialect)}
+    """
+
+
+def _abandoned_sql(dialect: str) -> str:
+    return f"""
+        FROM p1_mb_sessions s
+        WHERE s.completed = 0
+          AND s.created_at < {_cutoff_sql(dialect)}
+          AND NOT EXISTS (
+              SELECT 1 FROM p1_mb_character_responses r WHERE r.session_id = s.id
+          )
+    """
+
+
+def _shards(db) -> List:
+    """Single-database views of a sharded Database (just `db` otherwise)"""
+    shard_views = getattr(db, "shard_views", None)
+    return shard_views() if shard_views else [db]
+
+
+def status(db, archive_after_days: float = 365, abandoned_after_hours: float = 24) -> Dict[str, int]:
+    """Count rows each policy would touch, plus current archive sizes, over all shards"""
+    totals = {}
+    for shard in _shards(db):
+        for key, value in _shard_status(shard, archive_after_days, abandoned_after_hours).items():
+            totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def _shard_status(db, archive_after_days: float, abandoned_after_hours: float) -> Dict[str, int]:
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT COUNT(*) {_archive_candidates_sql(db.dialect)}",
+                       (archive_after_days * 24,) * 2)
+        archivable = cursor.fetchone()[0]
+        cursor.execute(f"SELECT COUNT(*) {_abandoned_sql(db.dialect)}", (abandoned_after_hours,))
+        abandoned = cursor.fetchone()[0]
+        cursor.execute("SELECT COUNT(*) FROM p1_mb_sessions")
+        hot = cursor.fetchone()[0]
+        cursor.execute("SELECT COUNT(*) FROM p1_mb_sessions_archive")
+        archived = cursor.fetchone()[0]
+    return {"hot_sessions": hot, "archivable_sessions": archivable,
+            "abandoned_sessions": abandoned, "archived_sessions": archived}
+
+
+def _next_chunk(cursor, from_sql: str, params: Tuple, chunk_size: int,
+                after: Optional[Tuple] = None) -> Tuple[List[Tuple[str, str]], Optional[Tuple]]:
+    """Next (session_id, user_id) chunk after the `after` keyset, and the new keyset.
+
+    Sessions the previous chunks skipped (still active, or a response arrived
+    before the purge) stay behind the keyset instead of being rescanned.
+    """
+    keyset = ""
+    if after:
+        # Same rows as (created_at, id) > keyset, written as a range the index can seek
+        keyset = "AND s.created_at >= %s AND (s.created_at > %s OR s.id > %s)"
+        params = params + (after[0], after[0], after[1])
+    cursor.execute(f"""
+        SELECT s.id, s.user_id, s.created_at {from_sql}
+          {keyset}
+        ORDER BY s.created_at, s.id
+        LIMIT %s
+    """, params + (chunk_size,))
+    rows = cursor.fetchall()
+    if not rows:
+        return [], after
+    # The created_at value goes back unchanged, so it compares as stored
+    return [(row[0], row[1]) for row in rows], (rows[-1][2], rows[-1][0])
+
+
+def _archive_chunk_to_tables(cursor, session_ids: List[str]) -> int:
+    placeholders = _placeholders(session_ids)
+    cursor.execute(f"""
+        INSERT INTO p1_mb_character_responses_archive ({RESPONSE_COLUMNS})
+        SELECT {RESPONSE_COLUMNS} FROM p1_mb_character_responses
+        WHERE session_id IN ({placeholders})
+    """, session_ids)
+    responses = cursor.rowcount
+    cursor.execute(f"""
+        INSERT INTO p1_mb_sessions_archive ({SESSION_COLUMNS})
+        SELECT {SESSION_COLUMNS} FROM p1_mb_sessions
+        WHERE id IN ({placeholders})
+    """, session_ids)
+    return responses
+
+
+def _timestamp(value) -> str:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _archive_chunk_to_file(cursor, session_ids: List[str], path: str) -> int:
+    """Append the chunk as one gzip member of bulk-import records; fsync before deleting"""
+    placeholders = _placeholders(session_ids)
+    cursor.execute(f"""
+        SELECT s.id, s.user_id, s.created_at, u.username
+        FROM p1_mb_sessions s
+        JOIN p1_mb_users u ON u.id = s.user_id
+        WHERE s.id IN ({placeholders})
+    """, session_ids)
+    records = {
+        row[0]: {"session_id": row[0], "user_id": row[1], "created_at": _timestamp(row[2]),
+                 "username": row[3], "responses": []}
+        for row in cursor.fetchall()
+    }
+    cursor.execute(f"""
+        SELECT session_id, character_id, character_name, read_passage,
+               responses, analysis, responses_blob, analysis_blob, created_at
+        FROM p1_mb_character_responses
+        WHERE session_id IN ({placeholders})
+        ORDER BY session_id, created_at, id
+    """, session_ids)
+    responses = 0
+    for row in cursor.fetchall():
+        records[row[0]]["responses"].append({
+            "character_id": row[1],
+            "character_name": row[2],
+            "read_passage": bool(row[3]),
+            "responses": decode_field(row[4], row[6]),
+            "analysis": decode_field(row[5], row[7]),
+            "created_at": _timestamp(row[8]),
+        })
+        responses += 1
+
+    with open(path, "ab") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb") as f:
+            for record in records.values():
+                f.write(json.dumps(record).encode("utf-8"))
+                f.write(b"\n")
+        raw.flush()
+        os.fsync(raw.fileno())
+    return responses
+
+
+def archive_sessions(db, archive_after_days: float = 365, to: str = "table",
+                     archive_dir: str = "archive", chunk_size: int = 500,
+                     pause: float = 0.0, progress: bool = False) -> Dict[str, int]:
+    """Move inactive sessions out of the hot tables, `chunk_size` sessions per transaction"""
+    if to not in ("table", "file"):
+        raise ValueError(f"Unknown archive destination: {to!r}")
+    path = None
+    if to == "file":
+        os.makedirs(archive_dir, exist_ok=True)
+        shard = getattr(db, "shard", 0)
+        suffix = f"-shard{shard}" if shard else ""
+        path = os.path.join(archive_dir, f"sessions-{datetime.now():%Y%m%d-%H%M%S}{suffix}.jsonl.gz")
+
+    from_sql = _archive_candidates_sql(db.dialect)
+    totals = {"archived_sessions": 0, "archived_responses": 0}
+    after = None
+    while True:
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            chunk, after = _next_chunk(cursor, from_sql, (archive_after_days * 24,) * 2,
+                                       chunk_size, after)
+            if not chunk:
+                break
+            session_ids = [session_id for session_id, _ in chunk]
+            if to == "table":
+                responses = _archive_chunk_to_tables(cursor, session_ids)
+            else:
+                responses = _archive_chunk_to_file(cursor, session_ids, path)
+            # Responses and summaries follow via ON DELETE CASCADE
+            cursor.execute(
+                f"DELETE FROM p1_mb_sessions WHERE id IN ({_placeholders(session_ids)})",
+                session_ids
+            )
+        _invalidate(db, chunk)
+        totals["archived_sessions"] += len(chunk)
+        totals["archived_responses"] += responses
+        if progress:
+            print(f"Archived {totals['archived_sessions']} sessions "
+                  f"({totals['archived_responses']} responses)")
+        if pause:
+            time.sleep(pause)
+    if path:
+        totals["archive_file"] = path
+    return totals
+
+
+def purge_abandoned(db, abandoned_after_hours: float = 24, chunk_size: int = 500,
+                    pause: float = 0.0, progress: bool = False) -> int:
+    """Delete old sessions that never received a response"""
+    from_sql = _abandoned_sql(db.dialect)
+    purged = 0
+    after = None
+    while True:
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            chunk, after = _next_chunk(cursor, from_sql, (abandoned_after_hours,), chunk_size, after)
+            if not chunk:
+                break
+            session_ids = [session_id for session_id, _ in chunk]
+            # Re-check emptiness in the DELETE in case a response arrived meanwhile
+            cursor.execute(f"""
+                DELETE FROM p1_mb_sessions
+                WHERE id IN ({_placeholders(session_ids)})
+                  AND completed = 0
+                  AND NOT EXISTS (
+                      SELECT 1 FROM p1_mb_character_responses r
+                      WHERE r.session_id = p1_mb_sessions.id
+                  )
+            """, session_ids)
+            deleted = cursor.rowcount
+        _invalidate(db, chunk)
+        purged += deleted
+        if progress:
+            print(f"Purged {purged} abandoned sessions")
+        if pause:
+            time.sleep(pause)
+    return purged
+
+
+def _invalidate(db, chunk: List[Tuple[str, str]]):
+    invalidate = getattr(db, "_invalidate_session", None)
+    if invalidate is not None:
+        for session_id, user_id in chunk:
+            invalidate(session_id, user_id)
+
+
+def run(db, archive_after_days: float = 365, abandoned_after_hours: float = 24,
+        to: str = "table", archive_dir: str = "archive", chunk_size: int = 500,
+        pause: float = 0.0, progress: bool = False) -> Dict[str, int]:
+    """Apply both policies on every shard; returns counts and elapsed seconds"""
+    started = time.perf_counter()
+    totals = {"purged_sessions": 0, "archived_sessions": 0, "archived_responses": 0,
+              "archive_files": []}
+    for shard in _shards(db):
+        totals["purged_sessions"] += purge_abandoned(shard, abandoned_after_hours, chunk_size,
+                                                     pause, progress)
+        archived = archive_sessions(shard, archive_after_days, to, archive_dir, chunk_size,
+                                    pause, progress)
+        totals["archived_sessions"] += archived["archived_sessions"]
+        totals["archived_responses"] += archived["archived_responses"]
+        if "archive_file" in archived:
+            totals["archive_files"].append(archived["archive_file"])
+    totals["seconds"] = time.perf_counter() - started
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive old sessions and purge abandoned ones")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("status", "Show what a run would touch"),
+                            ("run", "Archive and purge")):
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument("--archive-after-days", type=float, default=365,
+                         help="Archive sessions inactive for this long (default: 365)")
+        sub.add_argument("--abandoned-after-hours", type=float, default=24,
+                         help="Purge empty sessions older than this (default: 24)")
+    run_parser = subparsers.choices["run"]
+    run_parser.add_argument("--to", choices=["table", "file"], default="table")
+    run_parser.add_argument("--archive-dir", default="archive")
+    run_parser.add_argument("--chunk-size", type=int, default=500,
+                            help="Sessions per transaction (default: 500)")
+    run_parser.add_argument("--pause", type=float, default=0.0,
+                            help="Seconds to sleep between chunks")
+    args = parser.parse_args()
+
+    from utils.database import Database
+    db = Database()
+
+    if args.command == "status":
+        for key, value in status(db, args.archive_after_days, args.abandoned_after_hours).items():
+            print(f"{key:<22}{value:>10}")
+    elif args.command == "run":
+        totals = run(db, args.archive_after_days, args.abandoned_after_hours, args.to,
+                     args.archive_dir, args.chunk_size, args.pause, progress=True)
+        print(f"Purged {totals['purged_sessions']} abandoned sessions, archived "
+              f"{totals['archived_sessions']} sessions ({totals['archived_responses']} responses) "
+              f"in {totals['seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# utils/score_trend.py
+"""Per-user score trend rollups (p1_mb_user_score_trend).
+
+One row per (user, session, character, metric) holding the sum and count of
+that metric's ratings. Metrics are overall_rating and the `quality_<name>`
+names of utils/rating_histograms.py; a quality row's `label` keeps the
+quality name as the analysis wrote it, for chart labels. Rows are upserted inside the same
+transaction as the response they roll up, so a user's whole history is one
+range scan on the user_id prefix of the primary key, with no analysis blob
+decoded; the dashboard's chart aggregates (utils/session_metrics.py) read
+the same rows by session. `rebuild_trends` recomputes rows from
+p1_mb_character_responses for backfills, bulk imports and shard moves.
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from utils.blob_codec import decode_field
+from utils.rating_histograms import OVERALL_METRIC, quality_column
+
+
+def trend_upsert_sql(dialect: str) -> str:
+    """Upsert adding one rating to a (user, session, character, metric) rollup"""
+    if dialect == "sqlite":
+        return """
+            INSERT INTO p1_mb_user_score_trend
+            (user_id, session_id, character_id, metric, character_name, label, rating_sum, rating_count)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, 1)
+            ON CONFLICT(user_id, session_id, character_id, metric) DO UPDATE SET
+                rating_sum = rating_sum + excluded.rating_sum,
+                rating_count = rating_count + 1
+        """
+    return """
+        INSERT INTO p1_mb_user_score_trend
+        (user_id, session_id, character_id, metric, character_name, label, rating_sum, rating_count)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, 1)
+        ON DUPLICATE KEY UPDATE
+            rating_sum = rating_sum + VALUES(rating_sum),
+            rating_count = rating_count + 1
+    """
+
+
+def trend_params(user_id: str, session_id: str, character_id: int, character_name: str,
+                 analysis: Dict) -> List[Tuple]:
+    """Parameters for trend_upsert_sql, one tuple per rating in an analysis"""
+    rows = []
+    if isinstance(analysis.get("overall_rating"), (int, float)):
+        rows.append((user_id, session_id, character_id, OVERALL_METRIC, character_name, None,
+                     float(analysis["overall_rating"])))
+    for name, value in (analysis.get("quality_ratings") or {}).items():
+        if isinstance(value, (int, float)):
+            rows.append((user_id, session_id, character_id, quality_column(name), character_name, name,
+                         float(value)))
+    return rows
+
+
+def rebuild_trends(cursor, session_ids: List[str] = None, batch_size: int = 500) -> int:
+    """Recompute the rollups of `session_ids` (every session when None); returns rows written"""
+    if session_ids is None:
+        cursor.execute("SELECT DISTINCT session_id FROM p1_mb_character_responses")
+        session_ids = [row[0] if not isinstance(row, dict) else row["session_id"]
+                       for row in cursor.fetchall()]
+
+    written = 0
+    for start in range(0, len(session_ids), batch_size):
+        batch = list(session_ids[start:start + batch_size])
+        placeholders = ", ".join(["%s"] * len(batch))
+        cursor.execute(f"""
+            SELECT s.user_id, r.session_id, r.character_id, r.character_name, r.analysis, r.analysis_blob
+            FROM p1_mb_character_responses r
+            JOIN p1_mb_sessions s ON s.id = r.session_id
+            WHERE r.session_id IN ({placeholders})
+        """, batch)
+        rollups: Dict[Tuple, List] = {}
+        for row in cursor.fetchall():
+            if isinstance(row, dict):
+                row = tuple(row.values())
+            user_id, session_id, character_id, character_name, analysis, analysis_blob = row
+            for *key, name, label, rating in trend_params(user_id, session_id, character_id, character_name,
+                                                          decode_field(analysis, analysis_blob)):
+                rollup = rollups.setdefault(tuple(key), [name, label, 0.0, 0])
+                rollup[2] += rating
+                rollup[3] += 1
+        cursor.execute(f"DELETE FROM p1_mb_user_score_trend WHERE session_id IN ({placeholders})", batch)
+        if rollups:
+            cursor.executemany("""
+                INSERT INTO p1_mb_user_score_trend
+                (user_id, session_id, character_id, metric, character_name, label, rating_sum, rating_count)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """, [key + tuple(value) for key, value in rollups.items()])
+        written += len(rollups)
+    return written
+
+
+def build_trend(rows: Iterable[Dict]) -> List[Dict]:
+    """Fold rollup rows, grouped by session, into one point per session, oldest first.
+
+    Each point has the session's "overall" rating (mean over characters),
+    its mean "qualities" by metric name, and per-character "characters"
+    overall ratings by character name.
+    """
+    points: Dict[str, Dict] = {}
+    totals: Dict[str, Dict[str, List[float]]] = defaultdict(lambda: defaultdict(lambda: [0.0, 0]))
+    for row in rows:
+        point = points.get(row["session_id"])
+        if point is None:
+            point = points[row["session_id"]] = {
+                "session_id": row["session_id"],
+                "created_at": row["created_at"],
+                "overall": None,
+                "qualities": {},
+                "characters": {},
+            }
+        mean = float(row["rating_sum"]) / row["rating_count"]
+        if row["metric"] == OVERALL_METRIC:
+            point["characters"][row["character_name"]] = mean
+        total = totals[row["session_id"]][row["metric"]]
+        total[0] += float(row["rating_sum"])
+        total[1] += row["rating_count"]
+
+    for session_id, point in points.items():
+        for metric, (rating_sum, rating_count) in totals[session_id].items():
+            if metric == OVERALL_METRIC:
+                point["overall"] = rating_sum / rating_count
+            else:
+                point["qualities"][metric] = rating_sum / rating_count
+    return sorted(points.values(), key=lambda point: (point["created_at"], point["session_id"]))
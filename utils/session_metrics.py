@@ -0,0 +1,194 @@
+# utils/session_metrics.py
+"""Per-session rating aggregates for the dashboard comparison charts.
+
+The charts need each character's overall rating and the mean of each
+quality across a session's characters. Database.get_sessions_metrics
+computes both in SQL over p1_mb_user_score_trend (utils/score_trend.py),
+which already holds the rating sums per session, character and metric, so
+a session transfers a few dozen numbers instead of its analysis documents.
+The rollup table serves both backends, and unlike JSON_EXTRACT over the
+analysis column it also covers rows stored as compact blobs
+(utils/blob_codec.py).
+
+`from_responses` is the Python path over decoded analyses; the dashboard
+falls back to it while a session's newest responses are still in the
+outbox. Both paths group qualities by their quality_column metric and label
+each with the name the analyses used (the rollup's `label` column), taking
+the smallest when spellings differ, so the charts read as they did when
+they were built from the analyses.
+
+    python -m utils.session_metrics benchmark --rows 6 600 60000
+"""
+import argparse
+import time
+from typing import Any, Dict, List, Tuple
+
+from utils.rating_histograms import OVERALL_METRIC, quality_column
+
+
+# Every quality_<name> metric; '!' escapes LIKE's '_' wildcard the same way on MySQL and SQLite
+QUALITY_PATTERN = "quality!_%"
+
+
+OVERALL_SELECT = """
+    SELECT session_id, character_id, character_name, rating_sum / rating_count AS rating
+    FROM p1_mb_user_score_trend
+    WHERE session_id IN ({marks}) AND metric = %s
+    ORDER BY session_id, character_id
+"""
+
+QUALITY_SELECT = """
+    SELECT session_id, metric, MIN(label) AS label, SUM(rating_sum) / SUM(rating_count) AS rating
+    FROM p1_mb_user_score_trend
+    WHERE session_id IN ({marks}) AND metric LIKE %s ESCAPE '!'
+    GROUP BY session_id, metric
+"""
+
+
+def empty() -> Dict[str, Dict[str, float]]:
+    return {"characters": {}, "qualities": {}}
+
+
+def queries(session_ids: List[str]) -> List[Tuple[str, tuple]]:
+    """(SQL, params) of the two aggregate queries for `session_ids`"""
+    marks = ", ".join(["%s"] * len(session_ids))
+    return [
+        (OVERALL_SELECT.format(marks=marks), tuple(session_ids) + (OVERALL_METRIC,)),
+        (QUALITY_SELECT.format(marks=marks), tuple(session_ids) + (QUALITY_PATTERN,)),
+    ]
+
+
+def fold(overall_rows: List[Dict], quality_rows: List[Dict]) -> Dict[str, Dict]:
+    """{session_id: {"characters": {name: rating}, "qualities": {label: mean}}} from query rows"""
+    metrics: Dict[str, Dict] = {}
+    for row in overall_rows:
+        metrics.setdefault(row["session_id"], empty())["characters"][row["character_name"]] = float(row["rating"])
+    for row in quality_rows:
+        label = row["label"] or row["metric"][len("quality_"):]
+        metrics.setdefault(row["session_id"], empty())["qualities"][label] = float(row["rating"])
+    return metrics
+
+
+def load(cursor, session_ids: List[str]) -> Dict[str, Dict]:
+    """Aggregates of `session_ids` (on one shard) with a dictionary cursor"""
+    rows = []
+    for sql, params in queries(session_ids):
+        cursor.execute(sql, params)
+        rows.append(cursor.fetchall())
+    return fold(*rows)
+
+
+def from_responses(responses: List[Dict]) -> Dict[str, Dict[str, float]]:
+    """The same aggregates computed in Python from decoded analyses"""
+    characters, totals = {}, {}
+    for response in sorted(responses, key=lambda r: r['character_id']):
+        analysis = response['analysis']
+        if isinstance(analysis.get('overall_rating'), (int, float)):
+            characters[response['character_name']] = float(analysis['overall_rating'])
+        for name, value in (analysis.get('quality_ratings') or {}).items():
+            if isinstance(value, (int, float)):
+                total = totals.setdefault(quality_column(name), [name, 0.0, 0])
+                total[0] = min(total[0], name)
+                total[1] += value
+                total[2] += 1
+    return {
+        "characters": characters,
+        "qualities": {label: s / n for _, (label, s, n) in sorted(totals.items())},
+    }
+
+
+def for_responses(metrics: Dict, responses: List[Dict]) -> Dict[str, Dict[str, float]]:
+    """`metrics` if it covers every response, otherwise aggregates of `responses` themselves"""
+    if metrics and len(metrics["characters"]) == len(responses):
+        return metrics
+    return from_responses(responses)
+
+
+def _payload_bytes(rows: List[Dict]) -> int:
+    """Approximate bytes transferred for fetched rows"""
+    return sum(len(value) if isinstance(value, (str, bytes)) else 8
+               for row in rows for value in row.values() if value is not None)
+
+
+def benchmark(db, sizes: List[int], repeat: int = 3) -> List[Dict[str, Any]]:
+    """Time the dashboard aggregates over `size` response rows (size / 6 complete sessions),
+    decoding analyses in Python versus aggregating in SQL, on the primary of shard 0"""
+    from utils.database import BATCH_RESPONSES_SELECT, BATCH_SIZE
+    from utils.response_rows import ResponseRow
+
+    with db.get_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT id FROM p1_mb_sessions WHERE completed = 6 ORDER BY id LIMIT %s",
+                       (max(sizes) // 6,))
+        complete = [row["id"] for row in cursor.fetchall()]
+
+    results = []
+    for size in sizes:
+        session_ids = complete[:max(1, size // 6)]
+        timings = {"python": [], "sql": []}
+        payload = {"python": 0, "sql": 0}
+        for _ in range(repeat):
+            with db.get_connection() as conn:
+                cursor = conn.cursor(dictionary=True)
+
+                started = time.perf_counter()
+                payload["python"] = 0
+                for start in range(0, len(session_ids), BATCH_SIZE):
+                    chunk = session_ids[start:start + BATCH_SIZE]
+                    cursor.execute(
+                        f"{BATCH_RESPONSES_SELECT} WHERE session_id IN ({', '.join(['%s'] * len(chunk))}) "
+                        "ORDER BY session_id, created_at, id",
+                        chunk
+                    )
+                    rows = cursor.fetchall()
+                    payload["python"] += _payload_bytes(rows)
+                    by_session: Dict[str, List] = {}
+                    for row in rows:
+                        by_session.setdefault(row["session_id"], []).append(ResponseRow.from_row(row))
+                    for responses in by_session.values():
+                        from_responses(responses)
+                timings["python"].append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                payload["sql"] = 0
+                for start in range(0, len(session_ids), BATCH_SIZE):
+                    fetched = []
+                    for sql, params in queries(session_ids[start:start + BATCH_SIZE]):
+                        cursor.execute(sql, params)
+                        fetched.append(cursor.fetchall())
+                    payload["sql"] += sum(_payload_bytes(rows) for rows in fetched)
+                    fold(*fetched)
+                timings["sql"].append(time.perf_counter() - started)
+
+        results.append({
+            "rows": len(session_ids) * 6,
+            "sessions": len(session_ids),
+            "python_ms": min(timings["python"]) * 1000,
+            "sql_ms": min(timings["sql"]) * 1000,
+            "python_kb": payload["python"] / 1024,
+            "sql_kb": payload["sql"] / 1024,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dashboard rating aggregates")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    bench_parser = subparsers.add_parser("benchmark", help="Compare Python and SQL aggregation")
+    bench_parser.add_argument("--rows", type=int, nargs="+", default=[6, 600, 60000],
+                              help="Response rows per run (complete sessions of 6 characters)")
+    bench_parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    from utils.database import Database
+    db = Database()
+
+    if args.command == "benchmark":
+        print(f"{'rows':>8}{'sessions':>10}{'python ms':>12}{'sql ms':>10}{'python KiB':>12}{'sql KiB':>10}")
+        for r in benchmark(db, args.rows, args.repeat):
+            print(f"{r['rows']:>8}{r['sessions']:>10}{r['python_ms']:>12.1f}{r['sql_ms']:>10.1f}"
+                  f"{r['python_kb']:>12.1f}{r['sql_kb']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# utils/session_summary.py
+"""Materialized per-session summary (p1_mb_session_summary).
+
+One narrow row per session holding what the dashboard header, session list
+and PDF report otherwise re-derive from every analysis blob: completed
+count, average and best overall rating, and total strengths. The row is
+upserted inside save_character_response's transaction; `rebuild_summaries`
+recomputes rows from p1_mb_character_responses for backfills and bulk
+imports.
+"""
+import json
+from typing import Dict, Iterable, List
+
+from utils.blob_codec import decode_blob
+
+
+def summary_upsert_sql(dialect: str) -> str:
+    """Upsert adding one response (rating, character, strengths) to a session's summary"""
+    if dialect == "sqlite":
+        # SQLite evaluates every SET expression against the old row
+        return """
+            INSERT INTO p1_mb_session_summary
+            (session_id, completed, rating_sum, avg_rating, best_character_id,
+             best_character_name, best_rating, strength_count, last_activity)
+            VALUES (%s, 1, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+            ON CONFLICT(session_id) DO UPDATE SET
+                best_character_id = CASE WHEN excluded.best_rating > best_rating
+                    THEN excluded.best_character_id ELSE best_character_id END,
+                best_character_name = CASE WHEN excluded.best_rating > best_rating
+                    THEN excluded.best_character_name ELSE best_character_name END,
+                best_rating = MAX(best_rating, excluded.best_rating),
+                avg_rating = (rating_sum + excluded.rating_sum) / (completed + 1),
+                rating_sum = rating_sum + excluded.rating_sum,
+                completed = completed + 1,
+                strength_count = strength_count + excluded.strength_count,
+                last_activity = excluded.last_activity
+        """
+    # MySQL applies assignments left to right, so later ones see earlier updates
+    return """
+        INSERT INTO p1_mb_session_summary
+        (session_id, completed, rating_sum, avg_rating, best_character_id,
+         best_character_name, best_rating, strength_count, last_activity)
+        VALUES (%s, 1, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+        ON DUPLICATE KEY UPDATE
+            best_character_id = IF(VALUES(best_rating) > best_rating,
+                VALUES(best_character_id), best_character_id),
+            best_character_name = IF(VALUES(best_rating) > best_rating,
+                VALUES(best_character_name), best_character_name),
+            best_rating = GREATEST(best_rating, VALUES(best_rating)),
+            completed = completed + 1,
+            rating_sum = rating_sum + VALUES(rating_sum),
+            avg_rating = rating_sum / completed,
+            strength_count = strength_count + VALUES(strength_count),
+            last_activity = VALUES(last_activity)
+    """
+
+
+def overall_rating(analysis: Dict) -> float:
+    """An analysis's overall rating, 0 when it is missing or not a number ("N/A")"""
+    rating = analysis.get('overall_rating')
+    return float(rating) if isinstance(rating, (int, float)) else 0.0
+
+
+def summary_params(session_id: str, character_id: int, character_name: str, analysis: Dict):
+    """Parameters for summary_upsert_sql from one saved response"""
+    rating = overall_rating(analysis)
+    strengths = len(analysis.get('strengths', []) or [])
+    return (session_id, rating, rating, character_id, character_name, rating, strengths)
+
+
+def summarize(rows: Iterable[Dict]) -> Dict[str, Dict]:
+    """Fold response rows (ordered by created_at) into summaries keyed by session_id"""
+    summaries = {}
+    for row in rows:
+        analysis = row["analysis"]
+        if row.get("analysis_blob") is not None:
+            analysis = decode_blob(row["analysis_blob"])
+        elif isinstance(analysis, (str, bytes)):
+            analysis = json.loads(analysis)
+        rating = overall_rating(analysis)
+
+        summary = summaries.get(row["session_id"])
+        if summary is None:
+            summary = summaries[row["session_id"]] = {
+                "session_id": row["session_id"],
+                "completed": 0,
+                "rating_sum": 0.0,
+                "best_character_id": None,
+                "best_character_name": None,
+                "best_rating": None,
+                "strength_count": 0,
+                "last_activity": None,
+            }
+        summary["completed"] += 1
+        summary["rating_sum"] += rating
+        summary["strength_count"] += len(analysis.get('strengths', []) or [])
+        # Strict > keeps the first character on ties, like max() over the list
+        if summary["best_rating"] is None or rating > summary["best_rating"]:
+            summary["best_rating"] = rating
+            summary["best_character_id"] = row["character_id"]
+            summary["best_character_name"] = row["character_name"]
+        if summary["last_activity"] is None or row["created_at"] > summary["last_activity"]:
+            summary["last_activity"] = row["created_at"]
+
+    for summary in summaries.values():
+        summary["avg_rating"] = summary["rating_sum"] / summary["completed"]
+    return summaries
+
+
+def _write_summaries(cursor, summaries: Iterable[Dict]):
+    rows = [
+        (s["session_id"], s["completed"], s["rating_sum"], s["avg_rating"],
+         s["best_character_id"], s["best_character_name"], s["best_rating"],
+         s["strength_count"], s["last_activity"])
+        for s in summaries
+    ]
+    if rows:
+        cursor.executemany("""
+            REPLACE INTO p1_mb_session_summary
+            (session_id, completed, rating_sum, avg_rating, best_character_id,
+             best_character_name, best_rating, strength_count, last_activity)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, rows)
+
+
+def _fetch_dicts(cursor) -> List[Dict]:
+    rows = cursor.fetchall()
+    if rows and not isinstance(rows[0], dict):
+        columns = [d[0] for d in cursor.description]
+        rows = [dict(zip(columns, row)) for row in rows]
+    return rows
+
+
+def rebuild_summaries(cursor, session_ids: List[str] = None, batch_size: int = 500) -> int:
+    """Recompute summary rows from p1_mb_character_responses.
+
+    With `session_ids`, only those sessions are rebuilt; otherwise every
+    session with responses is, `batch_size` sessions at a time. Works with
+    plain or dictionary cursors. Returns the number of summaries written.
+    """
+    if session_ids is None:
+        cursor.execute("SELECT DISTINCT session_id FROM p1_mb_character_responses")
+        session_ids = [row["session_id"] for row in _fetch_dicts(cursor)]
+
+    written = 0
+    for start in range(0, len(session_ids), batch_size):
+        batch = list(session_ids[start:start + batch_size])
+        placeholders = ", ".join(["%s"] * len(batch))
+        cursor.execute(f"""
+            SELECT session_id, character_id, character_name, analysis, analysis_blob, created_at
+            FROM p1_mb_character_responses
+            WHERE session_id IN ({placeholders})
+            ORDER BY session_id, created_at, id
+        """, batch)
+        summaries = summarize(_fetch_dicts(cursor))
+        _write_summaries(cursor, summaries.values())
+        written += len(summaries)
+    return written
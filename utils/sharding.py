@@ -0,0 +1,476 @@
+# utils/sharding.py
+"""Hash sharding of per-user data across several databases.
+
+DATABASE_URL is shard 0 and DATABASE_SHARD_URLS lists shards 1..N
+(comma-separated; only ever append, a shard's number is its position).
+Every user hashes to one of NUM_BUCKETS virtual buckets (`user_bucket`),
+and p1_mb_shard_map on shard 0 assigns buckets to shards; buckets it does
+not list live on shard 0, so adding shard URLs by itself moves nothing.
+A user's row, sessions, responses and session summaries all live on the
+shard owning the user's bucket.
+
+Session ids from `new_session_id` are version-8 UUIDs whose first three
+hex digits are the owner's bucket, so a session is routed from its id
+alone. Older random (version-4) ids are looked up on each shard once and
+remembered.
+
+Shard 0 also keeps the global tables: p1_mb_user_directory (username ->
+user id, which keeps usernames unique across shards), the population
+rating histograms and the p1_mb_characters catalogue.
+
+`rebalance` moves every bucket whose shard differs from the target layout
+(bucket % number of shards) online, a batch of buckets at a time:
+
+1. copy the buckets' rows to their new shard while they stay live;
+2. mark them moving - writers wait, up to SHARD_MOVE_WAIT seconds - and
+   let SHARD_MAP_TTL pass so every process has seen the mark;
+3. copy the responses written during step 1, then point the map at the
+   new shard and clear the mark;
+4. once SHARD_MAP_TTL has passed again, delete the source rows.
+
+Archived sessions stay on the shard that archived them.
+
+    python -m utils.sharding status
+    python -m utils.sharding rebalance [--batch 32] [--limit N] [--dry-run]
+"""
+import argparse
+import hashlib
+import random
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.answer_search import rebuild_search
+from utils.score_trend import rebuild_trends
+from utils.session_summary import rebuild_summaries
+
+
+NUM_BUCKETS = 1024
+LEGACY_CACHE_SIZE = 100000
+# Extra seconds on top of SHARD_MAP_TTL for writes already in flight
+MOVE_GRACE = 2.0
+
+USER_INSERT_SQL = """
+    INSERT INTO p1_mb_users (id, username, password, shard_bucket)
+    VALUES (%s, %s, %s, %s)
+"""
+
+DIRECTORY_INSERT_SQL = """
+    INSERT INTO p1_mb_user_directory (username, user_id) VALUES (%s, %s)
+"""
+
+USER_COLUMNS = "id, username, password, created_at, shard_bucket"
+RESPONSE_COLUMNS = (
+    "session_id, character_id, character_name, read_passage, "
+    "responses, analysis, responses_blob, analysis_blob, created_at"
+)
+
+
+def user_bucket(user_id: str) -> int:
+    """Virtual bucket of a user (a stable hash, unlike Python's salted hash())"""
+    digest = hashlib.blake2b(str(user_id).encode("utf-8"), digest_size=4).digest()
+    return int.from_bytes(digest, "big") % NUM_BUCKETS
+
+
+def new_session_id(user_id: str, rng: random.Random = None) -> str:
+    """Random session id carrying the owner's bucket in its first three hex digits
+    (drawn from `rng` when given, for reproducible ids)"""
+    digits = (uuid.UUID(int=rng.getrandbits(128), version=4) if rng is not None else uuid.uuid4()).hex
+    digits = f"{user_bucket(user_id):03x}" + digits[3:12] + "8" + digits[13:]
+    return str(uuid.UUID(hex=digits))
+
+
+def bucket_from_session_id(session_id: str) -> Optional[int]:
+    """Bucket encoded by new_session_id; None for any other id"""
+    try:
+        parsed = uuid.UUID(str(session_id))
+    except ValueError:
+        return None
+    if parsed.version != 8:
+        return None
+    bucket = int(parsed.hex[:3], 16)
+    return bucket if bucket < NUM_BUCKETS else None
+
+
+def target_shard(bucket: int, shards: int) -> int:
+    return bucket % shards
+
+
+def _insert_ignore(dialect: str) -> str:
+    return "INSERT OR IGNORE" if dialect == "sqlite" else "INSERT IGNORE"
+
+
+def _placeholders(values) -> str:
+    return ", ".join(["%s"] * len(values))
+
+
+class ShardRouter:
+    """Map users and sessions to shard numbers (indexes into `backends`)"""
+
+    def __init__(self, backends: List, map_ttl: float = 5.0, move_wait: float = 30.0):
+        self.backends = list(backends)
+        self.map_ttl = map_ttl
+        self.move_wait = move_wait
+        self._map: Dict[int, Tuple[int, bool]] = {}
+        self._loaded_at = float("-inf")
+        self._legacy: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._stats = {"map_loads": 0, "legacy_lookups": 0, "move_waits": 0}
+
+    @property
+    def sharded(self) -> bool:
+        return len(self.backends) > 1
+
+    def reload(self):
+        """Re-read p1_mb_shard_map from shard 0"""
+        with self.backends[0].connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT bucket, shard, moving FROM p1_mb_shard_map")
+            entries = {row[0]: (row[1], bool(row[2])) for row in cursor.fetchall()}
+        with self._lock:
+            self._map = entries
+            self._loaded_at = time.monotonic()
+            self._stats["map_loads"] += 1
+
+    def owner(self, bucket: int) -> Tuple[int, bool]:
+        """(shard, moving) for a bucket, from a map at most map_ttl seconds old"""
+        if time.monotonic() - self._loaded_at >= self.map_ttl:
+            # One thread reloads; the others keep the previous map unless there is none yet
+            if self._reload_lock.acquire(blocking=self._loaded_at == float("-inf")):
+                try:
+                    self.reload()
+                finally:
+                    self._reload_lock.release()
+        shard, moving = self._map.get(bucket, (0, False))
+        if shard >= len(self.backends):
+            raise RuntimeError(
+                f"Bucket {bucket} is on shard {shard}, but only {len(self.backends)} shards are configured"
+            )
+        return shard, moving
+
+    def shard_of_bucket(self, bucket: int, write: bool = False) -> int:
+        """Shard owning `bucket`; writers wait while the bucket is being moved"""
+        if not self.sharded:
+            return 0
+        shard, moving = self.owner(bucket)
+        if not (write and moving):
+            return shard
+        with self._lock:
+            self._stats["move_waits"] += 1
+        deadline = time.monotonic() + self.move_wait
+        while moving:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Shard bucket {bucket} is being moved; try again shortly")
+            time.sleep(0.2)
+            self.reload()
+            shard, moving = self.owner(bucket)
+        return shard
+
+    def shard_of_user(self, user_id: str, write: bool = False) -> int:
+        if not self.sharded:
+            return 0
+        return self.shard_of_bucket(user_bucket(user_id), write)
+
+    def session_bucket(self, session_id: str) -> Optional[int]:
+        """Bucket of a session: from its id, or for older ids from whichever shard has it"""
+        bucket = bucket_from_session_id(session_id)
+        if bucket is not None:
+            return bucket
+        bucket = self._legacy.get(session_id)
+        if bucket is not None:
+            return bucket
+        with self._lock:
+            self._stats["legacy_lookups"] += 1
+        for backend in self.backends:
+            with backend.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT u.shard_bucket
+                    FROM p1_mb_sessions s
+                    JOIN p1_mb_users u ON u.id = s.user_id
+                    WHERE s.id = %s
+                """, (session_id,))
+                row = cursor.fetchone()
+            if row and row[0] is not None:
+                with self._lock:
+                    if len(self._legacy) >= LEGACY_CACHE_SIZE:
+                        self._legacy.clear()
+                    self._legacy[session_id] = row[0]
+                return row[0]
+        return None
+
+    def shard_of_session(self, session_id: str, write: bool = False) -> int:
+        """Shard holding a session (shard 0 for ids found nowhere)"""
+        if not self.sharded:
+            return 0
+        bucket = self.session_bucket(session_id)
+        return 0 if bucket is None else self.shard_of_bucket(bucket, write)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = dict(self._stats)
+            buckets = [0] * len(self.backends)
+            for bucket in range(NUM_BUCKETS):
+                shard = self._map.get(bucket, (0, False))[0]
+                if shard < len(buckets):
+                    buckets[shard] += 1
+            snapshot.update(
+                shards=len(self.backends),
+                buckets_per_shard=buckets,
+                moving_buckets=sum(1 for _, moving in self._map.values() if moving),
+                legacy_sessions_cached=len(self._legacy),
+            )
+        return snapshot
+
+
+class ShardView:
+    """One shard of a Database, for maintenance code written against a single
+    database (utils.migrations, utils.retention, utils.bulk_import)"""
+
+    def __init__(self, db, shard: int):
+        self.db = db
+        self.shard = shard
+        self.backend = db.shards.backends[shard]
+        self.dialect = self.backend.dialect
+        self.key = self.backend.key
+        self.blob_format = db.blob_format
+
+    def get_connection(self, query: str = None):
+        return self.db.get_connection(query, shard=self.shard)
+
+    def get_read_connection(self, *keys, query: str = None):
+        return self.db.get_read_connection(*keys, query=query, shard=self.shard)
+
+    def _invalidate_session(self, session_id: str, user_id: str = None):
+        self.db._invalidate_session(session_id, user_id)
+
+
+_routers: Dict[Any, ShardRouter] = {}
+_routers_lock = threading.Lock()
+
+
+def get_router(key, factory: Callable[[], ShardRouter]) -> ShardRouter:
+    """Return the process-wide shard router for `key`, creating it on first use"""
+    router = _routers.get(key)
+    if router is None:
+        with _routers_lock:
+            router = _routers.get(key)
+            if router is None:
+                router = factory()
+                _routers[key] = router
+    return router
+
+
+# Rebalancing
+
+def plan(db) -> List[Tuple[int, int, int]]:
+    """(bucket, current shard, target shard) for every bucket not where it belongs"""
+    router = db.shards
+    router.reload()
+    moves = []
+    for bucket in range(NUM_BUCKETS):
+        current, _ = router.owner(bucket)
+        target = target_shard(bucket, len(router.backends))
+        if current != target:
+            moves.append((bucket, current, target))
+    return moves
+
+
+def _set_map(db, owners: Dict[int, int], moving: bool):
+    if db.dialect == "sqlite":
+        sql = """
+            INSERT INTO p1_mb_shard_map (bucket, shard, moving) VALUES (%s, %s, %s)
+            ON CONFLICT(bucket) DO UPDATE SET shard = excluded.shard, moving = excluded.moving
+        """
+    else:
+        sql = """
+            INSERT INTO p1_mb_shard_map (bucket, shard, moving) VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE shard = VALUES(shard), moving = VALUES(moving)
+        """
+    with db.get_connection(query="shard_map") as conn:
+        conn.cursor().executemany(sql, [(bucket, shard, int(moving)) for bucket, shard in owners.items()])
+    db.shards.reload()
+
+
+def _session_upsert_sql(dialect: str) -> str:
+    if dialect == "sqlite":
+        return """
+            INSERT INTO p1_mb_sessions (id, user_id, created_at, completed) VALUES (%s, %s, %s, %s)
+            ON CONFLICT(id) DO UPDATE SET completed = excluded.completed
+        """
+    return """
+        INSERT INTO p1_mb_sessions (id, user_id, created_at, completed) VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE completed = VALUES(completed)
+    """
+
+
+def _copy_bucket(db, bucket: int, source: int, target: int, after_id: int = 0,
+                 fresh: bool = True, fetch_size: int = 1000) -> Tuple[int, int]:
+    """Copy a bucket's users and sessions, and its responses with id > after_id.
+
+    With `fresh`, the target's rows for the bucket are deleted first, so a
+    restarted move never duplicates responses. Returns (last source
+    response id copied, responses copied).
+    """
+    target_dialect = db.shards.backends[target].dialect
+    with db.get_connection("rebalance", shard=source) as src, \
+            db.get_connection("rebalance", shard=target) as dst:
+        read, write = src.cursor(), dst.cursor()
+        if fresh:
+            # Sessions, responses and summaries follow via ON DELETE CASCADE
+            write.execute("DELETE FROM p1_mb_users WHERE shard_bucket = %s", (bucket,))
+
+        read.execute(f"SELECT {USER_COLUMNS} FROM p1_mb_users WHERE shard_bucket = %s", (bucket,))
+        write.executemany(
+            f"{_insert_ignore(target_dialect)} INTO p1_mb_users ({USER_COLUMNS}) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            [tuple(row) for row in read.fetchall()]
+        )
+
+        bucket_sessions = """
+            SELECT s.id, s.user_id, s.created_at, s.completed
+            FROM p1_mb_sessions s
+            JOIN p1_mb_users u ON u.id = s.user_id
+            WHERE u.shard_bucket = %s
+        """
+        read.execute(bucket_sessions, (bucket,))
+        sessions = [tuple(row) for row in read.fetchall()]
+        write.execute(bucket_sessions, (bucket,))
+        deleted = sorted({row[0] for row in write.fetchall()} - {s[0] for s in sessions})
+        for start in range(0, len(deleted), 500):
+            chunk = deleted[start:start + 500]
+            write.execute(f"DELETE FROM p1_mb_sessions WHERE id IN ({_placeholders(chunk)})", chunk)
+        write.executemany(_session_upsert_sql(target_dialect), sessions)
+
+        read.execute(f"""
+            SELECT r.id, {', '.join('r.' + c.strip() for c in RESPONSE_COLUMNS.split(','))}
+            FROM p1_mb_character_responses r
+            JOIN p1_mb_sessions s ON s.id = r.session_id
+            JOIN p1_mb_users u ON u.id = s.user_id
+            WHERE u.shard_bucket = %s AND r.id > %s
+            ORDER BY r.id
+        """, (bucket, after_id))
+        last_id, copied, touched = after_id, 0, set()
+        while True:
+            rows = read.fetchmany(fetch_size)
+            if not rows:
+                break
+            # Response ids are per-shard counters, so the target assigns its own
+            write.executemany(
+                f"INSERT INTO p1_mb_character_responses ({RESPONSE_COLUMNS}) "
+                "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                [tuple(row[1:]) for row in rows]
+            )
+            last_id = rows[-1][0]
+            copied += len(rows)
+            touched.update(row[1] for row in rows)
+        rebuild_summaries(write, sorted(touched))
+        rebuild_trends(write, sorted(touched))
+        rebuild_search(write, sorted(touched))
+    return last_id, copied
+
+
+def _drop_bucket(db, bucket: int, shard: int):
+    with db.get_connection("rebalance", shard=shard) as conn:
+        conn.cursor().execute("DELETE FROM p1_mb_users WHERE shard_bucket = %s", (bucket,))
+
+
+def rebalance(db, batch: int = 32, limit: int = None, progress: bool = False) -> Dict[str, Any]:
+    """Move misplaced buckets to their target shard, `batch` buckets at a time"""
+    moves = plan(db)
+    if limit is not None:
+        moves = moves[:limit]
+    grace = db.shards.map_ttl + MOVE_GRACE
+    totals = {"buckets": 0, "responses": 0}
+    started = time.perf_counter()
+
+    for start in range(0, len(moves), batch):
+        group = moves[start:start + batch]
+        # 1. Bulk copy while the buckets stay live on their source
+        copied = {}
+        for bucket, source, target in group:
+            copied[bucket] = _copy_bucket(db, bucket, source, target)
+
+        # 2. Hold writes until every process has seen the mark
+        _set_map(db, {bucket: source for bucket, source, _ in group}, moving=True)
+        try:
+            time.sleep(grace)
+            # 3. Catch up, then switch owners
+            for bucket, source, target in group:
+                last_id, count = copied[bucket]
+                _, extra = _copy_bucket(db, bucket, source, target, after_id=last_id, fresh=False)
+                totals["responses"] += count + extra
+            _set_map(db, {bucket: target for bucket, _, target in group}, moving=False)
+        except Exception:
+            _set_map(db, {bucket: source for bucket, source, _ in group}, moving=False)
+            raise
+
+        # 4. Drop the source copies once no process can still route to them
+        time.sleep(grace)
+        for bucket, source, _ in group:
+            _drop_bucket(db, bucket, source)
+        totals["buckets"] += len(group)
+        if progress:
+            print(f"Moved {totals['buckets']}/{len(moves)} buckets ({totals['responses']} responses)")
+
+    totals["seconds"] = time.perf_counter() - started
+    return totals
+
+
+def status(db) -> Dict[str, Any]:
+    """Row counts per shard plus how many buckets still need to move"""
+    shards = []
+    for view in db.shard_views():
+        with view.get_connection("shard_status") as conn:
+            cursor = conn.cursor()
+            counts = {}
+            for name, table in (("users", "p1_mb_users"), ("sessions", "p1_mb_sessions"),
+                                ("responses", "p1_mb_character_responses")):
+                cursor.execute(f"SELECT COUNT(*) FROM {table}")
+                counts[name] = cursor.fetchone()[0]
+        shards.append(counts)
+    moves = plan(db)
+    router_stats = db.shards.stats()
+    return {"shards": shards, "buckets_per_shard": router_stats["buckets_per_shard"],
+            "moving_buckets": router_stats["moving_buckets"], "pending_moves": len(moves)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and rebalance hash-sharded storage")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("status", help="Show row counts per shard and pending bucket moves")
+    rebalance_parser = subparsers.add_parser("rebalance", help="Move buckets to their target shard")
+    rebalance_parser.add_argument("--batch", type=int, default=32,
+                                  help="Buckets moved per freeze window (default: 32)")
+    rebalance_parser.add_argument("--limit", type=int, default=None,
+                                  help="Move at most this many buckets")
+    rebalance_parser.add_argument("--dry-run", action="store_true",
+                                  help="Only list the moves")
+    args = parser.parse_args()
+
+    from utils.database import Database
+    db = Database()
+
+    if args.command == "status":
+        info = status(db)
+        for shard, counts in enumerate(info["shards"]):
+            print(f"shard {shard}: {info['buckets_per_shard'][shard]:>5} buckets  "
+                  f"{counts['users']:>9} users  {counts['sessions']:>9} sessions  "
+                  f"{counts['responses']:>10} responses")
+        print(f"pending bucket moves: {info['pending_moves']} (moving now: {info['moving_buckets']})")
+    elif args.command == "rebalance":
+        if args.dry_run:
+            moves = plan(db)[:args.limit] if args.limit is not None else plan(db)
+            for bucket, source, target in moves:
+                print(f"bucket {bucket:>4}: shard {source} -> shard {target}")
+            print(f"{len(moves)} buckets to move")
+            return
+        totals = rebalance(db, args.batch, args.limit, progress=True)
+        print(f"Moved {totals['buckets']} buckets ({totals['responses']} responses) "
+              f"in {totals['seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
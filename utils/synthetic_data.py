@@ -0,0 +1,276 @@
+# utils/synthetic_data.py
+"""Seeded synthetic assessments for load-testing the storage layer.
+
+`generate_records` yields session records in the format of
+utils/bulk_import.py, and the CLI streams them through `bulk_import` into
+DATABASE_URL (MySQL, or a local SQLite file as a stand-in) or into a JSONL
+file. Every choice is drawn from one random.Random(seed), so the same
+arguments reproduce the same users, session ids, answers and ratings.
+
+Sessions per user follow a Pareto distribution (--skew): most users take
+one or two assessments, a few take dozens. A session walks each character's
+question flow from assets/character_passage.json as app.py does: text
+answers, 0-10 slider ratings and one follow-up per branching question.
+Analyses have the fields CharacterChatbot.analyze_responses returns, with
+quality ratings named after the character's barometer options and drawn
+around a per-user level that improves slowly from session to session.
+Some sessions are abandoned part-way (--abandon-rate).
+
+Usernames carry the seed, so different seeds add disjoint users; like any
+bulk import, load each seed into a database only once:
+
+    DATABASE_URL=sqlite:///load.db python -m utils.synthetic_data --users 1000000 --seed 7
+    python -m utils.synthetic_data --users 10000 --jsonl synthetic.jsonl.gz
+"""
+import argparse
+import gzip
+import json
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List
+
+from utils.bulk_import import USER_NAMESPACE, bulk_import
+from utils.sharding import new_session_id
+
+
+CHARACTERS_PATH = "assets/character_passage.json"
+
+OPENERS = [
+    "Honestly,", "In my current role", "Over the last few years", "At work", "For me,",
+    "Looking back,", "Right now", "In my team", "Since my last promotion", "In my experience",
+]
+SUBJECTS = [
+    "my long term career goal", "leading a small team", "mentoring junior colleagues",
+    "managing tight deadlines", "handling conflict with peers", "learning new technical skills",
+    "building trust with my manager", "balancing work and family", "staying ethical under pressure",
+    "keeping myself motivated", "speaking up in meetings", "planning my next move",
+    "delegating work", "recovering from burnout", "owning my mistakes",
+]
+PREDICATES = [
+    "matters more to me than anything else", "has been a real challenge", "is something I am still working on",
+    "keeps me focused", "has taught me patience", "shapes how I make decisions",
+    "is where I most want to grow", "gives me energy", "is harder than I expected",
+    "comes naturally to me",
+]
+CLOSERS = [
+    "", "", " because I want my work to make a difference", " and I ask for feedback regularly",
+    " even when it is difficult", " with help from a mentor", " without much support so far",
+    " and I track my progress every quarter",
+]
+
+ANALYSIS_SENTENCES = [
+    "Your answers show a clear connection with {name}'s sense of purpose.",
+    "You describe {quality} as a strength, and your examples support that.",
+    "There is room to grow in {quality}, especially when the stakes are high.",
+    "Like {name}, you tend to think about the impact of your work on others.",
+    "Your self-ratings are consistent with the situations you describe.",
+    "You rate yourself modestly on {quality}, though your answers suggest more confidence is warranted.",
+    "A structured development plan would help you turn intentions into habits.",
+    "Seeking regular feedback from peers would sharpen your view of {quality}.",
+    "Your responses suggest you learn best from hands-on experience.",
+    "You show awareness of your blind spots, which is a good foundation for growth.",
+    "Working with a mentor could accelerate progress on {quality}.",
+    "Your long term goals are ambitious and, for the most part, clearly articulated.",
+    "In difficult moments you fall back on your values, as {name} did.",
+    "Balancing short term pressure with long term direction remains a theme in your answers.",
+    "You communicate your priorities clearly and with conviction.",
+    "Small, consistent steps will serve you better than occasional big pushes.",
+    "Your answers reflect a collaborative style that colleagues are likely to value.",
+    "Consider setting measurable milestones for {quality} over the next quarter.",
+]
+STRENGTHS = [
+    "Clear sense of direction", "Strong work ethic", "Self-awareness", "Empathy for colleagues",
+    "Willingness to learn", "Resilience under pressure", "Integrity", "Team orientation",
+    "Curiosity", "Accountability",
+]
+AREAS = [
+    "Delegating responsibility", "Long term planning", "Asking for help", "Handling conflict",
+    "Consistency", "Public speaking", "Saying no to low-value work", "Patience with others",
+    "Work-life balance", "Giving direct feedback",
+]
+RECOMMENDATIONS = [
+    "Find a mentor outside your team", "Set quarterly development goals", "Keep a weekly reflection journal",
+    "Ask for structured feedback after projects", "Take on a stretch assignment",
+    "Block time for deep work", "Practise delegating one task a week", "Read about leaders you admire",
+    "Join a peer learning group", "Review your progress with your manager monthly",
+]
+INSIGHTS = [
+    "Motivated by purpose more than recognition", "Values fairness in the team",
+    "Prefers learning by doing", "Sets high standards for themselves",
+    "Draws energy from helping others grow", "Thinks carefully before acting",
+    "Comfortable with responsibility", "Seeks mastery in their craft",
+]
+INTENT_WEIGHTS = {"yes": 5, "no": 2, "neutral": 3, "has_mentor": 4, "no_mentor": 3}
+
+# Every answer sentence, built once so an answer costs one draw per sentence
+ANSWER_SENTENCES = [f"{opener} {subject} {predicate}{closer}."
+                    for opener in OPENERS for subject in SUBJECTS
+                    for predicate in PREDICATES for closer in CLOSERS]
+
+
+def load_characters(path: str = CHARACTERS_PATH) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _qualities(character: Dict) -> List[str]:
+    """Quality names for a character: the options of its rating questions"""
+    names = [option.strip().rstrip(".") for question in character["questions"]
+             if question.get("rate_question") for option in question.get("options", [])]
+    return list(dict.fromkeys(names)) or ["Leadership", "Communication", "Ethics", "Adaptability", "Teamwork"]
+
+
+def _rating(rng: random.Random, level: float, low: float = 1.0, high: float = 10.0) -> float:
+    return round(min(high, max(low, rng.gauss(level, 1.2))), 1)
+
+
+def _answer(rng: random.Random) -> str:
+    return " ".join(rng.choices(ANSWER_SENTENCES, k=rng.randint(1, 4)))
+
+
+def _run(rng: random.Random, pool: List[str], count: int) -> List[str]:
+    """`count` distinct consecutive items of `pool` from a random start (cheaper than sample)"""
+    start = rng.randrange(len(pool))
+    return [pool[(start + i) % len(pool)] for i in range(count)]
+
+
+def _reply(rng: random.Random, question: Dict, level: float) -> Dict:
+    if question.get("rate_question"):
+        answer = {option: int(round(_rating(rng, level, 0, 10))) for option in question.get("options", [])}
+        return {"question_no": question["question_no"], "question": question["question"],
+                "answer": answer, "type": "rating"}
+    return {"question_no": question["question_no"], "question": question["question"],
+            "answer": _answer(rng), "type": "text"}
+
+
+def _responses(rng: random.Random, character: Dict, level: float) -> List[Dict]:
+    """Answers along the question flow, with one follow-up per branching question"""
+    replies = []
+    for question in character["questions"]:
+        replies.append(_reply(rng, question, level))
+        follow_ups = question.get("follow_up_questions")
+        if follow_ups:
+            intents = list(follow_ups)
+            intent = rng.choices(intents, [INTENT_WEIGHTS.get(i, 1) for i in intents])[0]
+            replies.append(_reply(rng, follow_ups[intent], level))
+    return replies
+
+
+def _analysis(rng: random.Random, character: Dict, qualities: List[str], level: float) -> Dict:
+    """An analysis shaped like CharacterChatbot.analyze_responses output"""
+    picked = rng.sample(qualities, min(len(qualities), rng.randint(5, 6)))
+    ratings = {quality: _rating(rng, level) for quality in picked}
+    overall = _rating(rng, sum(ratings.values()) / len(ratings))
+    text = " ".join(
+        sentence.format(name=character["character"], quality=picked[i % len(picked)].lower())
+        for i, sentence in enumerate(_run(rng, ANALYSIS_SENTENCES, rng.randint(12, 16)))
+    )
+    return {
+        "overall_rating": overall,
+        "quality_ratings": ratings,
+        "analysis": text,
+        "strengths": _run(rng, STRENGTHS, 3),
+        "areas_for_improvement": _run(rng, AREAS, 3),
+        "recommendations": _run(rng, RECOMMENDATIONS, 3),
+        "key_insights": _run(rng, INSIGHTS, 3),
+    }
+
+
+def generate_records(users: int, seed: int = 0, characters: List[Dict] = None,
+                     skew: float = 1.3, max_sessions: int = 50, abandon_rate: float = 0.15,
+                     start: datetime = datetime(2024, 1, 1), days: int = 365,
+                     prefix: str = "synthetic") -> Iterator[Dict[str, Any]]:
+    """Yield bulk_import session records for `users` users, reproducibly from `seed`"""
+    rng = random.Random(seed)
+    characters = characters if characters is not None else load_characters()
+    qualities = {character["id"]: _qualities(character) for character in characters}
+    span = days * 86400
+
+    for index in range(users):
+        username = f"{prefix}-{seed}-{index:07d}"
+        user_id = str(uuid.uuid5(USER_NAMESPACE, username))
+        level = rng.gauss(6.0, 1.3)
+        growth = rng.uniform(-0.05, 0.25)
+        sessions = min(max_sessions, int(rng.paretovariate(skew)))
+        offsets = sorted(rng.uniform(0, span) for _ in range(sessions))
+
+        for number, offset in enumerate(offsets):
+            created = start + timedelta(seconds=offset)
+            done = len(characters)
+            if rng.random() < abandon_rate:
+                done = rng.randrange(len(characters))
+            session_level = level + growth * number
+            record = {
+                "username": username,
+                "user_id": user_id,
+                "session_id": new_session_id(user_id, rng),
+                "created_at": created.isoformat(timespec="seconds"),
+                "responses": [],
+            }
+
+            at = created
+            for character in characters[:done]:
+                at += timedelta(seconds=rng.randint(180, 900))
+                character_level = session_level + rng.uniform(-1.0, 1.0)
+                record["responses"].append({
+                    "character_id": character["id"],
+                    "character_name": character["character"],
+                    "read_passage": rng.random() < 0.7,
+                    "responses": _responses(rng, character, character_level),
+                    "analysis": _analysis(rng, character, qualities[character["id"]], character_level),
+                    "created_at": at.isoformat(timespec="seconds"),
+                })
+            yield record
+
+
+def write_jsonl(path: str, records: Iterator[Dict]) -> int:
+    """Write records one per line (gzip for .gz paths); returns the number written"""
+    opener = gzip.open if path.endswith(".gz") else open
+    count = 0
+    with opener(path, "wt", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic assessments for load tests")
+    parser.add_argument("--users", type=int, required=True, help="Users to generate")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("--skew", type=float, default=1.3,
+                        help="Pareto shape of sessions per user; lower is more skewed (default: 1.3)")
+    parser.add_argument("--max-sessions", type=int, default=50, help="Cap on sessions per user")
+    parser.add_argument("--abandon-rate", type=float, default=0.15,
+                        help="Share of sessions stopped before the last character")
+    parser.add_argument("--start", default="2024-01-01", help="Earliest session date (ISO)")
+    parser.add_argument("--days", type=int, default=365, help="Days over which sessions are spread")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Sessions per bulk transaction")
+    parser.add_argument("--jsonl", default=None,
+                        help="Write records to this JSONL(.gz) file instead of the database")
+    args = parser.parse_args()
+
+    records = generate_records(
+        args.users, seed=args.seed, skew=args.skew, max_sessions=args.max_sessions,
+        abandon_rate=args.abandon_rate, start=datetime.fromisoformat(args.start), days=args.days
+    )
+
+    if args.jsonl:
+        started = time.perf_counter()
+        count = write_jsonl(args.jsonl, records)
+        print(f"Wrote {count} sessions to {args.jsonl} in {time.perf_counter() - started:.1f}s")
+        return
+
+    from utils.database import Database
+    db = Database()
+    totals = bulk_import(db, records, chunk_size=args.chunk_size, progress=True)
+    print(
+        f"Generated {args.users} users, {totals['sessions']} sessions and {totals['responses']} "
+        f"responses in {totals['seconds']:.1f}s ({totals['rows_per_second']:,.0f} rows/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
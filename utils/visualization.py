@@ -56,16 +56,20 @@ def create_radar_chart(quality_ratings: dict, character_name: str):
     
     return fig
 
-def create_bar_chart(responses: List[Dict]):
-    """Create bar chart comparing overall ratings across characters"""
+def create_bar_chart(character_ratings: Dict[str, float]):
+    """Create bar chart comparing overall ratings across characters
     
-    if not responses:
+    character_ratings: {character_name: overall_rating}, as in the "characters"
+    entry of Database.get_session_metrics
+    """
+    
+    if not character_ratings:
         fig = go.Figure()
         fig.update_layout(title="No data available")
         return fig
     
-    characters = [r['character_name'] for r in responses]
-    ratings = [r['analysis']['overall_rating'] for r in responses]
+    characters = list(character_ratings.keys())
+    ratings = list(character_ratings.values())
     
     # Create color gradient based on ratings
     colors = ['#667eea' if r >= 7 else '#ffc107' if r >= 5 else '#dc3545' for r in ratings]
@@ -111,31 +115,18 @@ def create_bar_chart(responses: List[Dict]):
     
     return fig
 
-def create_comparison_chart(responses: List[Dict]):
-    """Create comparison chart of average quality ratings across all characters"""
+def create_comparison_chart(avg_qualities: Dict[str, float]):
+    """Create comparison chart of average quality ratings across all characters
     
-    if not responses:
-        fig = go.Figure()
-        fig.update_layout(title="No data available")
-        return fig
+    avg_qualities: {quality: mean rating}, as in the "qualities" entry of
+    Database.get_session_metrics
+    """
     
-    # Aggregate quality ratings across all characters
-    all_qualities = {}
-    
-    for response in responses:
-        for quality, rating in response['analysis'].get('quality_ratings', {}).items():
-            if quality not in all_qualities:
-                all_qualities[quality] = []
-            all_qualities[quality].append(rating)
-    
-    if not all_qualities:
+    if not avg_qualities:
         fig = go.Figure()
         fig.update_layout(title="No quality ratings available")
         return fig
     
-    # Calculate average ratings
-    avg_qualities = {k: sum(v)/len(v) for k, v in all_qualities.items()}
-    
     # Sort by rating (descending)
     sorted_qualities = dict(sorted(avg_qualities.items(), key=lambda x: x[1], reverse=True))
     
@@ -349,4 +340,75 @@ def create_progress_gauge(overall_rating: float):
         font={'color': "darkgray", 'family': "Arial"}
     )
     
-    return fig
\ No newline at end of file
+    return fig
+
+
+def create_score_trend_chart(trend: List[Dict], qualities: List[str] = None):
+    """Create line chart of a user's ratings across sessions (from get_user_score_trend)"""
+    
+    if not trend:
+        fig = go.Figure()
+        fig.update_layout(title="No completed sessions yet")
+        return fig
+    
+    dates = [point['created_at'] for point in trend]
+    
+    fig = go.Figure()
+    
+    # One line per character's overall rating; gaps where a session skipped that character
+    characters = sorted({name for point in trend for name in point['characters']})
+    for name in characters:
+        fig.add_trace(go.Scatter(
+            x=dates,
+            y=[point['characters'].get(name) for point in trend],
+            mode='lines+markers',
+            name=name,
+            connectgaps=True,
+            marker=dict(size=8),
+            hovertemplate=f'<b>{name}</b><br>%{{x}}<br>Rating: %{{y:.1f}}/10<extra></extra>'
+        ))
+    
+    fig.add_trace(go.Scatter(
+        x=dates,
+        y=[point['overall'] for point in trend],
+        mode='lines+markers',
+        name='Session Average',
+        line=dict(color='rgb(102, 126, 234)', width=3, dash='dash'),
+        marker=dict(size=10),
+        hovertemplate='<b>Session Average</b><br>%{x}<br>Rating: %{y:.1f}/10<extra></extra>'
+    ))
+    
+    # Optional quality series, named like the export's quality_<name> columns
+    for metric in qualities or []:
+        label = metric[len('quality_'):].replace('_', ' ').title() if metric.startswith('quality_') else metric
+        fig.add_trace(go.Scatter(
+            x=dates,
+            y=[point['qualities'].get(metric) for point in trend],
+            mode='lines+markers',
+            name=label,
+            connectgaps=True,
+            line=dict(dash='dot'),
+            hovertemplate=f'<b>{label}</b><br>%{{x}}<br>Rating: %{{y:.1f}}/10<extra></extra>'
+        ))
+    
+    fig.update_layout(
+        title=dict(
+            text="Your Ratings Over Time",
+            font=dict(size=20, color='#667eea')
+        ),
+        xaxis_title="Session",
+        yaxis_title="Rating (out of 10)",
+        yaxis=dict(
+            range=[0, 10.5],
+            tickmode='linear',
+            tick0=0,
+            dtick=2
+        ),
+        height=450,
+        paper_bgcolor='white',
+        plot_bgcolor='rgba(240, 242, 246, 0.5)',
+        hovermode='x unified',
+        legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1)
+    )
+    
+    return fig